@@ -0,0 +1,128 @@
+#blockmap.py
+"""
+Bidirectional chunk <-> DataNode index for the NameNode.
+
+The namespace tree remains the persisted source of truth; this index is derived
+from it (rebuilt after loading a snapshot, then kept current by apply_edit)
+so that "which nodes hold chunk X" and "which chunks live on node Y" cost
+time proportional to the answer instead of a scan of the whole namespace.
+Chunks are owned by file id rather than path, so renames leave it untouched.
+
+Deduplicated files share blocks through the content-addressed block table
+({block_id: {"sha256", "dns", "committed"}}). A shared block is referenced
+rather than owned: the index counts references per file, maps committed
+content hashes to their block, and remove_file() hands back the blocks whose
+last reference went away.
+Not thread-safe on its own: callers hold the NameNode LOCK.
+"""
+
+
+class BlockMap:
+    def __init__(self):
+        self._replicas = {}  # chunk_id -> set(dn_id)
+        self._by_dn = {}     # dn_id -> set(chunk_id)
+        self._owner = {}     # chunk_id -> owning file id
+        self._refs = {}      # shared block id -> {file id: references}
+        self._content = {}   # sha256 -> committed shared block id
+        self._sha = {}       # committed shared block id -> sha256
+
+    def rebuild(self, files, blocks=None):
+        self._replicas.clear()
+        self._by_dn.clear()
+        self._owner.clear()
+        self._refs.clear()
+        self._content.clear()
+        self._sha.clear()
+        for block_id, block in (blocks or {}).items():
+            self.add_shared_block(block_id, block)
+        for file_id, finfo in files.items():
+            self.add_file(file_id, finfo)
+
+    def add_file(self, file_id, finfo):
+        if finfo.get("dedup"):
+            for chunk_id in finfo["chunks"]:
+                refs = self._refs.setdefault(chunk_id, {})
+                refs[file_id] = refs.get(file_id, 0) + 1
+            return
+        # chunks_info also lists the parity blocks of erasure-coded files
+        for chunk_id in list(finfo["chunks"]) + list(finfo["chunks_info"]):
+            self._owner[chunk_id] = file_id
+            self._replicas.setdefault(chunk_id, set())
+        for chunk_id, dns in finfo["chunks_info"].items():
+            for dn in dns:
+                self.add_replica(chunk_id, dn, file_id)
+
+    def remove_file(self, finfo):
+        """Drops a file's chunks; returns the shared blocks it held the last reference to."""
+        if finfo.get("dedup"):
+            reclaimed = []
+            for chunk_id in set(finfo["chunks"]):
+                refs = self._refs.get(chunk_id, {})
+                refs.pop(finfo["id"], None)
+                if not refs:
+                    self._drop(chunk_id)
+                    reclaimed.append(chunk_id)
+            return reclaimed
+        for chunk_id in set(finfo["chunks"]) | set(finfo["chunks_info"]):
+            self._drop(chunk_id)
+        return []
+
+    def _drop(self, chunk_id):
+        for dn in self._replicas.pop(chunk_id, ()):
+            chunks = self._by_dn.get(dn)
+            if chunks is not None:
+                chunks.discard(chunk_id)
+                if not chunks:
+                    del self._by_dn[dn]
+        self._owner.pop(chunk_id, None)
+        self._refs.pop(chunk_id, None)
+        sha = self._sha.pop(chunk_id, None)
+        if sha is not None and self._content.get(sha) == chunk_id:
+            del self._content[sha]
+
+    def add_shared_block(self, block_id, block):
+        self._refs.setdefault(block_id, {})
+        self._replicas.setdefault(block_id, set())
+        for dn in block["dns"]:
+            self.add_replica(block_id, dn, None)
+        if block.get("committed"):
+            self.commit(block_id, block["sha256"])
+
+    def commit(self, block_id, sha256):
+        """Makes a shared block the one later uploads of the same bytes refer to."""
+        if sha256 not in self._content:
+            self._content[sha256] = block_id
+            self._sha[block_id] = sha256
+
+    def add_replica(self, chunk_id, dn_id, file_id):
+        if chunk_id not in self._refs:
+            self._owner[chunk_id] = file_id
+        self._replicas.setdefault(chunk_id, set()).add(dn_id)
+        self._by_dn.setdefault(dn_id, set()).add(chunk_id)
+
+    def remove_replica(self, chunk_id, dn_id):
+        self._replicas.get(chunk_id, set()).discard(dn_id)
+        chunks = self._by_dn.get(dn_id)
+        if chunks is not None:
+            chunks.discard(chunk_id)
+            if not chunks:
+                del self._by_dn[dn_id]
+
+    def replicas_of(self, chunk_id):
+        return set(self._replicas.get(chunk_id, ()))
+
+    def chunks_on(self, dn_id):
+        return set(self._by_dn.get(dn_id, ()))
+
+    def file_of(self, chunk_id):
+        """Owning file id; for a shared block, any file still referencing it."""
+        if chunk_id in self._refs:
+            return next(iter(self._refs[chunk_id]), None)
+        return self._owner.get(chunk_id)
+
+    def refcount(self, chunk_id):
+        return sum(self._refs.get(chunk_id, {}).values())
+
+    def block_with(self, sha256):
+        """Committed shared block holding these bytes, or None."""
+        return self._content.get(sha256)
@@ -0,0 +1,145 @@
+#editlog.py
+"""
+Append-only edit log for the NameNode namespace.
+
+Every namespace mutation is appended as one JSON line tagged with a
+monotonically increasing txid. Appends are cheap (in-memory buffer); callers
+make them durable with sync(txid), which group-commits every buffered edit
+with a single write + fsync, so concurrent handlers share one disk flush.
+
+The log is split into segments named edits_<first txid>.log. A checkpoint
+rolls to a fresh segment, writes a snapshot covering everything before it,
+and then purges the old segments.
+"""
+import json, os, threading
+
+SEGMENT_PREFIX = "edits_"
+SEGMENT_SUFFIX = ".log"
+
+
+def _segment_name(start_txid):
+    return f"{SEGMENT_PREFIX}{start_txid:012d}{SEGMENT_SUFFIX}"
+
+
+def list_segments(directory):
+    """Returns [(start_txid, path), ...] sorted by start txid."""
+    if not os.path.isdir(directory):
+        return []
+    segments = []
+    for name in os.listdir(directory):
+        if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+            try:
+                start = int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            except ValueError:
+                continue
+            segments.append((start, os.path.join(directory, name)))
+    return sorted(segments)
+
+
+def read_edits(directory, after_txid=0):
+    """Yields every logged edit with txid > after_txid, in txid order.
+    A torn record at the end of a segment (crash mid-write) ends that segment."""
+    for _, path in list_segments(directory):
+        with open(path) as f:
+            for line in f:
+                try:
+                    edit = json.loads(line)
+                except ValueError:
+                    print(f"[EditLog] Ignoring torn record at end of {path}")
+                    break
+                if edit["txid"] > after_txid:
+                    yield edit
+
+
+class EditLog:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._cond = threading.Condition()
+        self._buffer = []
+        self._txid = 0          # last txid handed out
+        self._synced_txid = 0   # last txid known to be on disk
+        self._syncing = False
+        self._file = None
+
+    @property
+    def last_txid(self):
+        with self._cond:
+            return self._txid
+
+    def open(self, last_txid):
+        """Starts appending after last_txid (the txid reached by replay). A segment
+        already named for last_txid + 1 can only hold a torn record, so it is reset."""
+        with self._cond:
+            self._txid = self._synced_txid = last_txid
+            self._file = open(os.path.join(self.directory, _segment_name(last_txid + 1)), "w")
+
+    def append(self, edit):
+        """Buffers one edit and returns its txid. Not durable until sync(txid)."""
+        with self._cond:
+            self._txid += 1
+            record = dict(edit, txid=self._txid)
+            self._buffer.append(json.dumps(record, separators=(",", ":")))
+            return self._txid
+
+    def sync(self, txid):
+        """Blocks until every edit up to txid is fsynced. Whoever finds no flush
+        in progress writes out the whole buffer; everyone else waits for it."""
+        with self._cond:
+            while self._synced_txid < txid:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                self._syncing = True
+                batch, self._buffer = self._buffer, []
+                batch_txid = self._txid
+                break
+            else:
+                return
+        synced = False
+        try:
+            self._write(batch)
+            synced = True
+        finally:
+            with self._cond:
+                self._syncing = False
+                if synced:
+                    self._synced_txid = batch_txid
+                else:
+                    self._buffer[:0] = batch
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        if batch:
+            self._file.write("\n".join(batch) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def roll(self):
+        """Flushes the current segment and starts a new one. Returns the last
+        txid in the closed segment; edits after it land in the new segment."""
+        with self._cond:
+            while self._syncing:
+                self._cond.wait()
+            batch, self._buffer = self._buffer, []
+            self._write(batch)
+            self._synced_txid = self._txid
+            self._file.close()
+            self._file = open(os.path.join(self.directory, _segment_name(self._txid + 1)), "a")
+            self._cond.notify_all()
+            return self._txid
+
+    def purge(self, upto_txid):
+        """Removes segments whose edits are all <= upto_txid (covered by a snapshot)."""
+        segments = list_segments(self.directory)
+        for (start, path), (next_start, _) in zip(segments, segments[1:]):
+            if next_start - 1 <= upto_txid:
+                os.remove(path)
+
+    def close(self):
+        with self._cond:
+            if self._file:
+                self._write(self._buffer)
+                self._buffer = []
+                self._file.close()
+                self._file = None
@@ -0,0 +1,92 @@
+#liveness.py
+"""
+Volatile DataNode liveness registry for the NameNode.
+
+Heartbeat state (host, last_seen, alive) lives only in memory behind its own
+lock and is never persisted: DataNodes re-announce themselves within one
+heartbeat interval after a NameNode restart. Expiry is driven by a min-heap of
+deadlines holding at most one entry per node, so a heartbeat is O(1) and the
+monitor only wakes up when the earliest deadline is due. Heartbeats may also
+carry load stats (capacity, free, used, chunks, active_transfers), which are
+kept alongside for the placement policy.
+"""
+import heapq, threading, time
+
+
+class DatanodeRegistry:
+    def __init__(self, timeout):
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._nodes = {}      # dn_id -> {"host", "last_seen", "alive", "stats"}
+        self._heap = []       # (deadline, dn_id), one entry per queued node
+        self._queued = set()
+
+    def heartbeat(self, dn_id, host, now=None, stats=None):
+        """Records a heartbeat. Returns True if the node was dead (or unknown) before."""
+        now = now or time.time()
+        with self._cond:
+            info = self._nodes.get(dn_id)
+            revived = info is None or not info["alive"]
+            if info is None:
+                info = self._nodes[dn_id] = {}
+            info.update({"host": host, "last_seen": now, "alive": True})
+            if stats is not None:
+                info["stats"] = dict(stats, reported_at=now)
+            if dn_id not in self._queued:
+                self._queued.add(dn_id)
+                heapq.heappush(self._heap, (now + self.timeout, dn_id))
+                self._cond.notify()
+            return revived
+
+    def wait_expired(self):
+        """Blocks until at least one node misses its deadline, marks those nodes
+        dead and returns [(dn_id, last_seen), ...]."""
+        with self._cond:
+            while True:
+                now = time.time()
+                expired = []
+                while self._heap and self._heap[0][0] <= now:
+                    _, dn_id = heapq.heappop(self._heap)
+                    info = self._nodes[dn_id]
+                    deadline = info["last_seen"] + self.timeout
+                    if deadline > now:
+                        # heard from since this entry was queued; push the real deadline
+                        heapq.heappush(self._heap, (deadline, dn_id))
+                        continue
+                    self._queued.discard(dn_id)
+                    info["alive"] = False
+                    expired.append((dn_id, info["last_seen"]))
+                if expired:
+                    return expired
+                self._cond.wait(self._heap[0][0] - now if self._heap else None)
+
+    def is_alive(self, dn_id):
+        with self._cond:
+            info = self._nodes.get(dn_id)
+            return bool(info and info["alive"])
+
+    def alive(self):
+        with self._cond:
+            return [dn for dn, info in self._nodes.items() if info["alive"]]
+
+    def host(self, dn_id):
+        with self._cond:
+            info = self._nodes.get(dn_id)
+            return info["host"] if info else None
+
+    def last_seen(self, dn_id):
+        with self._cond:
+            info = self._nodes.get(dn_id)
+            return info["last_seen"] if info else None
+
+    def stats(self, dn_ids=None):
+        """Last reported load stats of the given (default: all) nodes, dn_id -> dict."""
+        with self._cond:
+            ids = self._nodes if dn_ids is None else dn_ids
+            return {dn: dict(self._nodes[dn]["stats"]) for dn in ids
+                    if dn in self._nodes and "stats" in self._nodes[dn]}
+
+    def snapshot(self):
+        """Copy of every known node's liveness info, for dashboards."""
+        with self._cond:
+            return {dn: dict(info) for dn, info in self._nodes.items()}
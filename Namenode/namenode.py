@@ -1,28 +1,238 @@
-import threading, time, json, os
+import threading, time, json, os, sys, itertools, math, hashlib
 from flask import Flask, request, jsonify, render_template_string
 import requests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import metrics
+import compression
+import erasure
+from editlog import EditLog, read_edits
+from liveness import DatanodeRegistry
+from blockmap import BlockMap
+from namespace import Namespace, NamespaceError, normalize, is_dir
+from replication import ReplicationManager
+from placement import make_policy
 
 app = Flask(__name__)
-LOCK = threading.RLock()
+METRICS = metrics.Registry()
+metrics.instrument_flask(app, METRICS)
+LOCK_WAIT = METRICS.histogram("hdfs_namenode_lock_wait_seconds", "Time spent waiting for the namespace LOCK.",
+                              buckets=(1e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+LOCK_HOLD = METRICS.histogram("hdfs_namenode_lock_hold_seconds", "Time the namespace LOCK is held.",
+                              buckets=(1e-5, 1e-4, 5e-4, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0))
+LOCK = metrics.TimedLock(threading.RLock(), LOCK_WAIT, LOCK_HOLD)
+CHECKPOINT_SECONDS = METRICS.histogram("hdfs_namenode_checkpoint_seconds", "Duration of save_metadata().")
+HEARTBEAT_INTERVAL_SECONDS = METRICS.histogram("hdfs_namenode_heartbeat_interval_seconds",
+                                               "Gap between consecutive heartbeats of a DataNode.",
+                                               ["dn"], buckets=(1, 2, 5, 10, 12, 15, 20, 30, 60))
 METADATA_FILE = "metadata.json"
+EDITLOG_DIR = "edits"
+CHECKPOINT_INTERVAL = 60
+CHECKPOINT_TXNS = 10000
 HEARTBEAT_TIMEOUT = 12
 REPLICA_FACTOR = 2
-CHECKSUMS = {}
+LEGACY_BLOCK_SIZE = 32  # block size of files stored before it was recorded per file
+MAX_BLOCK_SIZE = 256 * 1024 * 1024
+ALLOWED_CODECS = compression.KNOWN_CODECS  # chunk codecs clients may pick for a file
+DEFAULT_STORAGE = "replicated"  # per-file storage policy: REPLICA_FACTOR copies, or an erasure code like rs-6-3
+LIST_PAGE_SIZE = 1000
+LIST_MAX_PAGE_SIZE = 10000
+PLACEMENT_POLICY = "weighted"  # or "round_robin", see placement.py
+REPLICATION_WORKERS = 8
+REPLICATION_STREAMS_PER_DN = 2  # concurrent copies a DataNode may source or receive
+REPLICATION_MAX_ATTEMPTS = 5
+REPLICATION_BACKOFF = 1.0
+REPLICATION_TIMEOUT = 30
 
-state = {"files": {}, "datanodes": {}}
+# "blocks" is the content-addressed table of blocks shared by deduplicated files:
+# {block_id: {"sha256", "dns", "committed"}}
+state = {"root": {"children": {}}, "next_file_id": 1, "blocks": {}}
+NAMESPACE = Namespace(state)
+EDITLOG = EditLog(EDITLOG_DIR)
+DATANODES = DatanodeRegistry(HEARTBEAT_TIMEOUT)
+BLOCK_MAP = BlockMap()
+PLACEMENT = make_policy(PLACEMENT_POLICY)
+checkpoint_txid = 0
+# (chunk_id, dn_id) -> {"status", "scanned_at"} from the DataNode block scanners.
+# Soft state like liveness: not journaled, refilled by the next scan pass.
+SCAN_RESULTS = {}
 
 # --------------------------- Metadata Helpers ---------------------------
+def file_of_chunk(chunk_id):
+    """File node owning a chunk, or None; caller holds LOCK."""
+    file_id = BLOCK_MAP.file_of(chunk_id)
+    return NAMESPACE.file(file_id) if file_id is not None else None
+
+def chunk_replicas(finfo):
+    """{chunk_id: [dn, ...]} of a file; blocks of deduplicated files live in the shared block table."""
+    if finfo.get("dedup"):
+        return {c: state["blocks"][c]["dns"] for c in finfo["chunks"] if c in state["blocks"]}
+    return finfo["chunks_info"]
+
+def replica_list(finfo, chunk_id):
+    """The mutable replica list of one chunk of finfo; caller holds LOCK."""
+    if finfo.get("dedup"):
+        return state["blocks"][chunk_id]["dns"]
+    return finfo["chunks_info"].setdefault(chunk_id, [])
+
+def stamp(finfo):
+    """Gives a file a new generation. Clients cache chunk maps per generation, so
+    a file whose contents or checksums change must never keep its old one."""
+    state["next_generation"] = state.get("next_generation", 0) + 1
+    finfo["generation"] = state["next_generation"]
+
+def reclaim(block_ids):
+    """Forgets shared blocks whose last reference is gone. Returns them as
+    [(block_id, [dn, ...])] so the caller can delete them from the DataNodes."""
+    freed = []
+    for block_id in block_ids:
+        block = state["blocks"].pop(block_id, None)
+        if block is not None:
+            freed.append((block_id, list(block["dns"])))
+    return freed
+
+def apply_edit(edit):
+    """Applies one namespace mutation to state. Used both live and on replay.
+    Raises NamespaceError (leaving state untouched) if the edit does not apply.
+    Returns the shared blocks the edit freed, see reclaim()."""
+    op = edit["op"]
+    freed = []
+    if op == "add_file":
+        old = NAMESPACE.add_file(edit["filename"], edit["info"])
+        stamp(edit["info"])
+        for block_id, block in edit.get("new_blocks", {}).items():
+            state["blocks"][block_id] = dict(block, dns=list(block["dns"]))
+            BLOCK_MAP.add_shared_block(block_id, state["blocks"][block_id])
+        # the new file takes its references first, so blocks it shares with the file
+        # it replaces are not reclaimed in between
+        BLOCK_MAP.add_file(edit["info"]["id"], edit["info"])
+        if old:
+            freed = reclaim(BLOCK_MAP.remove_file(old))
+    elif op in ("delete", "delete_file"):
+        path = edit.get("path") or edit["filename"]
+        if NAMESPACE.lookup(path) is not None:
+            for finfo in NAMESPACE.remove(path):
+                freed += reclaim(BLOCK_MAP.remove_file(finfo))
+    elif op == "mkdir":
+        NAMESPACE.mkdir(edit["path"])
+    elif op == "rename":
+        NAMESPACE.rename(edit["src"], edit["dst"])
+    elif op == "add_replica":
+        finfo = file_of_chunk(edit["chunk_id"])
+        if finfo is None and "filename" in edit:
+            # older edit logs name the file and may create it from a replica report
+            finfo = NAMESPACE.get_file(edit["filename"])
+            if finfo is None:
+                finfo = {"chunks": [], "chunks_info": {}}
+                NAMESPACE.add_file(edit["filename"], finfo)
+        if finfo is None:
+            return
+        replicas = replica_list(finfo, edit["chunk_id"])
+        if edit["dn_id"] not in replicas:
+            replicas.append(edit["dn_id"])
+        BLOCK_MAP.add_replica(edit["chunk_id"], edit["dn_id"], finfo["id"])
+    elif op == "remove_replica":
+        finfo = file_of_chunk(edit["chunk_id"])
+        replicas = replica_list(finfo, edit["chunk_id"]) if finfo else []
+        if edit["dn_id"] in replicas:
+            replicas.remove(edit["dn_id"])
+        BLOCK_MAP.remove_replica(edit["chunk_id"], edit["dn_id"])
+    elif op == "set_checksums":
+        finfo = NAMESPACE.get_file(edit["filename"])
+        if finfo:
+            stamp(finfo)
+            finfo.setdefault("checksums", {}).update(edit["checksums"])
+            if "stored_size" in edit:
+                finfo["stored_size"] = edit["stored_size"]
+            if "chunk_sizes" in edit:
+                finfo.setdefault("chunk_sizes", {}).update(edit["chunk_sizes"])
+            if finfo.get("dedup"):
+                # stored and verified: later uploads of the same bytes may now refer to these blocks
+                for block_id, sha in edit["checksums"].items():
+                    block = state["blocks"].get(block_id)
+                    if block and block["sha256"] == sha:
+                        block["committed"] = True
+                        BLOCK_MAP.commit(block_id, sha)
+    elif op == "update_datanode":
+        pass  # liveness used to be journaled; it now lives only in DATANODES
+    else:
+        raise ValueError(f"unknown edit op {op!r}")
+    return freed
+
+def log_edit(edit):
+    """Applies an edit and appends it to the edit log; caller holds LOCK.
+    Returns the txid to pass to EDITLOG.sync() once LOCK is released.
+    An edit that raises NamespaceError is not logged."""
+    return log_freeing_edit(edit)[0]
+
+def log_freeing_edit(edit):
+    """log_edit() for edits that can free shared blocks: returns (txid, freed).
+    The caller deletes the freed blocks with delete_replicas() after the sync."""
+    freed = apply_edit(edit)
+    return EDITLOG.append(edit), freed
+
 def save_metadata():
+    """Checkpoint: snapshot the namespace and drop the edit log it covers."""
+    with CHECKPOINT_SECONDS.time():
+        _save_metadata()
+
+def _save_metadata():
+    global checkpoint_txid
     with LOCK:
-        with open(METADATA_FILE, "w") as f:
-            json.dump(state, f, indent=2)
+        txid = EDITLOG.roll()
+        data = json.dumps({"txid": txid, "namespace": state}, separators=(",", ":"))
+    tmp = METADATA_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, METADATA_FILE)
+    EDITLOG.purge(txid)
+    checkpoint_txid = txid
 
 def load_metadata():
+    """Loads the latest snapshot, then replays the edit log tail on top of it."""
+    global checkpoint_txid
+    snapshot_txid = 0
+    legacy_files = {}
     if os.path.exists(METADATA_FILE):
         with open(METADATA_FILE) as f:
-            state.update(json.load(f))
+            data = json.load(f)
+        if "namespace" in data:
+            snapshot_txid = data["txid"]
+            data = data["namespace"]
+        data.pop("datanodes", None)  # older snapshots persisted liveness
+        legacy_files = data.pop("files", {})  # flat {filename: info} from before directories
+        state.clear()
+        state.update(data)
+    state.setdefault("blocks", {})
+    NAMESPACE.reset()
+    for fname, finfo in legacy_files.items():
+        NAMESPACE.add_file(fname, finfo)
+    BLOCK_MAP.rebuild(NAMESPACE.files(), state["blocks"])
+    last_txid = snapshot_txid
+    replayed = 0
+    for edit in read_edits(EDITLOG_DIR, snapshot_txid):
+        apply_edit(edit)
+        last_txid = edit["txid"]
+        replayed += 1
+    EDITLOG.open(last_txid)
+    checkpoint_txid = snapshot_txid
+    print(f"[NameNode] Loaded snapshot at txid {snapshot_txid}, replayed {replayed} edits")
     return state
 
+def checkpointer():
+    last = time.time()
+    while True:
+        time.sleep(1)
+        pending = EDITLOG.last_txid - checkpoint_txid
+        if pending and (pending >= CHECKPOINT_TXNS or time.time() - last >= CHECKPOINT_INTERVAL):
+            try:
+                save_metadata()
+                print(f"[NameNode] Checkpointed namespace at txid {checkpoint_txid}")
+            except Exception as e:
+                print("[NameNode] Checkpoint error:", e)
+            last = time.time()
+
 # --------------------------- Sorting ---------------------------
 def sort_datanodes_by_priority(alive_dns, client_ip=None):
     if not client_ip:
@@ -30,7 +240,7 @@ def sort_datanodes_by_priority(alive_dns, client_ip=None):
 
     def score(dn):
         try:
-            host = state["datanodes"][dn]["host"]
+            host = DATANODES.host(dn)
             dn_ip = host.split("//")[-1].split(":")[0]
             client_prefix = client_ip.split(".")[:2]
             dn_prefix = dn_ip.split(".")[:2]
@@ -41,123 +251,402 @@ def sort_datanodes_by_priority(alive_dns, client_ip=None):
 
     return sorted(alive_dns, key=score)
 
+@app.errorhandler(NamespaceError)
+def namespace_error(e):
+    return jsonify({"error": e.code, "path": e.path}), e.status
+
 # --------------------------- Heartbeats ---------------------------
 @app.route("/heartbeat", methods=["POST"])
 def heartbeat():
     payload = request.json
     dn_id = payload.get("dn_id")
     host = payload.get("host")
-    ts = time.time()
-    with LOCK:
-        state["datanodes"].setdefault(dn_id, {})
-        state["datanodes"][dn_id].update({"host": host, "last_seen": ts, "alive": True})
-        save_metadata()
+    # newer DataNodes also report disk and load figures for the placement policy
+    stats = {k: payload[k] for k in ("capacity", "free", "used", "chunks", "active_transfers") if k in payload}
+    last_seen = DATANODES.last_seen(dn_id)
+    if last_seen:
+        HEARTBEAT_INTERVAL_SECONDS.labels(dn_id).observe(time.time() - last_seen)
+    if DATANODES.heartbeat(dn_id, host, stats=stats or None):
+        print(f"[NameNode] Marking {dn_id} as ALIVE (heartbeat received)")
     return jsonify({"status": "ok"})
 
 # --------------------------- Upload Metadata ---------------------------
 @app.route("/upload_metadata", methods=["POST"])
 def upload_metadata():
     body = request.json
-    filename = body["filename"]
+    filename = normalize(body["filename"])
     num_chunks = int(body["num_chunks"])
     client_checksums = body.get("checksums", {})
+    block_size = int(body.get("block_size") or LEGACY_BLOCK_SIZE)
+    # the client lists the codecs it can use, best first; the first one we allow wins
+    codec = compression.negotiate(body.get("codecs") or [body.get("codec", "none")], ALLOWED_CODECS)
+    file_size = body.get("file_size")
+    storage = body.get("storage") or DEFAULT_STORAGE
+    # dedup: the client sends the SHA-256 of every (stored-form) chunk up front
+    digests = body.get("digests") if body.get("dedup") else None
 
-    with LOCK:
-        alive_dns = [dn for dn, info in state["datanodes"].items() if info.get("alive")]
+    if not 0 < block_size <= MAX_BLOCK_SIZE:
+        return jsonify({"error": "invalid_block_size", "max": MAX_BLOCK_SIZE}), 400
+    scheme = None
+    if storage != "replicated":
+        try:
+            scheme = erasure.parse_scheme(storage)
+        except ValueError as e:
+            return jsonify({"error": "invalid_storage", "detail": str(e)}), 400
+    if digests is not None and (scheme is not None or len(digests) != num_chunks):
+        return jsonify({"error": "invalid_dedup", "detail": "needs replicated storage and one digest per chunk"}), 400
+    if digests is not None and codec != (body.get("codecs") or [body.get("codec", "none")])[0]:
+        # the digests cover chunks compressed with the codec the client asked for
+        return jsonify({"error": "codec_not_allowed", "codec": codec}), 400
+
+    alive_dns = DATANODES.alive()
 
     if not alive_dns:
         return jsonify({"error": "no_datanodes_available"}), 503
 
     client_ip = request.remote_addr
-    prioritized_dns = sort_datanodes_by_priority(alive_dns, client_ip)
-
-    chunks, chunks_info = [], {}
-    for i in range(num_chunks):
-        chunk_id = f"{filename}.chunk.{i}"
-        selected = []
-        for r in range(REPLICA_FACTOR):
-            selected.append(prioritized_dns[(i + r) % len(prioritized_dns)])
-        chunks.append(chunk_id)
-        chunks_info[chunk_id] = selected
-        if chunk_id in client_checksums:
-            CHECKSUMS[chunk_id] = client_checksums[chunk_id]
+    hosts = {dn: DATANODES.host(dn) for dn in alive_dns}
+    def place(n):
+        return PLACEMENT.place(n, REPLICA_FACTOR, alive_dns, DATANODES.stats(alive_dns),
+                               block_size, client_ip, hosts=hosts)
 
     with LOCK:
-        state["files"][filename] = {"chunks": chunks, "chunks_info": chunks_info}
-        save_metadata()
+        # placement charges the nodes it picks, so a path we cannot write must fail before it
+        NAMESPACE.check_file(filename)
+        # only bytes the cluster does not hold yet need room; checked again under LOCK below
+        if digests is not None:
+            missing = len({sha for sha in digests if live_block_with(sha) is None})
+    if digests is not None:
+        placement = place(missing)
+    elif scheme is None:
+        placement = place(num_chunks)
+    else:
+        # one placement row per stripe, so its k + m blocks land on distinct nodes where possible
+        placement = PLACEMENT.place(math.ceil(num_chunks / scheme.k), scheme.k + scheme.m, alive_dns,
+                                    DATANODES.stats(alive_dns), block_size, client_ip, hosts=hosts)
+        if len(alive_dns) < scheme.k + scheme.m:
+            print(f"[NameNode] Only {len(alive_dns)} alive datanodes for {scheme.name}: "
+                  f"some hold several blocks of a stripe")
 
-    result = []
     with LOCK:
-        for c in chunks:
-            dns = state["files"][filename]["chunks_info"][c]
-            hosts = [state["datanodes"][dn]["host"] for dn in dns]
-            result.append({"chunk_id": c, "datanodes": dns, "dn_hosts": hosts})
+        # chunk IDs come from the file id, not the path, so renames never touch them
+        file_id = NAMESPACE.next_file_id
+        chunks = [f"blk_{file_id}.chunk.{i}" for i in range(num_chunks)]
+        info = {"id": file_id, "chunks": chunks, "block_size": block_size, "file_size": file_size, "codec": codec,
+                "checksums": {c: client_checksums[c] for c in chunks if c in client_checksums}}
+        edit = {"op": "add_file", "filename": filename, "info": info}
+        if digests is not None:
+            chunks, edit["new_blocks"] = dedup_layout(file_id, digests, placement, lambda: place(1)[0])
+            info.update(chunks=chunks, chunks_info={}, dedup=True, checksums=dict(zip(chunks, digests)))
+            chunks_info = {c: block["dns"] for c, block in edit["new_blocks"].items()}
+        elif scheme is None:
+            info["chunks_info"] = chunks_info = dict(zip(chunks, placement))
+        else:
+            info["chunks_info"], info["ec"] = stripe_layout(file_id, chunks, scheme, placement)
+            chunks_info = info["chunks_info"]
+        # an overwritten file's own chunks, and shared blocks it held the last reference to,
+        # go once the new file is logged
+        existing = NAMESPACE.get_file(filename)
+        replaced = ([(c, list(dns)) for c, dns in existing.get("chunks_info", {}).items()]
+                    if existing and not existing.get("dedup") else [])
+        txid, freed = log_freeing_edit(edit)
+        replaced += freed
+        for chunk_id, dn_list in replaced:
+            for dn in dn_list:
+                SCAN_RESULTS.pop((chunk_id, dn), None)
+    EDITLOG.sync(txid)
+    delete_replicas(replaced)
+
+    sent = set()
 
-    print(f"[NameNode] Prepared upload plan for {filename} ({len(alive_dns)} alive datanodes)")
-    return jsonify({"chunks": result})
+    def plan_entry(c):
+        # "exists": the NameNode already has these bytes (or an earlier chunk of this upload carries them)
+        dns = chunks_info.get(c, [])
+        entry = {"chunk_id": c, "datanodes": dns, "dn_hosts": [DATANODES.host(dn) for dn in dns]}
+        if digests is not None:
+            entry["exists"] = c not in chunks_info or c in sent
+            sent.add(c)
+        return entry
+
+    response = {"chunks": [plan_entry(c) for c in chunks], "block_size": block_size, "codec": codec,
+                "storage": storage}
+    if digests is not None:
+        response["dedup"] = True
+        print(f"[NameNode] {filename}: {sum(1 for e in response['chunks'] if e['exists'])} of {num_chunks} "
+              f"chunks already stored")
+    if scheme is not None:
+        response["ec"] = info["ec"]
+        response["parity"] = [plan_entry(c) for stripe in info["ec"]["stripes"] for c in stripe[scheme.k:]]
+
+    print(f"[NameNode] Prepared upload plan for {filename} ({len(alive_dns)} alive datanodes, {PLACEMENT.name} placement, "
+          f"{storage})")
+    return jsonify(response)
+
+# --------------------------- Complete Upload ---------------------------
+@app.route("/complete_file", methods=["POST"])
+def complete_file():
+    """
+    Commits the per-chunk SHA-256s the client computed while streaming the
+    upload (of the stored, possibly compressed, bytes) and the stored size.
+    Erasure-coded files also send each block's stored size ("chunk_sizes"),
+    which rebuilding a block needs to strip the stripe's zero padding.
+    """
+    body = request.json
+    filename = normalize(body.get("filename"))
+    checksums = body.get("checksums", {})
+    stored_size = body.get("stored_size")
+    chunk_sizes = body.get("chunk_sizes")
+    with LOCK:
+        finfo = NAMESPACE.get_file(filename)
+        if finfo is None:
+            return jsonify({"error": "file_not_found"}), 404
+        known = set(finfo["chunks"]) | set(finfo["chunks_info"])
+        checksums = {c: sha for c, sha in checksums.items() if c in known}
+        edit = {"op": "set_checksums", "filename": filename, "checksums": checksums}
+        if stored_size is not None:
+            edit["stored_size"] = int(stored_size)
+        if chunk_sizes:
+            edit["chunk_sizes"] = {c: int(n) for c, n in chunk_sizes.items() if c in known}
+        txid = log_edit(edit)
+    EDITLOG.sync(txid)
+    print(f"[NameNode] Committed {len(checksums)} checksums for {filename}")
+    return jsonify({"status": "committed", "filename": filename})
 
 # --------------------------- DataNode Monitor ---------------------------
 def monitor_datanodes():
     while True:
+        expired = DATANODES.wait_expired()
         now = time.time()
-        changed = False
-        with LOCK:
-            for dn, info in list(state["datanodes"].items()):
-                if now - info.get("last_seen", 0) > HEARTBEAT_TIMEOUT:
-                    if info.get("alive"):
-                        print(f"[NameNode] Marking {dn} as DEAD (no heartbeat for {now - info['last_seen']:.1f}s)")
-                        state["datanodes"][dn]["alive"] = False
-                        changed = True
-                        threading.Thread(target=trigger_replication_for_dn, args=(dn,), daemon=True).start()
-                else:
-                    if not info.get("alive"):
-                        print(f"[NameNode] Marking {dn} as ALIVE again (heartbeat received)")
-                        state["datanodes"][dn]["alive"] = True
-                        changed = True
-        if changed:
-            save_metadata()
-        time.sleep(3)
+        for dn, last_seen in expired:
+            print(f"[NameNode] Marking {dn} as DEAD (no heartbeat for {now - last_seen:.1f}s)")
+            trigger_replication_for_dn(dn)
+
+# --------------------------- Deduplication ---------------------------
+def live_block_with(sha256):
+    """Committed shared block holding these bytes with a live replica, or None; caller holds LOCK."""
+    block_id = BLOCK_MAP.block_with(sha256)
+    if block_id and any(DATANODES.is_alive(dn) for dn in BLOCK_MAP.replicas_of(block_id)):
+        return block_id
+    return None
+
+def dedup_layout(file_id, digests, placement, place_more):
+    """
+    (chunks, new shared blocks) for a new deduplicated file; caller holds LOCK.
+    A chunk whose bytes a committed shared block already holds refers to that
+    block, and one repeating an earlier chunk of the same upload refers to
+    that. The rest become new blocks named after this file, taking rows of
+    placement in order (place_more() if blocks went away since it was made).
+    """
+    rows = iter(placement)
+    chunks, new_blocks, seen = [], {}, {}
+    for i, sha in enumerate(digests):
+        block_id = seen.get(sha) or live_block_with(sha)
+        if block_id is None:
+            block_id = f"blk_{file_id}.chunk.{i}"
+            new_blocks[block_id] = {"sha256": sha, "dns": next(rows, None) or place_more(), "committed": False}
+        seen[sha] = block_id
+        chunks.append(block_id)
+    return chunks, new_blocks
+
+# --------------------------- Erasure Coding ---------------------------
+def stripe_layout(file_id, chunks, scheme, placement):
+    """
+    (chunks_info, ec) for a new erasure-coded file. Every k data chunks form a
+    stripe with m parity blocks "blk_<id>.parity.<stripe>.<j>"; each block has
+    a single copy, spread over the stripe's placement row. A stripe lists k + m
+    block ids, with None for data slots past the end of the file.
+    """
+    k, m = scheme.k, scheme.m
+    chunks_info, stripes = {}, []
+    for s, nodes in enumerate(placement):
+        data = chunks[s * k:(s + 1) * k]
+        stripe = data + [None] * (k - len(data)) + [f"blk_{file_id}.parity.{s}.{j}" for j in range(m)]
+        for j, c in enumerate(stripe):
+            if c:
+                chunks_info[c] = [nodes[j % len(nodes)]]
+        stripes.append(stripe)
+    return chunks_info, {"scheme": scheme.name, "k": k, "m": m, "stripes": stripes}
+
+def stripe_of(finfo, chunk_id):
+    """(stripe block ids, position of chunk_id in it) for a block of an erasure-coded file."""
+    parts = chunk_id.split(".")
+    if parts[-3] == "parity":
+        stripe = finfo["ec"]["stripes"][int(parts[-2])]
+    else:
+        stripe = finfo["ec"]["stripes"][int(parts[-1]) // finfo["ec"]["k"]]
+    return stripe, stripe.index(chunk_id)
+
+def stripe_margin(finfo, chunk_id):
+    """(blocks of the stripe still readable, k); caller holds LOCK. Missing data slots count as known zeros."""
+    stripe, _ = stripe_of(finfo, chunk_id)
+    usable = sum(1 for c in stripe if c is None or any(DATANODES.is_alive(dn) for dn in BLOCK_MAP.replicas_of(c)))
+    return usable, finfo["ec"]["k"]
+
+def rebuild_plan(chunk, finfo):
+    """
+    replication_plan() for a block of an erasure-coded file; caller holds LOCK.
+    Its single copy is decoded from the rest of the stripe, so the live holders
+    of the other blocks stand in as sources and targets avoid them.
+    """
+    if any(DATANODES.is_alive(dn) for dn in BLOCK_MAP.replicas_of(chunk)):
+        return None
+    stripe, _ = stripe_of(finfo, chunk)
+    usable, k = stripe_margin(finfo, chunk)
+    if usable < k:
+        print(f"[NameNode] {chunk} is lost: {usable} of its stripe's {len(stripe)} blocks left, {k} needed")
+        return None
+    sources = sorted({dn for c in stripe if c for dn in BLOCK_MAP.replicas_of(c) if DATANODES.is_alive(dn)})
+    alive = DATANODES.alive()
+    candidates = [d for d in alive if d not in sources] or alive
+    return usable - k + 1, sources, PLACEMENT.rank(candidates, DATANODES.stats(candidates))
+
+def fetch_block(chunk, dns, expected):
+    """Stored bytes of a chunk from the first of dns that serves a copy matching expected, or None."""
+    for dn in dns:
+        try:
+            r = requests.get(f"{DATANODES.host(dn)}/get_chunk_raw", params={"chunk_id": chunk},
+                             timeout=REPLICATION_TIMEOUT)
+        except requests.RequestException as e:
+            print(f"[NameNode] Reading {chunk} from {dn} failed: {e}")
+            continue
+        if r.status_code == 200 and (not expected or hashlib.sha256(r.content).hexdigest() == expected):
+            return r.content
+        print(f"[NameNode] Reading {chunk} from {dn} failed: {r.status_code}")
+    return None
+
+def rebuild_block(chunk, target_dn):
+    """
+    Decodes a lost block of an erasure-coded file from k surviving blocks of
+    its stripe and stores it on target_dn, which checks it against the
+    checksum the uploader committed.
+    """
+    with LOCK:
+        finfo = file_of_chunk(chunk)
+        if finfo is None:
+            return True  # deleted meanwhile
+        scheme = erasure.parse_scheme(finfo["ec"]["scheme"])
+        stripe, index = stripe_of(finfo, chunk)
+        holders = {c: sorted(dn for dn in BLOCK_MAP.replicas_of(c) if DATANODES.is_alive(dn)) for c in stripe if c}
+        checksums = {c: finfo.get("checksums", {}).get(c) for c in stripe if c}
+        size = finfo.get("chunk_sizes", {}).get(chunk)
+    if index < scheme.k and size is None:
+        print(f"[NameNode] Cannot rebuild {chunk}: its size was never committed")
+        return False
+    available = {i: b"" for i, c in enumerate(stripe) if c is None}
+    for i, c in enumerate(stripe):
+        if len(available) >= scheme.k:
+            break
+        if c and c != chunk:
+            data = fetch_block(c, holders[c], checksums[c])
+            if data is not None:
+                available[i] = data
+    if len(available) < scheme.k:
+        print(f"[NameNode] Cannot rebuild {chunk}: read {len(available)} of the {scheme.k} blocks needed")
+        return False
+    data = scheme.reconstruct(available, [index], max(len(b) for b in available.values()))[index]
+    if index < scheme.k:
+        data = data[:size]
+    headers = {"Content-Type": "application/octet-stream", "X-Chunk-Id": chunk}
+    if checksums[chunk]:
+        headers["X-Checksum-Sha256"] = checksums[chunk]
+    r = requests.post(f"{DATANODES.host(target_dn)}/store_chunk_raw", data=data, headers=headers,
+                      timeout=REPLICATION_TIMEOUT)
+    if r.status_code != 200:
+        print(f"[NameNode] Storing rebuilt {chunk} on {target_dn} failed: {r.status_code}")
+        return False
+    return record_copy(chunk, target_dn, "Rebuilt")
 
 # --------------------------- Replication Logic ---------------------------
+def replication_plan(chunk):
+    """(live replicas, possible sources, possible targets) for REPLICATION, or None if nothing to do."""
+    with LOCK:
+        finfo = file_of_chunk(chunk)
+        if finfo is not None and "ec" in finfo:
+            return rebuild_plan(chunk, finfo)
+        replica_dns = BLOCK_MAP.replicas_of(chunk)
+    if finfo is None:
+        return None
+    alive_replicas = sorted(dn for dn in replica_dns if DATANODES.is_alive(dn))
+    if len(alive_replicas) >= REPLICA_FACTOR or not alive_replicas:
+        return None
+    candidates = [d for d in DATANODES.alive() if d not in alive_replicas]
+    if not candidates:
+        return None
+    candidates = PLACEMENT.rank(candidates, DATANODES.stats(candidates))
+    return len(alive_replicas), alive_replicas, candidates
+
+def copy_replica(chunk, source_dn, target_dn):
+    """Asks source_dn to stream a chunk to target_dn and records the new replica.
+    Blocks of erasure-coded files are rebuilt from their stripe instead."""
+    with LOCK:
+        finfo = file_of_chunk(chunk)
+    if finfo is not None and "ec" in finfo:
+        return rebuild_block(chunk, target_dn)
+    src_host = DATANODES.host(source_dn)
+    tgt_host = DATANODES.host(target_dn)
+    r = requests.post(f"{src_host}/replicate_chunk",
+                      json={"chunk_id": chunk, "target_host": tgt_host},
+                      timeout=REPLICATION_TIMEOUT)
+    if r.status_code != 200:
+        print(f"[NameNode] Replication of {chunk} {source_dn} -> {target_dn} failed: {r.status_code}")
+        return False
+    return record_copy(chunk, target_dn, "Replicated")
+
+def record_copy(chunk, target_dn, verb):
+    with LOCK:
+        if BLOCK_MAP.file_of(chunk) is None:
+            return True  # deleted while copying
+        txid = log_edit({"op": "add_replica", "chunk_id": chunk, "dn_id": target_dn})
+    EDITLOG.sync(txid)
+    print(f"[NameNode] {verb} {chunk} to {target_dn}")
+    return True
+
+def live_copies(chunk):
+    """
+    Re-replication priority of a chunk; caller holds LOCK. Its live replicas,
+    or for a block of an erasure-coded file one more than the blocks its
+    stripe can still lose, so 1 means one more failure loses data either way.
+    """
+    finfo = file_of_chunk(chunk)
+    if finfo is not None and "ec" in finfo:
+        usable, k = stripe_margin(finfo, chunk)
+        return usable - k + 1
+    return sum(1 for dn in BLOCK_MAP.replicas_of(chunk) if DATANODES.is_alive(dn))
+
+REPLICATION = ReplicationManager(replication_plan, copy_replica, workers=REPLICATION_WORKERS,
+                                 max_streams_per_node=REPLICATION_STREAMS_PER_DN,
+                                 max_attempts=REPLICATION_MAX_ATTEMPTS, backoff=REPLICATION_BACKOFF)
+
+METRICS.gauge_fn("hdfs_replication_queued", "Chunks waiting for re-replication.",
+                  lambda: REPLICATION.stats()["queued"])
+METRICS.gauge_fn("hdfs_replication_in_flight", "Chunk copies in progress.",
+                  lambda: REPLICATION.stats()["in_flight"])
+METRICS.counter_fn("hdfs_replication_completed_total", "Chunk copies completed.",
+                   lambda: REPLICATION.stats()["completed"])
+METRICS.counter_fn("hdfs_replication_failed_total", "Chunks given up on after all retries.",
+                   lambda: REPLICATION.stats()["failed"])
+METRICS.counter_fn("hdfs_replication_retried_total", "Chunk copies retried after a failure.",
+                   lambda: REPLICATION.stats()["retried"])
+
 def trigger_replication_for_dn(dead_dn):
+    """Queues every chunk that had a replica on dead_dn, least-replicated first.
+    Lost blocks of erasure-coded files are rebuilt from the survivors of their stripe."""
+    with LOCK:
+        dead_chunks = BLOCK_MAP.chunks_on(dead_dn)
+        live = {c: live_copies(c) for c in dead_chunks}
+    for chunk in dead_chunks:
+        REPLICATION.schedule(chunk, live[chunk])
+    print(f"[NameNode] Queued {len(dead_chunks)} chunks from {dead_dn} for re-replication")
+
+def re_replicate(chunk):
     with LOCK:
-        files_copy = dict(state["files"])
-    for fname, finfo in files_copy.items():
-        for chunk in finfo["chunks"]:
-            with LOCK:
-                replica_dns = list(finfo["chunks_info"].get(chunk, []))
-                alive_replicas = [dn for dn in replica_dns if state["datanodes"].get(dn, {}).get("alive")]
-                alive_nodes = [dn for dn, info in state["datanodes"].items() if info.get("alive")]
-
-            if dead_dn in replica_dns and len(alive_replicas) < REPLICA_FACTOR:
-                candidates = [d for d in alive_nodes if d not in alive_replicas]
-
-                if not candidates and alive_replicas:
-                    target_dn = alive_replicas[0]
-                elif candidates:
-                    target_dn = candidates[0]
-                else:
-                    continue
-
-                source_dn = alive_replicas[0] if alive_replicas else None
-                if not source_dn:
-                    continue
-
-                src_host = state["datanodes"][source_dn]["host"]
-                tgt_host = state["datanodes"][target_dn]["host"]
-
-                try:
-                    r = requests.post(f"{src_host}/replicate_chunk",
-                                      json={"chunk_id": chunk, "target_host": tgt_host},
-                                      timeout=8)
-                    if r.status_code == 200:
-                        with LOCK:
-                            if target_dn not in state["files"][fname]["chunks_info"][chunk]:
-                                state["files"][fname]["chunks_info"][chunk].append(target_dn)
-                            save_metadata()
-                        print(f"[NameNode] Replicated {chunk} to {target_dn}")
-                except Exception as e:
-                    print("[NameNode] Replication error:", e)
+        live = live_copies(chunk)
+    REPLICATION.schedule(chunk, live)
+
+@app.route("/replication_status", methods=["GET"])
+def replication_status():
+    """Queue depth and throughput of the re-replication scheduler."""
+    return jsonify(REPLICATION.stats())
 
 # --------------------------- Register Stored Chunk ---------------------------
 @app.route("/register_chunk", methods=["POST"])
@@ -167,49 +656,148 @@ def register_chunk():
     chunk_id = data.get("chunk_id")
     dn_id = data.get("dn_id")
 
-    if not filename or not chunk_id or not dn_id:
+    if not chunk_id or not dn_id:
         return jsonify({"error": "missing_parameters"}), 400
 
     with LOCK:
-        if filename not in state["files"]:
-            state["files"][filename] = {"chunks": [], "chunks_info": {}}
-        if chunk_id not in state["files"][filename]["chunks_info"]:
-            state["files"][filename]["chunks_info"][chunk_id] = []
-        if dn_id not in state["files"][filename]["chunks_info"][chunk_id]:
-            state["files"][filename]["chunks_info"][chunk_id].append(dn_id)
-        save_metadata()
+        if BLOCK_MAP.file_of(chunk_id) is None:
+            return jsonify({"error": "unknown_chunk"}), 404
+        txid = log_edit({"op": "add_replica", "chunk_id": chunk_id, "dn_id": dn_id})
+        SCAN_RESULTS.pop((chunk_id, dn_id), None)  # fresh copy, earlier verdict no longer applies
+    EDITLOG.sync(txid)
 
     print(f"[NameNode] Registered {chunk_id} from {dn_id} for {filename}")
     return jsonify({"status": "registered"})
 
+# --------------------------- Block Reports ---------------------------
+@app.route("/block_report", methods=["POST"])
+def block_report():
+    """
+    Bulk replica updates from a DataNode, applied under one LOCK and one log sync.
+      incremental: {"dn_id", "reports": [{"op": "added"|"deleted", "chunk_id", "filename"}, ...]}
+      full:        {"dn_id", "full": true, "chunks": [{"chunk_id", "filename"}, ...]}
+    A full report also drops replicas the DataNode no longer has and re-replicates them.
+    Chunks that belong to no known file are ignored and returned as "unknown".
+    """
+    body = request.json
+    dn_id = body.get("dn_id")
+    if not dn_id:
+        return jsonify({"error": "missing_dn_id"}), 400
+
+    if body.get("full"):
+        reports = [{"op": "added", "chunk_id": c["chunk_id"]} for c in body.get("chunks", [])]
+    else:
+        reports = body.get("reports", [])
+
+    txid, applied, unknown, missing = None, 0, [], []
+    with LOCK:
+        if body.get("full"):
+            reported = {r["chunk_id"] for r in reports}
+            missing = sorted(BLOCK_MAP.chunks_on(dn_id) - reported)
+            reports = reports + [{"op": "deleted", "chunk_id": c} for c in missing]
+        for r in reports:
+            chunk_id = r["chunk_id"]
+            listed = dn_id in BLOCK_MAP.replicas_of(chunk_id)
+            if BLOCK_MAP.file_of(chunk_id) is None:
+                if r["op"] == "added":
+                    unknown.append(chunk_id)
+                continue
+            if r["op"] == "added" and not listed:
+                txid = log_edit({"op": "add_replica", "chunk_id": chunk_id, "dn_id": dn_id})
+            elif r["op"] == "deleted" and listed:
+                txid = log_edit({"op": "remove_replica", "chunk_id": chunk_id, "dn_id": dn_id})
+            else:
+                continue
+            SCAN_RESULTS.pop((chunk_id, dn_id), None)
+            applied += 1
+    if txid:
+        EDITLOG.sync(txid)
+    for chunk_id in missing:
+        re_replicate(chunk_id)
+
+    kind = "full" if body.get("full") else "incremental"
+    print(f"[NameNode] {kind} block report from {dn_id}: {len(reports)} entries, {applied} applied, "
+          f"{len(missing)} missing, {len(unknown)} unknown")
+    return jsonify({"status": "ok", "applied": applied, "missing": missing, "unknown": unknown})
+
+# --------------------------- Block Scanner Reports ---------------------------
+@app.route("/report_scan", methods=["POST"])
+def report_scan():
+    """
+    Records block scanner verdicts from a DataNode. A replica found corrupt is
+    dropped from the namespace (if another replica exists, or the block can be
+    rebuilt from its erasure-coded stripe) and re-replicated.
+    """
+    body = request.json
+    dn_id = body.get("dn_id")
+    results = body.get("results", [])
+    if not dn_id:
+        return jsonify({"error": "missing_dn_id"}), 400
+
+    corrupt, txid = [], None
+    with LOCK:
+        for r in results:
+            chunk_id = r["chunk_id"]
+            SCAN_RESULTS[(chunk_id, dn_id)] = {"status": r["status"], "scanned_at": r.get("scanned_at")}
+            if r["status"] != "corrupted" or dn_id not in BLOCK_MAP.replicas_of(chunk_id):
+                continue
+            finfo = file_of_chunk(chunk_id)
+            # replicas on dead nodes cannot be copied from, so they do not count as a spare
+            others = [dn for dn in BLOCK_MAP.replicas_of(chunk_id) if dn != dn_id and DATANODES.is_alive(dn)]
+            if not others and not (finfo and "ec" in finfo):
+                print(f"[NameNode] Only live replica of {chunk_id} (on {dn_id}) is corrupt; keeping it")
+                continue
+            txid = log_edit({"op": "remove_replica", "chunk_id": chunk_id, "dn_id": dn_id})
+            corrupt.append(chunk_id)
+    if txid:
+        EDITLOG.sync(txid)
+    for chunk_id in corrupt:
+        print(f"[NameNode] {dn_id} reported corrupt replica of {chunk_id}; re-replicating")
+        re_replicate(chunk_id)
+    return jsonify({"status": "ok", "corrupt": corrupt})
+
 # --------------------------- Chunk Map ---------------------------
 @app.route("/get_chunk_map", methods=["GET"])
 def get_chunk_map():
-    filename = request.args.get("filename")
+    filename = normalize(request.args.get("filename"))
     with LOCK:
-        if filename not in state["files"]:
+        file_info = NAMESPACE.get_file(filename)
+        if file_info is None:
             return jsonify({"error": "file_not_found"}), 404
-        file_info = state["files"][filename]
-        result = []
-        for chunk_id in file_info["chunks"]:
-            dns = file_info["chunks_info"][chunk_id]
-            alive_dns = [dn for dn in dns if state["datanodes"].get(dn, {}).get("alive")]
+        replicas = chunk_replicas(file_info)
+
+        def entry(chunk_id):
+            dns = replicas.get(chunk_id, [])
+            alive_dns = [dn for dn in dns if DATANODES.is_alive(dn)]
             prioritized_dns = sort_datanodes_by_priority(alive_dns, request.remote_addr)
-            dn_hosts = [state["datanodes"][dn]["host"] for dn in prioritized_dns]
-            result.append({"chunk_id": chunk_id, "dn_hosts": dn_hosts})
+            dn_hosts = [DATANODES.host(dn) for dn in prioritized_dns]
+            return {"chunk_id": chunk_id, "dn_hosts": dn_hosts,
+                    "checksum": file_info.get("checksums", {}).get(chunk_id)}
+
+        # deduplicated files may point at other files' blocks, so "index" gives each chunk's position
+        result = [dict(entry(chunk_id), index=i) for i, chunk_id in enumerate(file_info["chunks"])]
+        response = {"chunks": result, "block_size": file_info.get("block_size", LEGACY_BLOCK_SIZE),
+                    "file_size": file_info.get("file_size"), "codec": file_info.get("codec", "none"),
+                    "generation": file_info.get("generation", 0)}
+        ec = file_info.get("ec")
+        if ec:
+            # every block of every stripe, so the client can decode data blocks it fails to read
+            sizes = file_info.get("chunk_sizes", {})
+            response["ec"] = dict(ec, stripes=[[dict(entry(c), size=sizes.get(c)) if c else None for c in stripe]
+                                               for stripe in ec["stripes"]])
     print(f"[NameNode] Sent chunk map for {filename} to client.")
-    return jsonify({"chunks": result})
+    return jsonify(response)
 
 # --------------------------- Download Metadata ---------------------------
 @app.route('/download_metadata', methods=['POST'])
 def download_metadata():
     data = request.get_json()
-    filename = data.get("filename")
+    filename = normalize(data.get("filename"))
     with LOCK:
-        if filename not in state["files"]:
+        file_info = NAMESPACE.get_file(filename)
+        if file_info is None:
             return jsonify({"error": "File not found"}), 404
-        file_info = state["files"][filename]
-        chunks_info = file_info["chunks_info"]
+        chunks_info = {c: list(dns) for c, dns in chunk_replicas(file_info).items()}
     response = {"filename": filename, "chunks_info": chunks_info}
     return jsonify(response), 200
 
@@ -217,8 +805,8 @@ def download_metadata():
 @app.route('/')
 def dashboard():
     with LOCK:
-        files = dict(state.get("files", {}))
-        datanodes = dict(state.get("datanodes", {}))
+        files = {path: dict(info, chunks_info=chunk_replicas(info)) for path, info in NAMESPACE.walk()}
+    datanodes = DATANODES.snapshot()
     now = time.time()
     html = """
     <!DOCTYPE html>
@@ -244,7 +832,7 @@ def dashboard():
             <h2>Stored Files</h2>
             {% if files %}
             {% for fname, info in files.items() %}
-                <h3>{{ fname }}</h3>
+                <h3>{{ fname }}{% if info.get("ec") %} ({{ info["ec"]["scheme"] }}){% endif %}</h3>
                 <table>
                     <tr><th>Chunk ID</th><th>Replicas (Datanodes)</th></tr>
                     {% for cid, dns in info["chunks_info"].items() %}
@@ -259,7 +847,8 @@ def dashboard():
         <div class="section">
             <h2>Datanode Status</h2>
             <table>
-                <tr><th>ID</th><th>Host</th><th>Last Seen (s ago)</th><th>Status</th></tr>
+                <tr><th>ID</th><th>Host</th><th>Last Seen (s ago)</th><th>Status</th>
+                    <th>Used / Capacity (MB)</th><th>Chunks</th><th>Transfers</th></tr>
                 {% for dn, info in datanodes.items() %}
                     {% set diff = now - info.get("last_seen", 0) %}
                     {% if diff <= """ + str(HEARTBEAT_TIMEOUT) + """ %}
@@ -274,6 +863,10 @@ def dashboard():
                         <td>{{ info.get("host", "") }}</td>
                         <td>{{ "%.1f" % diff }}</td>
                         <td class="{{ cls }}">{{ status }}</td>
+                        {% set st = info.get("stats", {}) %}
+                        <td>{% if st.get("capacity") %}{{ "%.1f / %.0f" % (st.get("used", 0) / 1048576, st["capacity"] / 1048576) }}{% endif %}</td>
+                        <td>{{ st.get("chunks", "") }}</td>
+                        <td>{{ st.get("active_transfers", "") }}</td>
                     </tr>
                 {% endfor %}
             </table>
@@ -284,55 +877,205 @@ def dashboard():
     return render_template_string(html, files=files, datanodes=datanodes, now=now)
 
 # --------------------------- List & Delete ---------------------------
+LIST_FIELDS = ("names", "sizes", "blocks")
+
+def list_params(args):
+    """(fields, limit) from a listing request; raises ValueError on bad input."""
+    fields = args.get("fields", "names")
+    if fields not in LIST_FIELDS:
+        raise ValueError("invalid_fields")
+    try:
+        limit = min(max(1, int(args.get("limit", LIST_PAGE_SIZE))), LIST_MAX_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("invalid_limit")
+    return fields, limit
+
+def file_entry(name, info, fields):
+    entry = {"name": name, "size": info.get("file_size"), "num_chunks": len(info["chunks"]),
+             "block_size": info.get("block_size", LEGACY_BLOCK_SIZE), "codec": info.get("codec", "none"),
+             "stored_size": info.get("stored_size"),
+             "storage": info["ec"]["scheme"] if "ec" in info else "replicated", "dedup": bool(info.get("dedup")),
+             "generation": info.get("generation", 0)}
+    if fields == "blocks":
+        entry["chunks_info"] = {c: list(dns) for c, dns in chunk_replicas(info).items()}
+    return entry
+
 @app.route("/list_files", methods=["GET"])
 def list_files():
+    """
+    Without parameters: {path: chunks_info} for the whole namespace (legacy).
+    With any of fields / prefix / limit / after: one page of files in path order,
+      {"files": [...], "next": <cursor or null>}
+    fields=names  -> ["/path", ...]
+    fields=sizes  -> [{"name", "size", "num_chunks", "block_size", "codec", "stored_size", "storage", "dedup",
+                      "generation"}, ...]
+    fields=blocks -> the same plus "chunks_info"
+    prefix matches the start of the full path; only the directory it ends in is
+    searched. Pass the returned "next" back as after= to get the following page.
+    """
+    args = request.args
+    if not any(k in args for k in ("fields", "prefix", "limit", "after")):
+        with LOCK:
+            result = {path: chunk_replicas(info) for path, info in NAMESPACE.walk()}
+        return jsonify(result)
+
+    try:
+        fields, limit = list_params(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     with LOCK:
-        files = list(state["files"].keys())
-    result = {}
-    for fname in files:
-        info = state["files"][fname]
-        result[fname] = info.get("chunks_info", {})
-    return jsonify(result)
+        page = list(itertools.islice(NAMESPACE.walk(args.get("prefix", ""), args.get("after")), limit + 1))
+        more = len(page) > limit
+        page = page[:limit]
+        if fields == "names":
+            files = [path for path, _ in page]
+        else:
+            files = [file_entry(path, info, fields) for path, info in page]
+    return jsonify({"files": files, "next": page[-1][0] if more else None})
 
-@app.route("/delete_file", methods=["POST"])
-def delete_file():
-    body = request.json
-    filename = body.get("filename")
-    if not filename or filename not in state["files"]:
-        return jsonify({"error": "file_not_found"}), 404
-    file_info = state["files"][filename]
-    for chunk_id, dn_list in file_info["chunks_info"].items():
-        for dn in list(dn_list):
+def delete_replicas(replicas):
+    """Asks DataNodes to drop [(chunk_id, [dn, ...]), ...]; failures only leave orphans behind."""
+    for chunk_id, dn_list in replicas:
+        for dn in dn_list:
             try:
-                host = state["datanodes"][dn]["host"]
+                host = DATANODES.host(dn)
                 requests.post(f"{host}/delete_chunk", json={"chunk_id": chunk_id}, timeout=5)
             except Exception as e:
                 print(f"[NameNode] Warning: delete failed on {dn}: {e}")
+
+@app.route("/delete_file", methods=["POST"])
+def delete_file():
+    """
+    Deletes a file, or a directory with "recursive": true (or when it is empty).
+    Blocks shared through deduplication are only deleted from the DataNodes once
+    no file refers to them any more, and only after the delete is logged, so a
+    concurrent upload can never be handed a block that is going away.
+    """
+    body = request.json
+    filename = normalize(body.get("path") or body.get("filename"))
+    with LOCK:
+        node = NAMESPACE.lookup(filename)
+        if node is None or filename == "/":
+            return jsonify({"error": "file_not_found"}), 404
+        if is_dir(node) and node["children"] and not body.get("recursive"):
+            return jsonify({"error": "directory_not_empty", "path": filename}), 409
+        files = [info for _, info in NAMESPACE.walk(filename + "/")] if is_dir(node) else [node]
+        replicas = [(c, list(dns)) for info in files if not info.get("dedup")
+                    for c, dns in info["chunks_info"].items()]
+    delete_replicas(replicas)
     with LOCK:
-        del state["files"][filename]
-        save_metadata()
-    print(f"[NameNode] Deleted file {filename} and its chunks from all datanodes.")
-    return jsonify({"status": "deleted", "filename": filename})
+        node = NAMESPACE.lookup(filename)
+        files = ([info for _, info in NAMESPACE.walk(filename + "/")] if is_dir(node) else [node]) if node else []
+        shared = {c for info in files if info.get("dedup") for c in info["chunks"] if c in state["blocks"]}
+        txid, reclaimed = log_freeing_edit({"op": "delete", "path": filename})
+        for chunk_id, dn_list in replicas + reclaimed:
+            for dn in dn_list:
+                SCAN_RESULTS.pop((chunk_id, dn), None)
+    EDITLOG.sync(txid)
+    delete_replicas(reclaimed)
+    print(f"[NameNode] Deleted {filename} and its {len(replicas)} chunks from all datanodes "
+          f"({len(reclaimed)} of {len(shared)} shared blocks reclaimed).")
+    return jsonify({"status": "deleted", "filename": filename, "chunks": len(replicas) + len(reclaimed),
+                    "shared_kept": len(shared) - len(reclaimed)})
+
+# --------------------------- Directories ---------------------------
+@app.route("/mkdir", methods=["POST"])
+def mkdir():
+    """Creates a directory and any missing parents; a no-op if it exists."""
+    path = normalize(request.json.get("path"))
+    with LOCK:
+        node = NAMESPACE.lookup(path)
+        if node is not None and is_dir(node):
+            return jsonify({"status": "exists", "path": path})
+        txid = log_edit({"op": "mkdir", "path": path})
+    EDITLOG.sync(txid)
+    print(f"[NameNode] Created directory {path}")
+    return jsonify({"status": "created", "path": path})
+
+@app.route("/rename", methods=["POST"])
+def rename():
+    """
+    Moves a file or directory to a new path. One edit whatever the size of the
+    subtree: chunk IDs and replicas stay as they are.
+    """
+    body = request.json
+    src, dst = normalize(body.get("src")), normalize(body.get("dst"))
+    with LOCK:
+        txid = log_edit({"op": "rename", "src": src, "dst": dst})
+    EDITLOG.sync(txid)
+    print(f"[NameNode] Renamed {src} -> {dst}")
+    return jsonify({"status": "renamed", "src": src, "dst": dst})
+
+@app.route("/listdir", methods=["GET"])
+def listdir():
+    """
+    One page of a directory's direct children in name order:
+      {"path", "entries": [...], "next": <cursor or null>}
+    Each entry has "name" and "type" ("dir" or "file"); directories add
+    "children", and with fields=sizes/blocks files add the /list_files fields.
+    Listing a file returns just that file.
+    """
+    args = request.args
+    path = normalize(args.get("path"))
+    try:
+        fields, limit = list_params(args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with LOCK:
+        node = NAMESPACE.lookup(path)
+        if node is not None and not is_dir(node):
+            children = [(path.rsplit("/", 1)[1], node)]
+        else:
+            children = list(itertools.islice(NAMESPACE.listdir(path, args.get("after")), limit + 1))
+        more = len(children) > limit
+        children = children[:limit]
+        entries = []
+        for name, child in children:
+            if is_dir(child):
+                entries.append({"name": name, "type": "dir", "children": len(child["children"])})
+            elif fields == "names":
+                entries.append({"name": name, "type": "file"})
+            else:
+                entries.append(dict(file_entry(name, child, fields), type="file"))
+    return jsonify({"path": path, "entries": entries, "next": children[-1][0] if more else None})
 
 # --------------------------- Verification ---------------------------
 @app.route("/verify_file", methods=["GET"])
 def verify_file():
-    filename = request.args.get("filename")
-    if not filename or filename not in state["files"]:
-        return jsonify({"error": "file_not_found"}), 404
-    file_info = state["files"][filename]
-    status = {}
-    for chunk_id, dn_list in file_info["chunks_info"].items():
-        replicas_ok = []
+    """
+    Per-replica health of a file, answered from the latest block scanner
+    results. Only replicas not scanned yet (or all of them with ?deep=1) are
+    checked with a live /verify_chunk read.
+    """
+    filename = normalize(request.args.get("filename"))
+    deep = request.args.get("deep") in ("1", "true")
+    with LOCK:
+        finfo = NAMESPACE.get_file(filename)
+        if finfo is None:
+            return jsonify({"error": "file_not_found"}), 404
+        chunks_info = {c: list(dns) for c, dns in chunk_replicas(finfo).items()}
+        scans = {key: dict(SCAN_RESULTS[key]) for key in SCAN_RESULTS if key[0] in chunks_info}
+    status, scanned_at = {}, {}
+    for chunk_id, dn_list in chunks_info.items():
+        replicas_ok, replicas_scanned = [], []
         for dn in dn_list:
+            scan = scans.get((chunk_id, dn))
+            if scan and not deep:
+                replicas_ok.append(scan["status"] == "ok" and DATANODES.is_alive(dn))
+                replicas_scanned.append(scan["scanned_at"])
+                continue
             try:
-                host = state["datanodes"][dn]["host"]
+                host = DATANODES.host(dn)
                 r = requests.get(f"{host}/verify_chunk", params={"chunk_id": chunk_id}, timeout=5)
                 replicas_ok.append(r.status_code == 200)
             except Exception:
                 replicas_ok.append(False)
+            replicas_scanned.append(time.time())
         status[chunk_id] = replicas_ok
-    return jsonify({"filename": filename, "status": status})
+        scanned_at[chunk_id] = replicas_scanned
+    return jsonify({"filename": filename, "status": status, "scanned_at": scanned_at})
 
 # --------------------------- Chunk Ops (for testing) ---------------------------
 @app.route("/delete_chunk", methods=["POST"])
@@ -367,12 +1110,13 @@ def get_chunks_for_dn():
     if not dn_id:
         return jsonify({"error": "missing_dn_id"}), 400
 
+    # Each entry names a live peer holding the chunk so the DataNode can pull it if missing.
+    chunks = []
     with LOCK:
-        chunks = []
-        for fname, finfo in state["files"].items():
-            for chunk_id, dns in finfo["chunks_info"].items():
-                if dn_id in dns:
-                    chunks.append(chunk_id)
+        for chunk_id in BLOCK_MAP.chunks_on(dn_id):
+            sources = [dn for dn in BLOCK_MAP.replicas_of(chunk_id) if dn != dn_id and DATANODES.is_alive(dn)]
+            chunks.append({"chunk_id": chunk_id,
+                           "source_dn": DATANODES.host(sources[0]) if sources else None})
 
     return jsonify({"chunks": chunks}), 200
 
@@ -400,25 +1144,26 @@ def request_recovery():
             return jsonify({"error": "missing_parameters"}), 400
 
         # Check which DNs currently have this chunk
-        holders = CHUNK_MAPPING.get(chunk_id, [])
+        with LOCK:
+            holders = BLOCK_MAP.replicas_of(chunk_id)
         if not holders:
-            logger.warning(f"No replicas exist for chunk {chunk_id}; cannot recover.")
+            print(f"[NameNode] No replicas exist for chunk {chunk_id}; cannot recover.")
             return jsonify({"error": "no_source"}), 404
 
-        # Pick a healthy source DN (simple round-robin or first healthy)
-        healthy_sources = [dn for dn in holders if dn in ACTIVE_DN]
+        # Pick a healthy source DN (first healthy)
+        healthy_sources = sorted(dn for dn in holders if dn != target_dn and DATANODES.is_alive(dn))
         if not healthy_sources:
-            logger.warning(f"No healthy replicas found for {chunk_id}.")
+            print(f"[NameNode] No healthy replicas found for {chunk_id}.")
             return jsonify({"error": "no_healthy_source"}), 404
 
         source_dn = healthy_sources[0]
-        source_host = ACTIVE_DN[source_dn]
-        target_host = ACTIVE_DN.get(target_dn)
+        source_host = DATANODES.host(source_dn)
+        target_host = DATANODES.host(target_dn) if DATANODES.is_alive(target_dn) else None
 
         if not target_host:
             return jsonify({"error": "target_not_active"}), 404
 
-        logger.info(f"Coordinating recovery for {chunk_id}: {source_dn} → {target_dn}")
+        print(f"[NameNode] Coordinating recovery for {chunk_id}: {source_dn} → {target_dn}")
 
         # Ask source DN to replicate to target
         try:
@@ -426,19 +1171,49 @@ def request_recovery():
                           json={"chunk_id": chunk_id, "target_host": target_host},
                           timeout=5)
         except Exception as e:
-            logger.warning(f"Failed to instruct replication from {source_dn} to {target_dn} for {chunk_id}: {e}")
+            print(f"[NameNode] Failed to instruct replication from {source_dn} to {target_dn} for {chunk_id}: {e}")
             return jsonify({"error": "replication_failed"}), 500
 
         return jsonify({"status": "recovery_started"}), 200
 
     except Exception as e:
-        logger.exception("Error in /request_recovery: %s", e)
+        print("[NameNode] Error in /request_recovery:", e)
         return jsonify({"error": "internal"}), 500
 
+# --------------------------- Metrics ---------------------------
+def heartbeat_ages():
+    now = time.time()
+    return {dn: now - info["last_seen"] for dn, info in DATANODES.snapshot().items()}
+
+def namespace_sizes():
+    with LOCK:
+        files = NAMESPACE.files()
+        return len(files), sum(len(f["chunks"]) for f in files.values())
+
+def shared_block_sizes():
+    with LOCK:
+        return len(state["blocks"]), sum(BLOCK_MAP.refcount(b) for b in state["blocks"])
+
+METRICS.gauge_fn("hdfs_datanode_heartbeat_age_seconds", "Seconds since each DataNode's last heartbeat.",
+                 heartbeat_ages, ["dn"])
+METRICS.gauge_fn("hdfs_datanodes_alive", "DataNodes currently considered alive.", lambda: len(DATANODES.alive()))
+METRICS.gauge_fn("hdfs_namespace_files", "Files in the namespace.", lambda: namespace_sizes()[0])
+METRICS.gauge_fn("hdfs_namespace_chunks", "Chunks in the namespace.", lambda: namespace_sizes()[1])
+METRICS.gauge_fn("hdfs_shared_blocks", "Content-addressed blocks shared by deduplicated files.",
+                 lambda: shared_block_sizes()[0])
+METRICS.gauge_fn("hdfs_shared_block_references", "References from deduplicated files to shared blocks.",
+                 lambda: shared_block_sizes()[1])
+METRICS.gauge_fn("hdfs_editlog_last_txid", "Last transaction id appended to the edit log.",
+                 lambda: EDITLOG.last_txid)
+METRICS.gauge_fn("hdfs_editlog_txns_since_checkpoint", "Edits not yet covered by a checkpoint.",
+                 lambda: EDITLOG.last_txid - checkpoint_txid)
+
 # --------------------------- Main ---------------------------
 if __name__ == "__main__":
     load_metadata()
+    REPLICATION.start()
     threading.Thread(target=monitor_datanodes, daemon=True).start()
+    threading.Thread(target=checkpointer, daemon=True).start()
     print("[NameNode] Listening on 0.0.0.0:5000")
     app.run(host="0.0.0.0", port=5000, threaded=True)
 
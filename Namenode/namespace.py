@@ -0,0 +1,267 @@
+#namespace.py
+"""
+Hierarchical file namespace for the NameNode.
+
+The tree is plain nested dicts so it goes into the snapshot as-is:
+    directory: {"children": {name: node, ...}}
+    file:      {"id", "chunks", "chunks_info", "block_size", "file_size", "checksums"}
+Paths are absolute and "/"-separated; resolving one walks one dict per
+component, so it costs O(depth) whatever the size of the namespace. Every file
+gets a numeric id when it is created. Chunk IDs and the BlockMap refer to that
+id, never to the path, so a rename (of a file or a whole directory) just moves
+one dict entry. Not thread-safe on its own: callers hold the NameNode LOCK.
+"""
+import bisect
+
+
+class NamespaceError(Exception):
+    """A namespace operation that cannot be applied; code/status go back to the client."""
+
+    def __init__(self, code, path, status=400):
+        super().__init__(f"{code}: {path}")
+        self.code = code
+        self.path = path
+        self.status = status
+
+
+def split_path(path):
+    """'a/b//c/' -> ['a', 'b', 'c']. Legacy flat filenames become names in the root."""
+    parts = [p for p in (path or "").split("/") if p]
+    if any(p in (".", "..") for p in parts):
+        raise NamespaceError("invalid_path", path)
+    return parts
+
+
+def normalize(path):
+    return "/" + "/".join(split_path(path))
+
+
+def is_dir(node):
+    return "children" in node
+
+
+class Namespace:
+    def __init__(self, state):
+        # state is the NameNode's persisted dict: {"root": tree, "next_file_id": n}
+        self.state = state
+        self._files = {}  # file id -> file node, derived index
+        # id(directory node) -> (node, its child names sorted), built on first listing and
+        # kept sorted by the mutations below so paging through a big directory never re-sorts it
+        self._names = {}
+        self.reset()
+
+    def reset(self):
+        self.state.setdefault("root", {"children": {}})
+        self.state.setdefault("next_file_id", 1)
+        self.rebuild()
+
+    def rebuild(self):
+        self._files.clear()
+        self._names.clear()
+        for _, finfo in self.walk():
+            self._index(finfo)
+
+    def _index(self, finfo):
+        fid = finfo.setdefault("id", self.state["next_file_id"])
+        self.state["next_file_id"] = max(self.state["next_file_id"], fid + 1)
+        self._files[fid] = finfo
+
+    @property
+    def next_file_id(self):
+        return self.state["next_file_id"]
+
+    # ---- lookups ----
+    def lookup(self, path):
+        node = self.state["root"]
+        for name in split_path(path):
+            if not is_dir(node):
+                return None
+            node = node["children"].get(name)
+            if node is None:
+                return None
+        return node
+
+    def get_file(self, path):
+        node = self.lookup(path)
+        return node if node is not None and not is_dir(node) else None
+
+    def file(self, file_id):
+        return self._files.get(file_id)
+
+    def files(self):
+        """file id -> file node for every file, for rebuilding derived indexes."""
+        return dict(self._files)
+
+    def _parent(self, parts, path, create=False):
+        """Directory node holding parts[-1]; with create, missing directories are made."""
+        node = self.state["root"]
+        for name in parts[:-1]:
+            child = node["children"].get(name)
+            if child is None:
+                if not create:
+                    raise NamespaceError("parent_not_found", path, 404)
+                child = node["children"][name] = {"children": {}}
+                self._linked(node, name)
+            elif not is_dir(child):
+                raise NamespaceError("not_a_directory", path, 409)
+            node = child
+        return node
+
+    def _check_parent(self, parts, path):
+        """Raises if _parent(parts, create=True) would hit a file; mutates nothing."""
+        node = self.state["root"]
+        for name in parts[:-1]:
+            node = node["children"].get(name)
+            if node is None:
+                return
+            if not is_dir(node):
+                raise NamespaceError("not_a_directory", path, 409)
+
+    def _sorted_names(self, node):
+        entry = self._names.get(id(node))
+        if entry is None:
+            entry = self._names[id(node)] = (node, sorted(node["children"]))
+        return entry[1]
+
+    def _linked(self, node, name):
+        """Call after adding a new name to node's children."""
+        entry = self._names.get(id(node))
+        if entry is not None:
+            bisect.insort(entry[1], name)
+
+    def _unlinked(self, node, name):
+        """Call after deleting a name from node's children."""
+        entry = self._names.get(id(node))
+        if entry is not None:
+            names = entry[1]
+            del names[bisect.bisect_left(names, name)]
+
+    def _forget(self, node):
+        """Drops the cached listings of a removed directory tree."""
+        self._names.pop(id(node), None)
+        for child in node["children"].values():
+            if is_dir(child):
+                self._forget(child)
+
+    # ---- mutations (validate first, so a raised error leaves the tree untouched) ----
+    def mkdir(self, path):
+        """Creates path and any missing parents. Returns False if it already existed."""
+        parts = split_path(path)
+        if not parts:
+            return False
+        existing = self.lookup(path)
+        if existing is not None:
+            if not is_dir(existing):
+                raise NamespaceError("file_exists", path, 409)
+            return False
+        self._check_parent(parts, path)
+        parent = self._parent(parts, path, create=True)
+        parent["children"][parts[-1]] = {"children": {}}
+        self._linked(parent, parts[-1])
+        return True
+
+    def check_file(self, path):
+        """Raises the NamespaceError add_file(path) would; mutates nothing.
+        Returns the file node it would replace, if any."""
+        parts = split_path(path)
+        if not parts:
+            raise NamespaceError("is_a_directory", path, 409)
+        existing = self.lookup(path)
+        if existing is not None and is_dir(existing):
+            raise NamespaceError("is_a_directory", path, 409)
+        self._check_parent(parts, path)
+        return existing
+
+    def add_file(self, path, finfo):
+        """Creates (or replaces) the file at path, making parent directories.
+        Returns the replaced file node, if any."""
+        existing = self.check_file(path)
+        parts = split_path(path)
+        parent = self._parent(parts, path, create=True)
+        parent["children"][parts[-1]] = finfo
+        if existing is not None:
+            self._files.pop(existing.get("id"), None)
+        else:
+            self._linked(parent, parts[-1])
+        self._index(finfo)
+        return existing
+
+    def remove(self, path):
+        """Unlinks a file or a whole directory tree. Returns the removed file nodes."""
+        parts = split_path(path)
+        if not parts:
+            raise NamespaceError("invalid_path", path)
+        node = self.lookup(path)
+        if node is None:
+            raise NamespaceError("file_not_found", path, 404)
+        removed = [finfo for _, finfo in self._walk(node, "", "", None)] if is_dir(node) else [node]
+        parent = self._parent(parts, path)
+        del parent["children"][parts[-1]]
+        self._unlinked(parent, parts[-1])
+        if is_dir(node):
+            self._forget(node)
+        for finfo in removed:
+            self._files.pop(finfo.get("id"), None)
+        return removed
+
+    def rename(self, src, dst):
+        """Moves a file or directory; dst must not exist and its parent must."""
+        src_parts, dst_parts = split_path(src), split_path(dst)
+        if not src_parts or not dst_parts:
+            raise NamespaceError("invalid_path", src if not src_parts else dst)
+        node = self.lookup(src)
+        if node is None:
+            raise NamespaceError("file_not_found", src, 404)
+        if self.lookup(dst) is not None:
+            raise NamespaceError("already_exists", dst, 409)
+        if dst_parts[:len(src_parts)] == src_parts:
+            raise NamespaceError("invalid_path", dst)  # into its own subtree
+        target = self._parent(dst_parts, dst)
+        source = self._parent(src_parts, src)
+        del source["children"][src_parts[-1]]
+        self._unlinked(source, src_parts[-1])
+        target["children"][dst_parts[-1]] = node
+        self._linked(target, dst_parts[-1])
+
+    # ---- listings ----
+    def listdir(self, path, after=None):
+        """(name, node) pairs of a directory in name order, strictly after `after`."""
+        node = self.lookup(path)
+        if node is None:
+            raise NamespaceError("file_not_found", path, 404)
+        if not is_dir(node):
+            raise NamespaceError("not_a_directory", path, 409)
+        names = self._sorted_names(node)
+        for i in range(bisect.bisect_right(names, after) if after else 0, len(names)):
+            yield names[i], node["children"][names[i]]
+
+    def walk(self, prefix="/", after=None):
+        """
+        (path, file node) for every file whose path starts with prefix, in path
+        order, strictly after the path `after`. Only the directory the prefix
+        ends in and the subtrees below it are visited.
+        """
+        dir_path, _, stem = ("/" + (prefix or "").lstrip("/")).rpartition("/")
+        dir_parts = split_path(dir_path)
+        node = self.lookup(dir_path)
+        if node is None or not is_dir(node):
+            return
+        after_parts = split_path(after) if after else None
+        if after_parts and after_parts[:len(dir_parts)] == dir_parts:
+            after_parts = after_parts[len(dir_parts):]
+        else:
+            after_parts = None
+        yield from self._walk(node, normalize(dir_path).rstrip("/"), stem, after_parts)
+
+    def _walk(self, node, base, stem, after):
+        names = self._sorted_names(node)
+        for i in range(bisect.bisect_left(names, max(stem, after[0]) if after else stem), len(names)):
+            name = names[i]
+            if not name.startswith(stem):
+                break
+            child = node["children"][name]
+            resume = after[1:] if after and name == after[0] else None
+            if is_dir(child):
+                yield from self._walk(child, f"{base}/{name}", "", resume)
+            elif resume is None:
+                yield f"{base}/{name}", child
@@ -0,0 +1,127 @@
+#placement.py
+"""
+Replica placement policies for the NameNode.
+
+A policy turns the live DataNodes plus their last heartbeat stats
+({"capacity", "free", "used", "chunks", "active_transfers", "reported_at"})
+into a replica list for each chunk of a new file:
+
+    policy.place(num_chunks, replicas, nodes, stats, block_size, client_ip) -> [[dn, ...], ...]
+
+"round_robin" is the original rotation over the locality-sorted node list.
+"weighted" samples nodes without replacement, with weight proportional to free
+space and divided by the node's active transfers. Random choice keeps
+concurrent uploads from all piling onto the same "best" node between
+heartbeats. Bytes it has handed out since a node's last heartbeat are
+subtracted from that node's reported free space.
+"""
+import random, threading, time
+
+
+def ip_of(host):
+    return (host or "").split("//")[-1].split(":")[0]
+
+
+def locality(client_ip, host):
+    """Number of leading IPv4 octets (of the first two) shared by client and node."""
+    if not client_ip or not host:
+        return 0
+    return sum(1 for a, b in zip(client_ip.split(".")[:2], ip_of(host).split(".")[:2]) if a == b)
+
+
+class RoundRobinPlacement:
+    name = "round_robin"
+
+    def place(self, num_chunks, replicas, nodes, stats, block_size, client_ip=None, hosts=None):
+        hosts = hosts or {}
+        ordered = sorted(sorted(nodes), key=lambda dn: -locality(client_ip, hosts.get(dn)))
+        return [[ordered[(i + r) % len(ordered)] for r in range(min(replicas, len(ordered)))]
+                for i in range(num_chunks)]
+
+    def rank(self, nodes, stats):
+        return sorted(nodes)
+
+
+class WeightedRandomPlacement:
+    name = "weighted"
+
+    def __init__(self, locality_boost=1.0, rng=None):
+        self.locality_boost = locality_boost  # extra weight per shared octet, first replica only
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._assigned = {}  # dn_id -> [(assigned_at, nbytes)] not yet reflected in a heartbeat
+
+    def _pending_bytes(self, dn, reported_at):
+        entries = [e for e in self._assigned.get(dn, []) if e[0] > reported_at]
+        self._assigned[dn] = entries
+        return sum(n for _, n in entries)
+
+    def _signals(self, nodes, stats):
+        """Effective free bytes and load divisor per node. Caller holds _lock."""
+        free, load = {}, {}
+        for dn in nodes:
+            s = stats.get(dn) or {}
+            if s.get("free") is not None:
+                free[dn] = max(0, s["free"] - self._pending_bytes(dn, s.get("reported_at", 0)))
+            load[dn] = 1 + s.get("active_transfers", 0)
+        # nodes that have not reported stats yet count as average ones
+        default = sum(free.values()) / len(free) if free else 1.0
+        for dn in nodes:
+            free.setdefault(dn, default)
+        return free, load
+
+    def _pick(self, weights):
+        usable = {dn: w for dn, w in weights.items() if w > 0}
+        if not usable:
+            return self.rng.choice(sorted(weights))
+        x = self.rng.uniform(0, sum(usable.values()))
+        for dn in sorted(usable):
+            x -= usable[dn]
+            if x <= 0:
+                return dn
+        return max(usable, key=usable.get)
+
+    def place(self, num_chunks, replicas, nodes, stats, block_size, client_ip=None, hosts=None):
+        hosts = hosts or {}
+        now = time.time()
+        plan = []
+        with self._lock:
+            free, load = self._signals(nodes, stats)
+            for _ in range(num_chunks):
+                weights = {dn: free[dn] / load[dn] for dn in nodes}
+                chosen = []
+                for r in range(min(replicas, len(nodes))):
+                    if r == 0 and client_ip:
+                        dn = self._pick({d: w * (1 + self.locality_boost * locality(client_ip, hosts.get(d)))
+                                         for d, w in weights.items()})
+                    else:
+                        dn = self._pick(weights)
+                    chosen.append(dn)
+                    del weights[dn]
+                for dn in chosen:
+                    # charge the chunk right away so the rest of this file spreads out
+                    free[dn] = max(0, free[dn] - block_size)
+                    self._assigned.setdefault(dn, []).append((now, block_size))
+                plan.append(chosen)
+        return plan
+
+    def rank(self, nodes, stats):
+        """Nodes ordered best-first by a weighted draw, e.g. for re-replication targets."""
+        with self._lock:
+            free, load = self._signals(nodes, stats)
+        weights = {dn: free[dn] / load[dn] for dn in nodes}
+        ranked = []
+        while weights:
+            dn = self._pick(weights)
+            ranked.append(dn)
+            del weights[dn]
+        return ranked
+
+
+POLICIES = {"round_robin": RoundRobinPlacement, "weighted": WeightedRandomPlacement}
+
+
+def make_policy(name, **kwargs):
+    if name not in POLICIES:
+        raise ValueError(f"unknown placement policy {name!r}, expected one of {sorted(POLICIES)}")
+    return POLICIES[name](**kwargs)
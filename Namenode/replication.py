@@ -0,0 +1,166 @@
+#replication.py
+"""
+Re-replication scheduler for the NameNode.
+
+Under-replicated chunks wait in a priority queue keyed by how many live
+replicas they have left, so a chunk down to its last copy is copied before
+one that merely lost a spare. A dispatcher thread hands chunks to a bounded
+worker pool, never letting a DataNode take part in more than
+`max_streams_per_node` copies at once (as source or target). Failed copies are
+retried with exponential backoff. The manager knows nothing about the
+namespace: `plan(chunk_id)` returns (live_replicas, sources, targets) or None
+when the chunk needs no work, and `copy(chunk_id, source, target)` performs
+one copy and returns True on success. Both are called without the manager's
+lock held.
+"""
+import heapq, itertools, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReplicationManager:
+    def __init__(self, plan, copy, workers=8, max_streams_per_node=2, max_attempts=5, backoff=1.0):
+        self._plan = plan
+        self._copy = copy
+        self.workers = workers
+        self.max_streams_per_node = max_streams_per_node
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replication")
+        self._seq = itertools.count()
+        self._ready = []      # (live_replicas, seq, chunk_id, attempt)
+        self._delayed = []    # (not_before, seq, live_replicas, chunk_id, attempt) waiting out a backoff
+        self._blocked = []    # [(live_replicas, chunk_id, attempt)] waiting for a free stream
+        self._pending = set() # every chunk in one of the three queues above or in flight
+        self._streams = {}    # dn_id -> copies in flight touching that node
+        self._inflight = 0
+        self._completed = 0
+        self._failed = 0
+        self._retried = 0
+        self._done_times = deque()  # completion timestamps of the last minute
+        self._busy_since = None
+        self._last_recovery = None  # (chunks copied, seconds) of the last busy period
+
+    def start(self):
+        threading.Thread(target=self._dispatch_loop, daemon=True).start()
+
+    def schedule(self, chunk_id, live_replicas=0):
+        """Queues a chunk for re-replication; a no-op if it is already queued or being copied."""
+        with self._cond:
+            if chunk_id in self._pending:
+                return
+            self._pending.add(chunk_id)
+            if self._busy_since is None:
+                self._busy_since = (time.time(), self._completed)
+            heapq.heappush(self._ready, (live_replicas, next(self._seq), chunk_id, 0))
+            self._cond.notify()
+
+    def stats(self):
+        now = time.time()
+        with self._cond:
+            while self._done_times and self._done_times[0] < now - 60:
+                self._done_times.popleft()
+            stats = {
+                "queued": len(self._ready) + len(self._delayed) + len(self._blocked),
+                "queued_by_live_replicas": {},
+                "backing_off": len(self._delayed),
+                "blocked_on_streams": len(self._blocked),
+                "in_flight": self._inflight,
+                "streams": dict(self._streams),
+                "completed": self._completed,
+                "failed": self._failed,
+                "retried": self._retried,
+                "chunks_per_sec_1m": round(len(self._done_times) / 60, 3),
+                "busy_for": round(now - self._busy_since[0], 3) if self._busy_since else 0,
+                "last_recovery": None,
+            }
+            for live, _, _, _ in self._ready:
+                stats["queued_by_live_replicas"][live] = stats["queued_by_live_replicas"].get(live, 0) + 1
+            if self._last_recovery:
+                chunks, seconds = self._last_recovery
+                stats["last_recovery"] = {"chunks": chunks, "seconds": round(seconds, 3)}
+            return stats
+
+    # ---- dispatcher ----
+    def _next_candidate(self):
+        """Blocks until a worker is free and a chunk is due; pops it. Caller holds _cond."""
+        while True:
+            now = time.time()
+            while self._delayed and self._delayed[0][0] <= now:
+                _, seq, live, chunk_id, attempt = heapq.heappop(self._delayed)
+                heapq.heappush(self._ready, (live, seq, chunk_id, attempt))
+            if self._ready and self._inflight < self.workers:
+                return heapq.heappop(self._ready)
+            self._cond.wait(self._delayed[0][0] - now if self._delayed else None)
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                _, _, chunk_id, attempt = self._next_candidate()
+            try:
+                plan = self._plan(chunk_id)
+            except Exception as e:
+                print(f"[Replication] Planning {chunk_id} failed: {e}")
+                plan = None
+            with self._cond:
+                if plan is None:
+                    self._finish(chunk_id)
+                    continue
+                live, sources, targets = plan
+                source = self._least_busy(sources)
+                target = self._least_busy([t for t in targets if t != source])
+                if source is None or target is None:
+                    if self._inflight:
+                        self._blocked.append((live, chunk_id, attempt))
+                    else:
+                        self._finish(chunk_id)  # no usable source/target pair at all
+                    continue
+                for dn in (source, target):
+                    self._streams[dn] = self._streams.get(dn, 0) + 1
+                self._inflight += 1
+            self._pool.submit(self._run, chunk_id, live, source, target, attempt)
+
+    def _least_busy(self, nodes):
+        free = [dn for dn in nodes if self._streams.get(dn, 0) < self.max_streams_per_node]
+        return min(free, key=lambda dn: self._streams.get(dn, 0)) if free else None
+
+    # ---- workers ----
+    def _run(self, chunk_id, live, source, target, attempt):
+        try:
+            ok = self._copy(chunk_id, source, target)
+        except Exception as e:
+            print(f"[Replication] Copy of {chunk_id} {source} -> {target} failed: {e}")
+            ok = False
+        with self._cond:
+            self._inflight -= 1
+            for dn in (source, target):
+                self._streams[dn] -= 1
+                if not self._streams[dn]:
+                    del self._streams[dn]
+            # a stream freed up: blocked chunks get another go, in priority order
+            for blocked_live, blocked_id, blocked_attempt in self._blocked:
+                heapq.heappush(self._ready, (blocked_live, next(self._seq), blocked_id, blocked_attempt))
+            self._blocked = []
+            if ok:
+                self._completed += 1
+                self._done_times.append(time.time())
+                # planned again: it may still be short of replicas
+                heapq.heappush(self._ready, (live + 1, next(self._seq), chunk_id, 0))
+            elif attempt + 1 < self.max_attempts:
+                self._retried += 1
+                delay = self.backoff * 2 ** attempt
+                heapq.heappush(self._delayed, (time.time() + delay, next(self._seq), live, chunk_id, attempt + 1))
+            else:
+                self._failed += 1
+                print(f"[Replication] Giving up on {chunk_id} after {self.max_attempts} attempts")
+                self._finish(chunk_id)
+            self._cond.notify_all()
+
+    def _finish(self, chunk_id):
+        """Drops a chunk from the manager; caller holds _cond."""
+        self._pending.discard(chunk_id)
+        if not self._pending and self._busy_since is not None:
+            started, completed_before = self._busy_since
+            self._last_recovery = (self._completed - completed_before, time.time() - started)
+            self._busy_since = None
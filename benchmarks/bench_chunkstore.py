@@ -0,0 +1,70 @@
+#bench_chunkstore.py
+"""
+DataNode chunk stores: file per chunk vs. packed segments.
+
+  python3 bench_chunkstore.py [--chunks 20000] [--size 4096]
+
+Stores --chunks chunks of --size bytes into each backend on a scratch dir,
+reads them all back in random order, reopens the store the way a restarting
+DataNode does (and lists its chunks for the full block report), then deletes
+half the chunks and times the compaction that reclaims them. The segment
+store is also reopened without its index file, i.e. after a crash before the
+first checkpoint, which forces a scan of every segment.
+"""
+import argparse, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from chunkstore import open_store, INDEX_FILE
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def run(name, chunks, size):
+    data_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    store = open_store(name, data_dir)
+    payload = os.urandom(size)
+    ids = [f"blk_{i // 64}.chunk.{i % 64}" for i in range(chunks)]
+
+    t_put, _ = timed(lambda: [store.put(c, payload) for c in ids])
+    order = ids[:]
+    random.shuffle(order)
+    t_get, _ = timed(lambda: [store.read(c) for c in order])
+    store.checkpoint()
+    store.close()
+
+    t_open, listed = timed(lambda: open_store(name, data_dir).chunk_ids())
+    assert len(listed) == chunks
+    store = open_store(name, data_dir)
+    for c in ids[::2]:
+        store.delete(c)
+    t_compact, freed = timed(store.compact)
+    used, _ = store.stats()
+    store.close()
+
+    line = (f"{name:>8}: store {chunks / t_put:9.0f}/s   get {chunks / t_get:9.0f}/s   "
+            f"startup {t_open * 1000:8.1f} ms   compact {t_compact * 1000:8.1f} ms "
+            f"({freed / 2**20:.1f} MB freed)   {len(os.listdir(data_dir))} files, {used / 2**20:.1f} MB")
+    if name == "segments":
+        os.remove(os.path.join(data_dir, INDEX_FILE))
+        t_scan, listed = timed(lambda: open_store(name, data_dir).chunk_ids())
+        line += f"\n{'':>8}  startup without index (full scan) {t_scan * 1000:8.1f} ms"
+    print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--size", type=int, default=4096)
+    args = ap.parse_args()
+
+    print(f"{args.chunks} chunks x {args.size} bytes")
+    for name in ("files", "segments"):
+        run(name, args.chunks, args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#bench_compression.py
+"""
+Chunk codecs: compression ratio and throughput on sample data.
+
+  python3 bench_compression.py [--size 16777216] [--block-size 1048576]
+
+Builds --size bytes of each sample (this repo's source text, generated
+JSON log lines, random bytes), splits it into --block-size chunks as the
+client does, and times compress + decompress of every chunk per codec.
+"""
+import argparse, glob, json, os, random, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import compression
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def source_text(size):
+    files = sorted(glob.glob(os.path.join(ROOT, "**", "*.py"), recursive=True)) + [os.path.join(ROOT, "README.md")]
+    text = b"".join(open(path, "rb").read() for path in files)
+    return (text * (size // len(text) + 1))[:size]
+
+
+def json_logs(size):
+    rng = random.Random(0)
+    lines, total = [], 0
+    while total < size:
+        line = json.dumps({"ts": 1700000000 + total, "level": rng.choice(["INFO", "WARN", "ERROR"]),
+                           "dn": f"dn{rng.randrange(8)}", "chunk": f"blk_{rng.randrange(10**6)}.chunk.{rng.randrange(16)}",
+                           "latency_ms": round(rng.expovariate(0.1), 2)}).encode() + b"\n"
+        lines.append(line)
+        total += len(line)
+    return b"".join(lines)[:size]
+
+
+def run(codec, data, block_size):
+    chunks = [data[i:i + block_size] for i in range(0, len(data), block_size)]
+    t0 = time.perf_counter()
+    packed = [compression.compress(codec, c) for c in chunks]
+    t1 = time.perf_counter()
+    unpacked = [compression.decompress(codec, c) for c in packed]
+    t2 = time.perf_counter()
+    assert b"".join(unpacked) == data
+    stored = sum(len(c) for c in packed)
+    mb = len(data) / 2**20
+    return len(data) / stored, mb / (t1 - t0), mb / (t2 - t1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=16 * 1024 * 1024)
+    ap.add_argument("--block-size", type=int, default=1024 * 1024)
+    args = ap.parse_args()
+
+    samples = {"source": source_text(args.size), "json-logs": json_logs(args.size), "random": os.urandom(args.size)}
+    print(f"{args.size / 2**20:.0f} MB per sample, {args.block_size // 1024} KB chunks, "
+          f"codecs: {', '.join(compression.available())}")
+    for name, data in samples.items():
+        for codec in compression.available():
+            ratio, c_mbs, d_mbs = run(codec, data, args.block_size)
+            print(f"{name:>10} {codec:>5}: ratio {ratio:6.2f}x   compress {c_mbs:8.1f} MB/s   "
+                  f"decompress {d_mbs:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
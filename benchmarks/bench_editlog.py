@@ -0,0 +1,83 @@
+#bench_editlog.py
+"""
+Mutation latency/throughput: full metadata.json rewrite vs. edit log.
+
+  python3 bench_editlog.py [--files 20000] [--mutations 2000] [--threads 8]
+
+"rewrite" mimics the old save_metadata(): every mutation dumps the whole
+namespace with indent=2 while holding the lock. "editlog" appends the
+mutation under the lock and group-commits (fsync) outside it.
+"""
+import argparse, json, os, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Namenode"))
+from editlog import EditLog
+
+
+def make_namespace(num_files, chunks_per_file=4):
+    files = {}
+    for n in range(num_files):
+        fname = f"file{n}.txt"
+        chunks = [f"{fname}.chunk.{i}" for i in range(chunks_per_file)]
+        files[fname] = {"chunks": chunks, "chunks_info": {c: ["dn0", "dn1"] for c in chunks}}
+    return {"files": files, "datanodes": {}}
+
+
+def run(name, mutate, mutations, threads):
+    latencies = []
+
+    def one(i):
+        t0 = time.perf_counter()
+        mutate(i)
+        latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(mutations)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"{name:>8}: {mutations / elapsed:9.1f} mutations/s   "
+          f"p50 {p(0.50):8.2f} ms   p99 {p(0.99):8.2f} ms")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--files", type=int, default=20000)
+    ap.add_argument("--mutations", type=int, default=2000)
+    ap.add_argument("--threads", type=int, default=8)
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_editlog_")
+    print(f"Namespace: {args.files} files, {args.mutations} mutations, {args.threads} threads")
+
+    state = make_namespace(args.files)
+    lock = threading.RLock()
+    metadata_file = os.path.join(workdir, "metadata.json")
+
+    def rewrite(i):
+        with lock:
+            state["files"][f"new{i}.txt"] = {"chunks": [], "chunks_info": {}}
+            with open(metadata_file, "w") as f:
+                json.dump(state, f, indent=2)
+
+    run("rewrite", rewrite, args.mutations, args.threads)
+
+    state = make_namespace(args.files)
+    log = EditLog(os.path.join(workdir, "edits"))
+    log.open(0)
+
+    def journal(i):
+        edit = {"op": "add_file", "filename": f"new{i}.txt", "info": {"chunks": [], "chunks_info": {}}}
+        with lock:
+            state["files"][edit["filename"]] = edit["info"]
+            txid = log.append(edit)
+        log.sync(txid)
+
+    run("editlog", journal, args.mutations, args.threads)
+    log.close()
+
+
+if __name__ == "__main__":
+    main()
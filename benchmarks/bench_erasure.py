@@ -0,0 +1,64 @@
+#bench_erasure.py
+"""
+Erasure codes: encode/decode throughput and storage overhead vs 2x replication.
+
+  python3 bench_erasure.py [--size 67108864] [--block-size 1048576] [--schemes xor-4,rs-3-2,rs-6-3,rs-10-4]
+
+Splits --size random bytes into --block-size chunks, encodes every stripe,
+then times rebuilding the worst case the scheme tolerates: m data blocks of
+each stripe lost. Throughput is file bytes per second. Storage is the bytes
+kept per file byte, next to the REPLICA_FACTOR = 2 copies of replicated files.
+"""
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import erasure
+
+REPLICA_FACTOR = 2
+
+
+def run(scheme, blocks):
+    k, m = scheme.k, scheme.m
+    stripes = [blocks[i:i + k] for i in range(0, len(blocks), k)]
+    t0 = time.perf_counter()
+    parity = [scheme.encode(stripe) for stripe in stripes]
+    t1 = time.perf_counter()
+    for stripe, par in zip(stripes, parity):
+        block_len = len(par[0])
+        lost = list(range(min(m, len(stripe))))
+        available = {i: b for i, b in enumerate(stripe) if i not in lost}
+        available.update({i: b"" for i in range(len(stripe), k)})
+        available.update({k + j: p for j, p in enumerate(par)})
+        rebuilt = scheme.reconstruct(available, lost, block_len)
+        assert all(rebuilt[i][:len(stripe[i])] == stripe[i] for i in lost)
+    t2 = time.perf_counter()
+    stored = sum(len(b) for b in blocks) + sum(len(p) for par in parity for p in par)
+    return stored, t1 - t0, t2 - t1
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=64 * 1024 * 1024)
+    ap.add_argument("--block-size", type=int, default=1024 * 1024)
+    ap.add_argument("--schemes", default="xor-4,rs-3-2,rs-6-3,rs-10-4")
+    args = ap.parse_args()
+
+    data = os.urandom(args.size)
+    blocks = [data[i:i + args.block_size] for i in range(0, len(data), args.block_size)]
+    mb = args.size / 2**20
+    print(f"{mb:.0f} MB in {len(blocks)} x {args.block_size // 1024} KB blocks; "
+          f"{REPLICA_FACTOR}x replication stores {REPLICA_FACTOR:.2f}x and survives {REPLICA_FACTOR - 1} loss")
+    for name in args.schemes.split(","):
+        try:
+            scheme = erasure.parse_scheme(name)
+        except ValueError as e:
+            print(f"{name:>8}: skipped, {e}")
+            continue
+        stored, enc, dec = run(scheme, blocks)
+        print(f"{name:>8}: stores {stored / args.size:4.2f}x ({100 * (1 - stored / (REPLICA_FACTOR * args.size)):4.1f}% "
+              f"less than replication), survives {scheme.m} lost per stripe   "
+              f"encode {mb / enc:8.1f} MB/s   decode {mb / dec:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
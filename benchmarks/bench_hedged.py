@@ -0,0 +1,77 @@
+#bench_hedged.py
+"""
+Chunk read tail latency with and without hedged reads.
+
+  python3 bench_hedged.py [--reads 400] [--slow-prob 0.05] [--slow-ms 2000]
+
+Two local stand-in DataNodes serve /get_chunk_raw. The "slow" one is alive
+but stalls for --slow-ms on a fraction of requests (GC pause, busy disk). Each
+chunk lists the slow node first, which is the worst case for plain failover.
+"""
+import argparse, os, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+import client
+
+CHUNK = os.urandom(64 * 1024)
+
+
+def serve(delay_fn):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay_fn())
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(CHUNK)))
+            self.end_headers()
+            try:
+                self.wfile.write(CHUNK)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def run(hosts, reads, hedge):
+    client.LATENCY = client.LatencyTracker()
+    latencies = []
+    for i in range(reads):
+        t0 = time.perf_counter()
+        data = client.fetch_chunk({"chunk_id": f"bench.chunk.{i}", "dn_hosts": hosts}, hedge=hedge)
+        latencies.append(time.perf_counter() - t0)
+        assert data == CHUNK
+    return sorted(latencies)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--reads", type=int, default=400)
+    ap.add_argument("--slow-prob", type=float, default=0.05)
+    ap.add_argument("--slow-ms", type=float, default=2000)
+    args = ap.parse_args()
+
+    base = lambda: random.uniform(0.002, 0.008)
+    slow = serve(lambda: base() + (args.slow_ms / 1000 if random.random() < args.slow_prob else 0))
+    fast = serve(base)
+
+    for name, hedge in (("failover", False), ("hedged", True)):
+        # keep the client's per-chunk logging out of the report
+        with open(os.devnull, "w") as devnull:
+            sys.stdout = devnull
+            try:
+                latencies = run([slow, fast], args.reads, hedge)
+            finally:
+                sys.stdout = sys.__stdout__
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        print(f"{name:>8}: p50 {p(0.50):7.1f} ms   p99 {p(0.99):7.1f} ms   max {p(1.0):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
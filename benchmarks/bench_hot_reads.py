@@ -0,0 +1,69 @@
+#bench_hot_reads.py
+"""
+Repeated reads of one hot chunk: rehash on every read vs. cached verification.
+
+  python3 bench_hot_reads.py [--size 4194304] [--reads 200]
+
+Starts DataNode 0 twice on a scratch data dir, first with --verify_max_age 0
+(every /get_chunk_raw rehashes the chunk, the old behaviour) and then with the
+default cache age, and times the same read loop against each.
+"""
+import argparse, hashlib, os, signal, subprocess, sys, tempfile, time
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_transfer import free_port, ROOT
+
+
+def start_datanode(port, data_dir, max_age):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "datanode_0", "datanode0.py"), "--id", "bench",
+         "--port", str(port), "--namenode", "http://127.0.0.1:9", "--data_dir", data_dir,
+         "--verify_max_age", str(max_age)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/verify_chunk", timeout=0.5)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("DataNode did not start")
+
+
+def run(max_age, data, reads):
+    port = free_port()
+    proc = start_datanode(port, tempfile.mkdtemp(prefix="bench_dn_"), max_age)
+    host = f"http://127.0.0.1:{port}"
+    session = requests.Session()
+    try:
+        headers = {"Content-Type": "application/octet-stream", "X-Chunk-Id": "hot.chunk.0",
+                   "X-Filename": "hot", "X-Checksum-Sha256": hashlib.sha256(data).hexdigest()}
+        session.post(f"{host}/store_chunk_raw", data=data, headers=headers, timeout=30)
+        latencies = []
+        for _ in range(reads):
+            t0 = time.perf_counter()
+            r = session.get(f"{host}/get_chunk_raw", params={"chunk_id": "hot.chunk.0"}, timeout=30)
+            latencies.append(time.perf_counter() - t0)
+            assert r.content == data
+        return sorted(latencies)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--size", type=int, default=4 * 1024 * 1024)
+    ap.add_argument("--reads", type=int, default=200)
+    args = ap.parse_args()
+
+    data = os.urandom(args.size)
+    for name, max_age in (("rehash", 0), ("cached", 300)):
+        latencies = run(max_age, data, args.reads)
+        p = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+        mb = args.size * args.reads / 2**20
+        print(f"{name:>6}: p50 {p(0.50):6.2f} ms   p99 {p(0.99):6.2f} ms   "
+              f"{mb / sum(latencies):8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
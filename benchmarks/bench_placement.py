@@ -0,0 +1,80 @@
+#bench_placement.py
+"""
+Replica placement skew: round-robin vs. capacity/load-weighted random.
+
+  python3 bench_placement.py [--nodes 10] [--files 2000] [--chunks 16] [--heartbeat-every 25]
+
+Simulated cluster, no network: nodes have mixed disk sizes, two start out
+nearly full and two are busy serving transfers. Files of --chunks 64 MB chunks
+are placed with REPLICA_FACTOR 2, and every --heartbeat-every files each node
+"heartbeats" its real usage. Reports how full each node ends up and how much
+of the new data landed on the busy nodes.
+"""
+import argparse, os, random, statistics, sys, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Namenode"))
+from placement import make_policy
+
+GB = 1024 ** 3
+BLOCK = 64 * 1024 ** 2
+
+
+def make_cluster(n):
+    rng = random.Random(42)
+    nodes = {}
+    for i in range(n):
+        capacity = rng.choice([1000, 2000, 4000]) * GB
+        nodes[f"dn{i}"] = {"capacity": capacity, "used": int(capacity * 0.2), "active_transfers": 0}
+    nodes["dn0"]["used"] = int(nodes["dn0"]["capacity"] * 0.9)
+    nodes["dn1"]["used"] = int(nodes["dn1"]["capacity"] * 0.9)
+    nodes["dn2"]["active_transfers"] = 8
+    nodes["dn3"]["active_transfers"] = 8
+    return nodes
+
+
+def heartbeat_stats(nodes):
+    time.sleep(0.001)  # keep report timestamps after the assignments they cover
+    now = time.time()
+    return {dn: {"capacity": s["capacity"], "free": s["capacity"] - s["used"], "used": s["used"],
+                 "active_transfers": s["active_transfers"], "reported_at": now}
+            for dn, s in nodes.items()}
+
+
+def run(policy_name, args):
+    nodes = make_cluster(args.nodes)
+    start_used = {dn: s["used"] for dn, s in nodes.items()}
+    policy = make_policy(policy_name)
+    names = sorted(nodes)
+    stats = heartbeat_stats(nodes)
+    for f in range(args.files):
+        for replicas in policy.place(args.chunks, 2, names, stats, BLOCK):
+            for dn in replicas:
+                nodes[dn]["used"] += BLOCK
+        if (f + 1) % args.heartbeat_every == 0:
+            stats = heartbeat_stats(nodes)
+    fill = {dn: s["used"] / s["capacity"] for dn, s in nodes.items()}
+    written = {dn: nodes[dn]["used"] - start_used[dn] for dn in names}
+    total = sum(written.values())
+    busy = (written["dn2"] + written["dn3"]) / total
+    full = sum(1 for v in fill.values() if v > 1.0)
+    print(f"{policy_name:>11}: fill min {min(fill.values()):6.1%}  max {max(fill.values()):6.1%}  "
+          f"stdev {statistics.pstdev(fill.values()):6.1%}  over capacity {full}  "
+          f"on busy nodes {busy:5.1%}")
+    print("             " + " ".join(f"{dn}:{fill[dn]:.0%}" for dn in names))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=10)
+    ap.add_argument("--files", type=int, default=2000)
+    ap.add_argument("--chunks", type=int, default=16)
+    ap.add_argument("--heartbeat-every", type=int, default=25)
+    args = ap.parse_args()
+    print(f"{args.files * args.chunks * 2 * BLOCK / GB:.0f} GB of replicas over {args.nodes} nodes "
+          f"(dn0, dn1 start 90% full; dn2, dn3 busy)")
+    for name in ("round_robin", "weighted"):
+        run(name, args)
+
+
+if __name__ == "__main__":
+    main()
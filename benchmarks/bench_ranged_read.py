@@ -0,0 +1,64 @@
+#bench_ranged_read.py
+"""
+Verified ranged reads: whole-chunk SHA-256 vs. sub-block CRC32s.
+
+  python3 bench_ranged_read.py [--chunk-size 16777216] [--chunks 4] [--reads 200] [--read-size 4096]
+
+Stores --chunks random chunks in each backend, then serves --reads random
+reads of --read-size bytes two ways: rehashing the whole chunk before
+reading the range (what a DataNode had to do for a chunk it had not
+verified recently), and reading only the 64 KB sub-blocks the range spans
+and checking their CRC32s. Also reports the bytes read from disk per read.
+"""
+import argparse, hashlib, os, random, sys, tempfile, time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+from chunkstore import open_store, SUB_BLOCK
+
+
+def sha_then_read(store, chunk_id, offset, length):
+    sha = hashlib.sha256()
+    for buf in store.stream(chunk_id):
+        sha.update(buf)
+    assert sha.hexdigest() == store.stored_sha(chunk_id)
+    return store.read(chunk_id, offset, length)
+
+
+def crc_read(store, chunk_id, offset, length):
+    return b"".join(store.stream_verified(chunk_id, offset, length))
+
+
+def run(name, args):
+    store = open_store(name, tempfile.mkdtemp(prefix=f"bench_{name}_"))
+    ids = [f"blk_1.chunk.{i}" for i in range(args.chunks)]
+    for chunk_id in ids:
+        store.put(chunk_id, os.urandom(args.chunk_size))
+    reads = [(random.choice(ids), random.randrange(args.chunk_size - args.read_size), args.read_size)
+             for _ in range(args.reads)]
+    results = {}
+    for label, fn in (("sha256 whole chunk", sha_then_read), ("crc32 sub-blocks", crc_read)):
+        t0 = time.perf_counter()
+        for chunk_id, offset, length in reads:
+            assert len(fn(store, chunk_id, offset, length)) == length
+        results[label] = time.perf_counter() - t0
+    store.close()
+    spanned = sum((o + n - 1) // SUB_BLOCK - o // SUB_BLOCK + 1 for _, o, n in reads) / len(reads)
+    for label, seconds in results.items():
+        read_bytes = args.chunk_size if label.startswith("sha") else spanned * SUB_BLOCK
+        print(f"{name:>8} {label:<18}: {1000 * seconds / len(reads):8.3f} ms/read  "
+              f"{len(reads) / seconds:9.0f} reads/s  {read_bytes / 1024:9.0f} KB from disk per read")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunk-size", type=int, default=16 * 1024 * 1024)
+    ap.add_argument("--chunks", type=int, default=4)
+    ap.add_argument("--reads", type=int, default=200)
+    ap.add_argument("--read-size", type=int, default=4096)
+    args = ap.parse_args()
+    for name in ("files", "segments"):
+        run(name, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#bench_transfer.py
+"""
+Chunk transfer throughput: base64-in-JSON (/store_chunk, /get_chunk) vs.
+raw streaming (/store_chunk_raw, /get_chunk_raw).
+
+  python3 bench_transfer.py [--sizes 65536,1048576,8388608] [--rounds 20]
+
+Starts a local DataNode 0 on a scratch data dir; its NameNode address points
+at a closed port so chunk registration fails fast and does not skew timings.
+"""
+import argparse, base64, hashlib, os, signal, socket, subprocess, sys, tempfile, time
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_datanode(port, data_dir):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "datanode_0", "datanode0.py"), "--id", "bench",
+         "--port", str(port), "--namenode", "http://127.0.0.1:9", "--data_dir", data_dir],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/verify_chunk", timeout=0.5)
+            return proc
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    raise RuntimeError("DataNode did not start")
+
+
+def json_round(host, chunk_id, data):
+    body = {"chunk_id": chunk_id, "filename": "bench", "data": base64.b64encode(data).decode()}
+    r = requests.post(f"{host}/store_chunk", json=body, timeout=30)
+    sent = len(r.request.body)
+    r = requests.get(f"{host}/get_chunk", params={"chunk_id": chunk_id}, timeout=30)
+    got = base64.b64decode(r.json()["data"])
+    return sent + len(r.content), got
+
+
+def raw_round(host, chunk_id, data):
+    headers = {"Content-Type": "application/octet-stream", "X-Chunk-Id": chunk_id,
+               "X-Filename": "bench", "X-Checksum-Sha256": hashlib.sha256(data).hexdigest()}
+    requests.post(f"{host}/store_chunk_raw", data=data, headers=headers, timeout=30)
+    r = requests.get(f"{host}/get_chunk_raw", params={"chunk_id": chunk_id}, timeout=30, stream=True)
+    got = b"".join(r.iter_content(64 * 1024))
+    return len(data) + len(got), got
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="65536,1048576,8388608")
+    ap.add_argument("--rounds", type=int, default=20)
+    args = ap.parse_args()
+
+    port = free_port()
+    proc = start_datanode(port, tempfile.mkdtemp(prefix="bench_dn_"))
+    host = f"http://127.0.0.1:{port}"
+    try:
+        for size in map(int, args.sizes.split(",")):
+            data = os.urandom(size)
+            for name, fn in (("json", json_round), ("raw", raw_round)):
+                wire = 0
+                start = time.perf_counter()
+                for i in range(args.rounds):
+                    n, got = fn(host, f"bench.{name}.chunk.{i}", data)
+                    assert got == data
+                    wire += n
+                elapsed = time.perf_counter() - start
+                mb = size * args.rounds * 2 / 2**20
+                print(f"{size:>9} B  {name:>4}: {mb / elapsed:8.1f} MB/s store+get   "
+                      f"{wire / (size * args.rounds * 2):.2f}x bytes on wire")
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    main()
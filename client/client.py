@@ -1,151 +1,859 @@
 #client.py
-import os, math, base64, requests, sys, hashlib, json
-CHUNK_SIZE = 32 # 512 KB
+import os, math, base64, requests, sys, hashlib, json, argparse, threading, time, socket
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait, as_completed
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import compression
+import erasure
+CHUNK_SIZE = 32 # block size of files stored before it was recorded per file
+MIN_BLOCK_SIZE = 64 * 1024
+MAX_BLOCK_SIZE = 64 * 1024 * 1024
+TARGET_CHUNKS = 16  # aim for about this many chunks per file when picking a block size
 NAMENODE = "http://10.144.198.253:5000"
+STREAM_BUFFER = 64 * 1024
+MAX_INFLIGHT_BYTES = 64 * 1024 * 1024  # chunk bytes read but not yet uploaded (parallel mode)
+UPLOAD_RETRIES = 3
+READ_TIMEOUT = 8
+HEDGED_READS = True
+HEDGE_DELAY_DEFAULT = 0.2   # seconds, until a DataNode has enough latency samples
+HEDGE_DELAY_MIN = 0.02
+HEDGE_PERCENTILE = 0.95
+HEDGE_TIMEOUT = 2    # seconds to connect / get the first byte for a backup read; it only helps if fast
+CONNECT_TIMEOUT = 2
+CHUNK_MAP_CACHE_SIZE = 256  # files whose chunk maps are kept
+CHUNK_MAP_TTL = 30.0        # seconds a cached chunk map is used without asking the NameNode
 
-def compute_checksums(filepath):
-    # returns dict: chunk_id -> sha256
-    filesize = os.path.getsize(filepath)
-    n = math.ceil(filesize / CHUNK_SIZE)
-    d = {}
+
+class LatencyTracker:
+    # recent chunk read latencies per DataNode, used to pick the hedging delay
+    def __init__(self, samples=200, min_samples=10):
+        self.samples = samples
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.latencies = {}
+
+    def record(self, host, seconds):
+        with self.lock:
+            window = self.latencies.setdefault(host, [])
+            window.append(seconds)
+            if len(window) > self.samples:
+                del window[0]
+
+    def percentile(self, host, q):
+        with self.lock:
+            window = sorted(self.latencies.get(host, ()))
+        if len(window) < self.min_samples:
+            return None
+        return window[min(len(window) - 1, int(q * len(window)))]
+
+    def hedge_delay(self, host):
+        p = self.percentile(host, HEDGE_PERCENTILE)
+        if p is None:
+            return HEDGE_DELAY_DEFAULT
+        return min(max(p, HEDGE_DELAY_MIN), READ_TIMEOUT)
+
+
+LATENCY = LatencyTracker()
+HEDGE_POOL = ThreadPoolExecutor(max_workers=32)
+
+
+class ChunkMapCache:
+    # LRU of NameNode chunk maps per (namenode, file path), each tagged with the file's generation.
+    # Entries live for `ttl` seconds; a read that fails against one drops it and asks the NameNode
+    # again, and a listing can drop every entry whose generation moved on.
+    def __init__(self, capacity=CHUNK_MAP_CACHE_SIZE, ttl=CHUNK_MAP_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # (namenode, path) -> (fetched_at, chunk map)
+        self.hits = self.misses = self.invalidations = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, cmap):
+        if not self.capacity:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic(), cmap)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key, generation=None):
+        # with a generation, only if the cached map is still that one (another thread may have refreshed it)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (generation is None or entry[1].get("generation") == generation):
+                del self.entries[key]
+                self.invalidations += 1
+
+    def invalidate_tree(self, namenode, path):
+        # a file, or a directory and everything under it, changed through this client
+        path = hdfs_path(path)
+        if path is None:
+            return
+        prefix = path.rstrip("/") + "/"
+        with self.lock:
+            for key in [k for k in self.entries if k[0] == namenode and (k[1] == path or k[1].startswith(prefix))]:
+                del self.entries[key]
+                self.invalidations += 1
+
+    def retain_current(self, namenode, generations):
+        # generations: {path: generation} from a listing; drops cached maps of files that changed or went away
+        with self.lock:
+            for key, (_, cmap) in list(self.entries.items()):
+                if key[0] == namenode and generations.get(key[1]) != cmap.get("generation"):
+                    del self.entries[key]
+                    self.invalidations += 1
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                    "entries": len(self.entries)}
+
+
+CHUNK_MAPS = ChunkMapCache()
+
+
+class ByteBudget:
+    # caps the chunk bytes held in memory; a single oversized chunk is still let through alone
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.cond = threading.Condition()
+
+    def acquire(self, n):
+        with self.cond:
+            while self.used and self.used + n > self.limit:
+                self.cond.wait()
+            self.used += n
+
+    def release(self, n):
+        with self.cond:
+            self.used -= n
+            self.cond.notify_all()
+
+def hdfs_path(path):
+    # the NameNode's normalize(), so "a.txt", "/a.txt" and "//a.txt" share a cache entry; None for
+    # paths with "." or ".." components, which it rejects as invalid_path, so they are never cached
+    parts = [p for p in (path or "").split("/") if p]
+    if any(p in (".", "..") for p in parts):
+        return None
+    return "/" + "/".join(parts)
+
+
+def parse_size(text):
+    # "512K", "4M", "65536" -> bytes
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def choose_block_size(filesize):
+    # smallest power of two giving about TARGET_CHUNKS chunks, within [MIN, MAX]
+    block = MIN_BLOCK_SIZE
+    while block < MAX_BLOCK_SIZE and block * TARGET_CHUNKS < filesize:
+        block *= 2
+    return block
+
+
+def chunk_digests(filepath, block_size, codec="none"):
+    # [(sha256, size), ...] of every chunk in stored (compressed) form, for dedup uploads
+    digests = []
     with open(filepath, "rb") as f:
-        for i in range(n):
-            data = f.read(CHUNK_SIZE)
-            cid = f"{os.path.basename(filepath)}.chunk.{i}"
-            d[cid] = hashlib.sha256(data).hexdigest()
-    return d
+        while True:
+            data = f.read(block_size)
+            if not data:
+                return digests
+            data = compression.compress(codec, data)
+            digests.append((hashlib.sha256(data).hexdigest(), len(data)))
+
+def send_pipeline(chunk_id, filename, data, sha, hosts):
+    # streams the chunk once to hosts[0], which forwards it along hosts[1:];
+    # returns the hosts that acknowledged (empty if the head failed)
+    try:
+        resp = requests.post(
+            hosts[0].rstrip("/") + "/store_chunk_raw",
+            data=data,
+            headers={
+                "Content-Type": "application/octet-stream",
+                "X-Chunk-Id": chunk_id,
+                "X-Filename": filename,
+                "X-Checksum-Sha256": sha,
+                "X-Pipeline": ",".join(hosts[1:])
+            },
+            timeout=15
+        )
+        if resp.status_code == 200:
+            return resp.json().get("acks", [hosts[0]])
+        print("[Client] Upload failed:", resp.status_code, resp.text)
+    except Exception as e:
+        print("[Client] Upload exception to", hosts[0], e)
+    return []
+
 
-def split_and_upload(filepath, namenode=NAMENODE):
-    import math, base64, os, requests
+def write_chunk(chunk_id, filename, data, sha, hosts):
+    # pipeline write; if the chain breaks, restart it from the first node that did not ack.
+    # Acks come back in chain order, so they are counted rather than matched: a DataNode may
+    # name itself differently from the host the NameNode gave us.
+    remaining = list(hosts)
+    stored = []
+    while remaining:
+        acked = send_pipeline(chunk_id, filename, data, sha, remaining)
+        if not acked:
+            remaining = remaining[1:]  # head is down, skip it
+            continue
+        done = min(len(acked), len(remaining))
+        stored += remaining[:done]
+        remaining = remaining[done:]
+    return stored
+
+
+def upload_chunk(chunk_id, filename, data, sha, hosts, retries=UPLOAD_RETRIES):
+    # retry the whole pipeline with backoff until at least one replica holds the chunk;
+    # a partially replicated chunk is topped up later by NameNode re-replication
+    stored = []
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+            print(f"[Client] Retrying {chunk_id} (attempt {attempt + 1})")
+        stored = write_chunk(chunk_id, filename, data, sha, hosts)
+        if stored:
+            break
+    if stored:
+        print(f"[Client] Uploaded {chunk_id} -> {stored}")
+    else:
+        print("[Client] Failed to upload chunk", chunk_id)
+    return stored
 
-    filename = os.path.basename(filepath)
+
+def split_and_upload(filepath, namenode=NAMENODE, parallel=1, max_inflight_bytes=MAX_INFLIGHT_BYTES,
+                     block_size=None, dest=None, codec="none", storage="replicated", dedup=False):
+    # dest is the HDFS path; a trailing "/" (or none given) keeps the local file name.
+    # codec compresses each chunk once here; DataNodes store and replicate the compressed bytes.
+    # storage is "replicated" or an erasure code ("xor-4", "rs-6-3") encoded here stripe by stripe.
+    # dedup hashes the file first; chunks whose bytes the cluster already holds are not sent again
+    if codec not in compression.available():
+        print(f"[Client] Codec {codec} is not available, expected one of {compression.available()}")
+        return
+    if storage != "replicated":
+        try:
+            erasure.parse_scheme(storage)
+        except ValueError as e:
+            print(f"[Client] {e}")
+            return
+        if dedup:
+            print("[Client] Deduplication works with replicated storage only")
+            return
+    dest = dest or "/"
+    filename = dest + os.path.basename(filepath) if dest.endswith("/") else dest
     filesize = os.path.getsize(filepath)
-    num_chunks = math.ceil(filesize / CHUNK_SIZE)
-    checksums = compute_checksums(filepath)
-
-    print("[Client] Requesting upload plan from NameNode...")
-    r = requests.post(
-        f"{namenode}/upload_metadata",
-        json={"filename": filename, "num_chunks": num_chunks, "checksums": checksums}
-    )
+    block_size = block_size or choose_block_size(filesize)
+    num_chunks = math.ceil(filesize / block_size)
+
+    body = {"filename": filename, "num_chunks": num_chunks,
+            "block_size": block_size, "file_size": filesize, "codecs": [codec, "none"], "storage": storage}
+    digests = None
+    if dedup:
+        # hashed in the form they are stored in, so only this codec is offered
+        digests = chunk_digests(filepath, block_size, codec)
+        body.update(dedup=True, digests=[sha for sha, _ in digests], codecs=[codec])
+
+    print(f"[Client] Requesting upload plan from NameNode ({num_chunks} x {block_size} byte blocks)...")
+    r = requests.post(f"{namenode}/upload_metadata", json=body)
     if r.status_code != 200:
         print("NameNode error:", r.status_code, r.text)
         return
 
     plan = r.json()["chunks"]  # [{chunk_id, dn_hosts}, ...]
-    with open(filepath, "rb") as f:
+    codec = r.json().get("codec", "none")  # what the NameNode agreed to record for the file
+    # single pass over the file: each chunk is compressed and hashed as it is read, right before it is sent
+    checksums, sizes = {}, {}
+    ec = r.json().get("ec")
+    if ec:
+        failed = upload_striped(filepath, filename, plan + r.json()["parity"], ec, checksums, sizes, parallel,
+                                block_size, codec)
+    elif parallel > 1:
+        failed = upload_parallel(filepath, filename, plan, checksums, sizes, parallel, max_inflight_bytes,
+                                 block_size, codec)
+    else:
+        failed = []
+        with open(filepath, "rb") as f:
+            for info in plan:
+                chunk_id = info["chunk_id"]
+                if info.get("exists"):
+                    f.seek(block_size, os.SEEK_CUR)  # dedup: the cluster already holds these bytes
+                    continue
+                data = compression.compress(codec, f.read(block_size))
+                checksums[chunk_id] = hashlib.sha256(data).hexdigest()
+                sizes[chunk_id] = len(data)
+
+                # send the chunk once; the DataNodes pass it down the replica pipeline
+                if not upload_chunk(chunk_id, filename, data, checksums[chunk_id], info["dn_hosts"]):
+                    failed.append(chunk_id)
+
+    # commit the checksums to the namespace so readers can verify end to end
+    commit = {"filename": filename, "checksums": checksums, "stored_size": sum(sizes.values())}
+    if ec:
+        commit["chunk_sizes"] = sizes  # lets the NameNode strip stripe padding when it rebuilds a block
+    if digests is not None:
+        # a committed checksum lets later uploads share the block, so only commit what arrived
+        commit["checksums"] = {c: sha for c, sha in checksums.items() if c not in failed}
+        commit["stored_size"] = sum(n for _, n in digests)
+    r = requests.post(f"{namenode}/complete_file", json=commit)
+    if r.status_code != 200:
+        print("[Client] Failed to commit checksums:", r.status_code, r.text)
+    if failed:
+        print(f"[Client] Upload of {filename} incomplete, {len(failed)} chunk(s) failed: {failed}")
+    elif digests is not None:
+        print(f"[Client] Stored {filename}: {num_chunks - len(sizes)} of {num_chunks} chunks were already stored, "
+              f"sent {sum(sizes.values())} bytes")
+    elif codec != "none" or ec:
+        print(f"[Client] Stored {filename} with {codec}, {storage}: {filesize} -> {sum(sizes.values())} bytes")
+    CHUNK_MAPS.invalidate_tree(namenode, filename)
+
+
+def upload_striped(filepath, filename, plan, ec, checksums, sizes, parallel, block_size, codec="none"):
+    # erasure-coded files: a stripe's k data chunks are read and compressed, its m parity
+    # blocks are computed over them, and all k + m blocks go out with a single copy each;
+    # only one stripe is held in memory at a time
+    scheme = erasure.parse_scheme(ec["scheme"])
+    hosts = {info["chunk_id"]: info["dn_hosts"] for info in plan}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(parallel, 1)) as pool, open(filepath, "rb") as f:
+        for stripe in ec["stripes"]:
+            data = [compression.compress(codec, f.read(block_size)) for c in stripe[:scheme.k] if c]
+            blocks = list(zip([c for c in stripe[:scheme.k] if c] + stripe[scheme.k:], data + scheme.encode(data)))
+            uploads = {}
+            for chunk_id, block in blocks:
+                sha = checksums[chunk_id] = hashlib.sha256(block).hexdigest()
+                sizes[chunk_id] = len(block)
+                uploads[pool.submit(upload_chunk, chunk_id, filename, block, sha, hosts[chunk_id])] = chunk_id
+            for fut in as_completed(uploads):
+                if not fut.result():
+                    failed.append(uploads[fut])
+    return failed
+
+
+def upload_parallel(filepath, filename, plan, checksums, sizes, parallel, max_inflight_bytes, block_size,
+                    codec="none"):
+    # the reader thread only pulls the next chunk off disk once the byte budget allows it,
+    # so memory stays bounded by max_inflight_bytes however large the file is
+    budget = ByteBudget(max_inflight_bytes)
+    failed = []
+
+    def task(info, data, sha):
+        try:
+            if not upload_chunk(info["chunk_id"], filename, data, sha, info["dn_hosts"]):
+                failed.append(info["chunk_id"])
+        finally:
+            budget.release(len(data))
+
+    with ThreadPoolExecutor(max_workers=parallel) as pool, open(filepath, "rb") as f:
         for info in plan:
-            chunk_id = info["chunk_id"]
-            data = f.read(CHUNK_SIZE)
-            b64 = base64.b64encode(data).decode("utf-8")
-
-            # send chunk to each assigned DataNode
-            for host in info["dn_hosts"]:
-                try:
-                    resp = requests.post(
-                        host.rstrip("/") + "/store_chunk",
-                        json={
-                            "chunk_id": chunk_id,
-                            "filename": filename,  
-                            "data": b64
-                        },
-                        timeout=15
-                    )
-                    if resp.status_code == 200:
-                        print(f"[Client] Uploaded {chunk_id} -> {host}")
-                    else:
-                        print("[Client] Upload failed:", resp.status_code, resp.text)
-                except Exception as e:
-                    print("[Client] Upload exception to", host, e)
-
-
-def download_and_reconstruct(filename, out_path, namenode=NAMENODE):
+            if info.get("exists"):
+                f.seek(block_size, os.SEEK_CUR)  # dedup: the cluster already holds these bytes
+                continue
+            budget.acquire(block_size)
+            data = compression.compress(codec, f.read(block_size))
+            budget.release(block_size - len(data))  # hold what the (compressed) chunk really takes
+            sha = checksums[info["chunk_id"]] = hashlib.sha256(data).hexdigest()
+            sizes[info["chunk_id"]] = len(data)
+            pool.submit(task, info, data, sha)
+    return failed
+
+
+def chunk_index(c):
+    # position of a chunk-map entry in its file; deduplicated files may share other files' blocks,
+    # so the NameNode sends it explicitly
+    return c["index"] if "index" in c else int(c["chunk_id"].split(".")[-1])
+
+
+class ReadCancel:
+    # shared by the reads racing for one chunk. set() stops them all: a read checks between buffers,
+    # and a read blocked waiting for data has its socket shut down so its HEDGE_POOL worker is freed now
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.responses = set()
+
+    def is_set(self):
+        return self.cancelled
+
+    def set(self):
+        with self.lock:
+            self.cancelled = True
+            responses, self.responses = self.responses, set()
+        for resp in responses:
+            self._abort(resp)
+
+    def track(self, resp):
+        with self.lock:
+            if not self.cancelled:
+                self.responses.add(resp)
+                return
+        self._abort(resp)
+
+    def untrack(self, resp):
+        with self.lock:
+            self.responses.discard(resp)
+
+    @staticmethod
+    def _abort(resp):
+        try:
+            resp.raw.connection.sock.shutdown(socket.SHUT_RDWR)
+        except Exception:
+            pass  # already finished or released
+
+
+def read_replica(c, host, cancel, span=None, timeout=None):
+    # one GET of a chunk (or of its bytes span[0]:span[1]) from one DataNode; gives up early once `cancel` is set.
+    # timeout bounds connecting and each wait for data, the first byte included
+    start = time.time()
+    timeout = timeout or READ_TIMEOUT
+    params = {"chunk_id": c["chunk_id"]}
+    if span:
+        params.update(offset=span[0], length=span[1] - span[0])
+    try:
+        with requests.get(host.rstrip("/") + "/get_chunk_raw", params=params,
+                          timeout=(min(CONNECT_TIMEOUT, timeout), timeout), stream=True) as resp:
+            if resp.status_code != (206 if span else 200):
+                return None
+            parts = []
+            cancel.track(resp)
+            try:
+                for buf in resp.iter_content(STREAM_BUFFER):
+                    if cancel.is_set():
+                        return None
+                    parts.append(buf)
+            finally:
+                cancel.untrack(resp)
+            if cancel.is_set():
+                return None
+        data = b"".join(parts)
+        # end-to-end check against the checksum the uploader committed to the NameNode;
+        # the DataNode checks a partial read against the CRC32s of the sub-blocks it spans
+        expected = c.get("checksum")
+        if expected and not span and hashlib.sha256(data).hexdigest() != expected:
+            print("[Client] WARNING: checksum mismatch for", c["chunk_id"], "from", host)
+            return None
+        print("[Client] Fetched", c["chunk_id"], "from", host)
+        return data
+    except Exception:
+        return None
+    finally:
+        # cancelled and failed reads count too: they tell us the node is slow
+        LATENCY.record(host, time.time() - start)
+
+
+def fetch_chunk(c, hedge=None, span=None):
+    """
+    Returns the chunk bytes (only span[0]:span[1] if given) from the first replica that serves it, or None.
+    A failed read moves straight on to the next replica. With hedging, a read
+    still running after that node's recent p95 latency gets one backup request
+    to the next replica, with a short HEDGE_TIMEOUT; the first success wins and
+    the others are cancelled.
+    """
+    hedge = HEDGED_READS if hedge is None else hedge
+    hosts = iter(h for h in c["dn_hosts"] if h)
+    cancel = ReadCancel()
+    running = {}
+    last_host = None
+
+    def launch(timeout=None):
+        nonlocal last_host
+        host = next(hosts, None)
+        if host is None:
+            return False
+        running[HEDGE_POOL.submit(read_replica, c, host, cancel, span, timeout)] = host
+        last_host = host
+        return True
+
+    launch()
+    exhausted = hedged = False
+    try:
+        while running:
+            delay = LATENCY.hedge_delay(last_host) if hedge and not hedged and not exhausted else None
+            done, _ = wait(running, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                exhausted = not launch(HEDGE_TIMEOUT)
+                if not exhausted:
+                    print(f"[Client] Hedging {c['chunk_id']}: {last_host} after {delay * 1000:.0f} ms")
+                continue
+            for fut in done:
+                running.pop(fut)
+                data = fut.result()
+                if data is not None:
+                    return data
+            if not exhausted:
+                exhausted = not launch()
+        return None
+    finally:
+        cancel.set()
+
+
+def rebuild_chunk(c, ec):
+    # decodes a data block of an erasure-coded file from any k other blocks of its stripe
+    scheme = erasure.parse_scheme(ec["scheme"])
+    stripe = next(s for s in ec["stripes"] if any(b and b["chunk_id"] == c["chunk_id"] for b in s))
+    index = [b and b["chunk_id"] for b in stripe].index(c["chunk_id"])
+    c = stripe[index]  # the stripe's entry also carries the block's stored size
+    available = {i: b"" for i, b in enumerate(stripe) if b is None}
+    others = [(i, b) for i, b in enumerate(stripe) if b is not None and i != index]
+    pool = ThreadPoolExecutor(max_workers=max(len(others), 1))
+    try:
+        reads = {pool.submit(fetch_chunk, b, False): i for i, b in others}
+        for fut in as_completed(reads):
+            data = fut.result()
+            if data is not None:
+                available[reads[fut]] = data
+                if len(available) >= scheme.k:
+                    break
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    if len(available) < scheme.k:
+        print(f"[Client] Cannot rebuild {c['chunk_id']}: {len(available)} of {scheme.k} stripe blocks readable")
+        return None
+    data = scheme.reconstruct(available, [index], max(len(b) for b in available.values()))[index]
+    data = data[:c["size"]] if c.get("size") is not None else data
+    if c.get("checksum") and hashlib.sha256(data).hexdigest() != c["checksum"]:
+        print("[Client] WARNING: rebuilt", c["chunk_id"], "does not match its checksum")
+        return None
+    print(f"[Client] Rebuilt {c['chunk_id']} from {len(available)} blocks of its stripe")
+    return data
+
+
+def fetch_decoded(c, codec, ec=None):
+    # chunk bytes verified in their stored form, then decompressed; a data block of an
+    # erasure-coded file that no DataNode serves is decoded from the rest of its stripe
+    data = fetch_chunk(c)
+    if data is None and ec:
+        data = rebuild_chunk(c, ec)
+    return compression.decompress(codec, data) if data is not None else None
+
+
+def download_parallel(chunks_sorted, out_path, parallel, window, block_size, codec="none", ec=None):
+    # keeps at most `window` chunks in flight (so at most window * block_size bytes
+    # in memory) and writes each one at its own offset as soon as it arrives;
+    # parallel=1, window=1 is the plain one-chunk-at-a-time download
+    pending = iter(chunks_sorted)
+    in_flight = {}
+    size = 0
+    with ThreadPoolExecutor(max_workers=parallel) as pool, open(out_path, "wb") as out:
+        fd = out.fileno()
+        while True:
+            while len(in_flight) < window:
+                c = next(pending, None)
+                if c is None:
+                    break
+                in_flight[pool.submit(fetch_decoded, c, codec, ec)] = c
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                c = in_flight.pop(fut)
+                data = fut.result()
+                if data is None:
+                    print("[Client] Failed to retrieve chunk", c["chunk_id"])
+                    for other in in_flight:
+                        other.cancel()
+                    return False
+                offset = chunk_index(c) * block_size
+                os.pwrite(fd, data, offset)
+                size = max(size, offset + len(data))
+        out.truncate(size)
+    return True
+
+
+def chunk_map(filename, namenode=NAMENODE):
+    # the NameNode's /get_chunk_map reply for a file (from CHUNK_MAPS while fresh), or None
+    key = (namenode, hdfs_path(filename))
+    cmap = CHUNK_MAPS.get(key) if key[1] else None
+    if cmap is not None:
+        return cmap
     r = requests.get(f"{namenode}/get_chunk_map", params={"filename": filename})
     if r.status_code != 200:
         print("NameNode error:", r.status_code, r.text)
-        return
-    chunks = r.json()["chunks"]
-    # sort by chunk index
-    chunks_sorted = sorted(chunks, key=lambda c: int(c["chunk_id"].split(".")[-1]))
-    with open(out_path, "wb") as out:
-        for c in chunks_sorted:
-            retrieved = False
-            # try each host until success
-            for host in c["dn_hosts"]:
-                if not host:
-                    continue
-                try:
-                    resp = requests.get(host.rstrip("/") + "/get_chunk", params={"chunk_id": c["chunk_id"]}, timeout=8)
-                    if resp.status_code == 200:
-                        data_b64 = resp.json()["data"]
-                        data = base64.b64decode(data_b64)
-                        # optional: verify checksum if NameNode provided one
-                        expected = c.get("checksum")
-                        if expected:
-                            import hashlib
-                            if hashlib.sha256(data).hexdigest() != expected:
-                                print("[Client] WARNING: checksum mismatch for", c["chunk_id"], "from", host)
-                        out.write(data)
-                        print("[Client] Wrote", c["chunk_id"], "from", host)
-                        retrieved = True
-                        break
-                except Exception:
-                    continue
-            if not retrieved:
+        return None
+    cmap = r.json()
+    if key[1]:
+        CHUNK_MAPS.put(key, cmap)
+    return cmap
+
+
+def refreshed_chunk_map(filename, namenode, failed):
+    # a read against chunk map `failed` (maybe cached) found no live copy of some chunk: drop it and
+    # ask the NameNode again; None unless the answer differs (new locations, or a new generation of the file)
+    CHUNK_MAPS.invalidate((namenode, hdfs_path(filename)), failed.get("generation"))
+    cmap = chunk_map(filename, namenode)
+    if cmap is None or cmap == failed:
+        return None
+    print(f"[Client] Retrying {filename} with a fresh chunk map (generation {cmap.get('generation')})")
+    return cmap
+
+
+def download_and_reconstruct(filename, out_path, namenode=NAMENODE, parallel=1, window=None):
+    window = window or (2 * parallel if parallel > 1 else 1)
+    cmap = chunk_map(filename, namenode)
+    for attempt in range(2):
+        if cmap is None:
+            return
+        chunks = cmap["chunks"]
+        # files written before block sizes were recorded used the old fixed CHUNK_SIZE
+        block_size = cmap.get("block_size") or CHUNK_SIZE
+        codec = cmap.get("codec", "none")
+        # sort by chunk index
+        chunks_sorted = sorted(chunks, key=chunk_index)
+        if download_parallel(chunks_sorted, out_path, parallel, window, block_size, codec, cmap.get("ec")):
+            print("[Client] Reconstructed file saved to", out_path)
+            return
+        if not attempt:
+            # one retry, writing the whole file again from the new map so it never mixes two generations
+            cmap = refreshed_chunk_map(filename, namenode, cmap)
+
+
+def read_range(cmap, offset, length):
+    """
+    Bytes offset..offset+length of the file described by chunk map `cmap`
+    (shorter at the end of the file), or None if a chunk can't be read.
+    Only the chunks overlapping the range are fetched; from uncompressed
+    chunks only the overlapping bytes. Compressed chunks, and erasure-coded
+    blocks no DataNode serves, are fetched or rebuilt whole and then sliced.
+    """
+    block_size = cmap.get("block_size") or CHUNK_SIZE
+    codec = cmap.get("codec", "none")
+    if cmap.get("file_size") is not None:
+        length = max(0, min(length, cmap["file_size"] - offset))
+    stop = offset + length
+    parts = []
+    for c in sorted(cmap["chunks"], key=chunk_index):
+        base = chunk_index(c) * block_size
+        if base + block_size <= offset or base >= stop:
+            continue
+        span = (max(offset, base) - base, min(stop, base + block_size) - base)
+        data = fetch_chunk(c, span=span) if codec == "none" else None
+        if data is None:
+            data = fetch_decoded(c, codec, cmap.get("ec"))
+            if data is None:
                 print("[Client] Failed to retrieve chunk", c["chunk_id"])
-                return
-    print("[Client] Reconstructed file saved to", out_path)
-def delete_file(filename, namenode=NAMENODE):
-    r = requests.post(f"{namenode}/delete_file", json={"filename": filename})
+                return None
+            data = data[span[0]:span[1]]
+        parts.append(data)
+    return b"".join(parts)
+
+
+def read(filename, offset, length, namenode=NAMENODE):
+    # random access to part of a file without downloading the rest of it
+    cmap = chunk_map(filename, namenode)
+    if cmap is None:
+        return None
+    data = read_range(cmap, offset, length)
+    if data is None:
+        cmap = refreshed_chunk_map(filename, namenode, cmap)
+        data = read_range(cmap, offset, length) if cmap is not None else None
+    return data
+
+
+def delete_file(filename, namenode=NAMENODE, recursive=False):
+    r = requests.post(f"{namenode}/delete_file", json={"filename": filename, "recursive": recursive})
+    CHUNK_MAPS.invalidate_tree(namenode, filename)
     if r.status_code == 200:
-        print(f"[Client] Deleted file {filename} from HDFS.")
+        print(f"[Client] Deleted {filename} from HDFS.")
     else:
         print("Delete failed:", r.status_code, r.text)
 
 
-def verify_file(filename, namenode=NAMENODE):
-    r = requests.get(f"{namenode}/verify_file", params={"filename": filename})
+def mkdir(path, namenode=NAMENODE):
+    r = requests.post(f"{namenode}/mkdir", json={"path": path})
+    if r.status_code == 200:
+        print(f"[Client] {r.json()['path']}: {r.json()['status']}")
+    else:
+        print("mkdir failed:", r.status_code, r.text)
+
+
+def rename(src, dst, namenode=NAMENODE):
+    r = requests.post(f"{namenode}/rename", json={"src": src, "dst": dst})
+    CHUNK_MAPS.invalidate_tree(namenode, src)
+    CHUNK_MAPS.invalidate_tree(namenode, dst)
+    if r.status_code == 200:
+        print(f"[Client] Renamed {src} -> {dst}")
+    else:
+        print("Rename failed:", r.status_code, r.text)
+
+
+def iter_dir(path="/", fields="sizes", page_size=1000, namenode=NAMENODE):
+    # direct children of an HDFS directory, page by page (see /listdir)
+    after = None
+    while True:
+        params = {"path": path, "fields": fields, "limit": page_size}
+        if after:
+            params["after"] = after
+        r = requests.get(f"{namenode}/listdir", params=params)
+        r.raise_for_status()
+        page = r.json()
+        yield from page["entries"]
+        after = page.get("next")
+        if not after:
+            return
+
+
+def ls(path="/", namenode=NAMENODE):
+    try:
+        for e in iter_dir(path, namenode=namenode):
+            if e["type"] == "dir":
+                print(f"📁 {e['name']}/  ({e['children']} entries)")
+            else:
+                size = f"{e['size']} bytes" if e["size"] is not None else "size unknown"
+                print(f"📄 {e['name']}: {size}, {e['num_chunks']} chunks")
+    except requests.RequestException as e:
+        print("Error listing directory:", e)
+
+
+def verify_file(filename, namenode=NAMENODE, deep=False):
+    # by default the NameNode answers from its DataNodes' background block scans
+    params = {"filename": filename, "deep": "1" if deep else "0"}
+    r = requests.get(f"{namenode}/verify_file", params=params)
     if r.status_code != 200:
         print("Verification failed:", r.status_code, r.text)
         return
     result = r.json()
+    now = time.time()
     print(f"Verification for {filename}:")
     for chunk, replicas in result["status"].items():
-        print(f"  {chunk}: {[ 'OK' if ok else 'MISSING' for ok in replicas ]}")
+        ages = [f"{now - t:.0f}s ago" if t else "?" for t in result.get("scanned_at", {}).get(chunk, [])]
+        print(f"  {chunk}: {[ 'OK' if ok else 'BAD' for ok in replicas ]} checked {ages}")
 
 
-def pretty_list(namenode=NAMENODE):
-    r = requests.get(f"{namenode}/list_files")
-    if r.status_code != 200:
-        print("Error fetching file list:", r.status_code, r.text)
-        return
-    data = r.json()
-    print("=== Files in HDFS ===")
-    for fname, info in data.items():
-        print(f"📄 {fname}:")
-        for chunk, dns in info.items():
-            print(f"   {chunk} -> {dns}")
+def iter_files(fields="names", prefix=None, page_size=1000, namenode=NAMENODE):
+    """
+    Walks the NameNode listing page by page. fields is "names" (yields
+    filenames), "sizes" or "blocks" (yield dicts, see /list_files).
+    """
+    after = None
+    while True:
+        params = {"fields": fields, "limit": page_size}
+        if prefix:
+            params["prefix"] = prefix
+        if after:
+            params["after"] = after
+        r = requests.get(f"{namenode}/list_files", params=params)
+        r.raise_for_status()
+        page = r.json()
+        yield from page["files"]
+        after = page.get("next")
+        if not after:
+            return
+
+
+def pretty_list(namenode=NAMENODE, prefix=None, blocks=False):
+    try:
+        print("=== Files in HDFS ===")
+        for f in iter_files("blocks" if blocks else "sizes", prefix, namenode=namenode):
+            size = f"{f['size']} bytes" if f["size"] is not None else "size unknown"
+            stored = f" ({f['codec']}, {f['stored_size']} bytes stored)" \
+                if f.get("codec", "none") != "none" and f.get("stored_size") is not None else ""
+            if f.get("storage", "replicated") != "replicated":
+                stored += f" [{f['storage']}]"
+            if f.get("dedup"):
+                stored += " [dedup]"
+            print(f"📄 {f['name']}: {size}{stored}, {f['num_chunks']} chunks of {f['block_size']} bytes")
+            for chunk, dns in f.get("chunks_info", {}).items():
+                print(f"   {chunk} -> {dns}")
+    except requests.RequestException as e:
+        print("Error fetching file list:", e)
 
 
 def list_files(namenode=NAMENODE):
-    r = requests.get(f"{namenode}/list_files")
-    print(r.json())
+    print(list(iter_files("names", namenode=namenode)))
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 client.py upload <file> | download <filename> <outpath> | list | delete <filename> | verify <filename>")
-        sys.exit(1)
-    cmd = sys.argv[1]
-    if cmd == "upload":
-        split_and_upload(sys.argv[2])
-    elif cmd == "download":
-        download_and_reconstruct(sys.argv[2], sys.argv[3])
-    elif cmd == "list":
-        pretty_list()
-    elif cmd == "delete":
-        delete_file(sys.argv[2])
-    elif cmd == "verify":
-        verify_file(sys.argv[2])
-    else:
-        print("Unknown command", cmd)
+    parser = argparse.ArgumentParser(description="Mini HDFS client")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("upload")
+    p.add_argument("file")
+    p.add_argument("dest", nargs="?", default="/",
+                   help="HDFS path, or a directory ending in / (default: /<file name>)")
+    p.add_argument("--parallel", type=int, default=1, metavar="N",
+                   help="upload up to N chunks concurrently")
+    p.add_argument("--max-inflight-mb", type=int, default=MAX_INFLIGHT_BYTES // 2**20,
+                   help="cap on chunk data held in memory in parallel mode")
+    p.add_argument("--block-size", type=parse_size, default=None,
+                   help="chunk size, e.g. 32, 512K or 4M (default: picked from file size)")
+    p.add_argument("--codec", choices=compression.KNOWN_CODECS, default="none",
+                   help="compress chunks on the wire and at rest (zstd needs the zstandard package)")
+    p.add_argument("--storage", default="replicated",
+                   help="replicated, or an erasure code: xor-K (one parity block per K chunks) "
+                        "or rs-K-M (Reed-Solomon, needs numpy)")
+    p.add_argument("--dedup", action="store_true",
+                   help="share chunks with identical bytes already in HDFS instead of sending them again")
+    p = sub.add_parser("download")
+    p.add_argument("filename")
+    p.add_argument("outpath")
+    p.add_argument("--parallel", type=int, default=1, metavar="N",
+                   help="fetch up to N chunks concurrently")
+    p.add_argument("--window", type=int, default=None,
+                   help="max chunks prefetched ahead (default 2 x parallel)")
+    p.add_argument("--no-hedge", action="store_true",
+                   help="never send backup reads to a second replica")
+    p = sub.add_parser("read")
+    p.add_argument("filename")
+    p.add_argument("offset", type=parse_size)
+    p.add_argument("length", type=parse_size)
+    p.add_argument("outpath")
+    p = sub.add_parser("list")
+    p.add_argument("--prefix", default=None, help="only files whose path starts with this")
+    p.add_argument("--blocks", action="store_true", help="also show each chunk's DataNodes")
+    p = sub.add_parser("delete")
+    p.add_argument("filename")
+    p.add_argument("-r", "--recursive", action="store_true", help="delete a directory and everything in it")
+    p = sub.add_parser("ls")
+    p.add_argument("path", nargs="?", default="/")
+    p = sub.add_parser("mkdir")
+    p.add_argument("path")
+    p = sub.add_parser("mv")
+    p.add_argument("src")
+    p.add_argument("dst")
+    p = sub.add_parser("verify")
+    p.add_argument("filename")
+    p.add_argument("--deep", action="store_true",
+                   help="re-read every replica now instead of using block scan results")
+    args = parser.parse_args()
 
+    if args.cmd == "upload":
+        split_and_upload(args.file, parallel=args.parallel, max_inflight_bytes=args.max_inflight_mb * 2**20,
+                         block_size=args.block_size, dest=args.dest, codec=args.codec, storage=args.storage,
+                         dedup=args.dedup)
+    elif args.cmd == "download":
+        HEDGED_READS = not args.no_hedge
+        download_and_reconstruct(args.filename, args.outpath, parallel=args.parallel, window=args.window)
+    elif args.cmd == "read":
+        data = read(args.filename, args.offset, args.length)
+        if data is not None:
+            with open(args.outpath, "wb") as f:
+                f.write(data)
+            print(f"[Client] Read {len(data)} bytes of {args.filename} into {args.outpath}")
+    elif args.cmd == "list":
+        pretty_list(prefix=args.prefix, blocks=args.blocks)
+    elif args.cmd == "delete":
+        delete_file(args.filename, recursive=args.recursive)
+    elif args.cmd == "ls":
+        ls(args.path)
+    elif args.cmd == "mkdir":
+        mkdir(args.path)
+    elif args.cmd == "mv":
+        rename(args.src, args.dst)
+    elif args.cmd == "verify":
+        verify_file(args.filename, deep=args.deep)
@@ -1,10 +1,33 @@
 #client_web.py
-from flask import Flask, request, render_template_string, send_file, redirect, url_for
-import os, tempfile
+from flask import Flask, request, render_template_string, send_file, redirect, url_for, Response
+import os, sys, tempfile, time
 import client  # <-- import your existing client.py functions
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import metrics
 
 app = Flask(__name__)
+METRICS = metrics.Registry()
+metrics.instrument_flask(app, METRICS)
+FILE_BYTES = METRICS.counter("hdfs_client_file_bytes_total", "File bytes moved through HDFS.", ["direction"])
+FILE_SECONDS = METRICS.histogram("hdfs_client_file_seconds", "Whole-file upload/download time.", ["direction"])
+METRICS.counter_fn("hdfs_client_chunk_map_cache_total", "Chunk map lookups, served from the cache or not.",
+                   lambda: {"hit": client.CHUNK_MAPS.hits, "miss": client.CHUNK_MAPS.misses}, ["result"])
+METRICS.counter_fn("hdfs_client_chunk_map_invalidations_total", "Cached chunk maps dropped before their TTL.",
+                   lambda: client.CHUNK_MAPS.invalidations)
+METRICS.gauge_fn("hdfs_client_chunk_map_cache_entries", "Chunk maps currently cached.",
+                 lambda: len(client.CHUNK_MAPS.entries))
 UPLOAD_FOLDER = tempfile.gettempdir()
+LISTING_TTL = 5.0  # seconds the file list is reused between page loads
+LISTING = {"at": 0.0, "files": None}
+
+def file_names(refresh=False):
+    # the file list for the index page, re-fetched at most every LISTING_TTL seconds;
+    # its generations also drop cached chunk maps of files changed by other clients
+    if refresh or LISTING["files"] is None or time.monotonic() - LISTING["at"] > LISTING_TTL:
+        entries = list(client.iter_files("sizes"))
+        client.CHUNK_MAPS.retain_current(client.NAMENODE, {f["name"]: f.get("generation") for f in entries})
+        LISTING.update(at=time.monotonic(), files=[f["name"] for f in entries])
+    return LISTING["files"]
 
 # ---------------- Original TEMPLATE with ONE extra line for dashboard link ----------------
 TEMPLATE = """
@@ -54,9 +77,9 @@ TEMPLATE = """
                 <tr>
                     <td>{{ fname }}</td>
                     <td>
-                        <a href="/download/{{ fname }}"><button>Download</button></a>
-                        <a href="/verify/{{ fname }}"><button>Verify</button></a>
-                        <a href="/delete/{{ fname }}"><button>Delete</button></a>
+                        <a href="/download/{{ fname.lstrip('/') }}"><button>Download</button></a>
+                        <a href="/verify/{{ fname.lstrip('/') }}"><button>Verify</button></a>
+                        <a href="/delete/{{ fname.lstrip('/') }}"><button>Delete</button></a>
                     </td>
                 </tr>
             {% endfor %}
@@ -76,12 +99,7 @@ def index():
     files = []
     msg = None
     try:
-        resp = client.requests.get(f"{client.NAMENODE}/list_files")
-        if resp.status_code == 200:
-            data = resp.json()
-            files = list(data.keys())
-        else:
-            msg = f"NameNode returned {resp.status_code}"
+        files = file_names()
     except Exception as e:
         msg = f"Error connecting to NameNode: {e}"
 
@@ -97,31 +115,60 @@ def upload():
     file.save(path)
 
     try:
-        client.split_and_upload(path)
+        with FILE_SECONDS.labels("upload").time():
+            client.split_and_upload(path)
+        FILE_BYTES.labels("upload").inc(os.path.getsize(path))
         msg = f"Uploaded {file.filename} successfully!"
     except Exception as e:
         msg = f"Upload failed: {e}"
 
     # Refresh file list after upload
-    resp = client.requests.get(f"{client.NAMENODE}/list_files")
-    files = list(resp.json().keys()) if resp.status_code == 200 else []
+    try:
+        files = file_names(refresh=True)
+    except Exception:
+        files = []
     return render_template_string(TEMPLATE, files=files, msg=msg)
 
-@app.route("/download/<fname>")
+@app.route("/download/<path:fname>")
 def download(fname):
-    out_path = os.path.join(UPLOAD_FOLDER, "downloaded_" + fname)
-    client.download_and_reconstruct(fname, out_path)
+    if request.range is not None:
+        cmap = client.chunk_map(fname)
+        if cmap is None:
+            return "File not found", 404
+        if cmap.get("file_size") is not None:
+            return download_range(fname, cmap["file_size"])
+        # files uploaded before sizes were recorded are sent whole
+    out_path = os.path.join(UPLOAD_FOLDER, "downloaded_" + os.path.basename(fname))
+    with FILE_SECONDS.labels("download").time():
+        client.download_and_reconstruct(fname, out_path)
+    FILE_BYTES.labels("download").inc(os.path.getsize(out_path))
     return send_file(out_path, as_attachment=True)
 
-@app.route("/verify/<fname>")
+def download_range(fname, size):
+    # Range requests (media seeking, resumed downloads) read only the chunks they cover
+    span = request.range.range_for_length(size)
+    if span is None:
+        return "Range not satisfiable", 416, {"Content-Range": f"bytes */{size}"}
+    start, stop = span
+    data = client.read(fname, start, stop - start)  # the chunk map just fetched is cached
+    if data is None:
+        return "Read failed", 502
+    FILE_BYTES.labels("download").inc(len(data))
+    return Response(data, status=206, mimetype="application/octet-stream",
+                    headers={"Content-Range": f"bytes {start}-{start + len(data) - 1}/{size}",
+                             "Accept-Ranges": "bytes",
+                             "Content-Disposition": f"attachment; filename={os.path.basename(fname)}"})
+
+@app.route("/verify/<path:fname>")
 def verify(fname):
     client.requests.get(f"{client.NAMENODE}/verify_file", params={"filename": fname})
     return redirect(url_for("index"))
     
-@app.route("/delete/<fname>")
+@app.route("/delete/<path:fname>")
 def delete(fname):
     try:
         response = client.requests.post(f"{client.NAMENODE}/delete_file", json={"filename": fname})
+        client.CHUNK_MAPS.invalidate_tree(client.NAMENODE, fname)
         if response.status_code == 200:
             msg = f"Deleted {fname} successfully!"
         else:
@@ -130,8 +177,7 @@ def delete(fname):
         msg = f"Error deleting {fname}: {str(e)}"
     # Refresh file list after delete
     try:
-        data = client.requests.get(f"{client.NAMENODE}/list_files").json()
-        files = list(data.keys()) if data else []
+        files = file_names(refresh=True)
     except Exception:
         files = []
     return render_template_string(TEMPLATE, files=files, msg=msg)
@@ -141,10 +187,7 @@ def delete(fname):
 @app.route("/dashboard")
 def dashboard():
     try:
-        resp = client.requests.get(f"{client.NAMENODE}/list_files")
-        if resp.status_code != 200:
-            return f"<h2>Error from NameNode: {resp.status_code}</h2>"
-        data = resp.json()
+        data = {f["name"]: f["chunks_info"] for f in client.iter_files("blocks")}
     except Exception as e:
         return f"<h2>Error connecting to NameNode: {e}</h2>"
 
@@ -0,0 +1,654 @@
+#chunkstore.py
+"""
+Chunk storage backends for the DataNodes.
+
+    STORE = open_store("segments", data_dir)
+    size, sha = STORE.put_stream(chunk_id, stream, length, expected_sha)
+    for buf in STORE.stream(chunk_id): ...
+    part = STORE.read(chunk_id, offset, length)   # only these bytes are read from disk
+    STORE.delete(chunk_id)
+
+Both backends hash chunks as they are written and keep the SHA-256 with the
+chunk; missing chunks raise FileNotFoundError from open/stream/version.
+Alongside it they keep a CRC32 of every SUB_BLOCK (64 KB) of the chunk,
+computed in the same pass, so that a ranged read can be verified by
+reading only the sub-blocks it touches:
+    for buf in STORE.stream_verified(chunk_id, offset, length): ...   # SubBlockMismatch if one is bad
+Chunks stored before sub-block CRCs existed have crcs() None.
+
+"files" is the original layout: one file per chunk plus .sha256 and .crc32
+sidecars.
+
+"segments" appends chunks to large segment files instead, so a store is one
+write into an already open file and a million small chunks are a handful of
+inodes. Each record carries its own checksum:
+    header (magic, kind, id length, data length, sha256) | chunk id | CRC32s | data
+(records written before sub-block CRCs have magic HSEG and no CRC32s).
+A put reserves its record's space under the lock, streams the data in
+outside it, then flips the header from PENDING to PUT. A delete appends a
+TOMBSTONE. The in-memory index (chunk id -> segment, offset, size, sha256) is
+saved to segments.idx by checkpoint(); on startup the index is loaded and
+only records written after it are scanned. compact() copies the live records
+of mostly dead sealed segments into the active one and removes the old
+files. Records left PENDING by a crash are skipped; anything after a torn
+record at the end of a segment is lost, and the next full block report tells
+the NameNode to re-replicate it.
+"""
+import hashlib, io, os, struct, threading, zlib
+
+STREAM_BUFFER = 64 * 1024
+SUB_BLOCK = 64 * 1024  # bytes covered by each CRC32
+
+
+class ChecksumMismatch(Exception):
+    """The bytes received for a chunk do not hash to the SHA-256 the sender announced."""
+
+    def __init__(self, chunk_id, expected, actual):
+        super().__init__(f"{chunk_id}: expected {expected[:12]}, got {actual[:12]}")
+        self.chunk_id = chunk_id
+        self.sha256 = actual
+
+
+class SubBlockMismatch(Exception):
+    """A sub-block read back from disk does not match the CRC32 stored for it."""
+
+    def __init__(self, chunk_id, index):
+        super().__init__(f"{chunk_id}: CRC32 mismatch in sub-block {index} "
+                         f"(bytes {index * SUB_BLOCK}-{(index + 1) * SUB_BLOCK - 1})")
+        self.chunk_id = chunk_id
+        self.index = index
+
+
+def crc_count(size):
+    return -(-size // SUB_BLOCK)
+
+
+def pack_crcs(crcs):
+    return struct.pack(f"<{len(crcs)}I", *crcs)
+
+
+def unpack_crcs(raw):
+    return list(struct.unpack(f"<{len(raw) // 4}I", raw))
+
+
+def _copy(stream, length, write):
+    """
+    Feeds stream (exactly length bytes if given) to write(), hashing it.
+    Returns (size, sha256, crcs) with the CRC32 of every SUB_BLOCK bytes.
+    """
+    sha = hashlib.sha256()
+    crcs, crc, filled = [], 0, 0
+    size = 0
+    while length is None or size < length:
+        buf = stream.read(STREAM_BUFFER if length is None else min(STREAM_BUFFER, length - size))
+        if not buf:
+            break
+        write(buf)
+        sha.update(buf)
+        view = memoryview(buf)
+        while view:  # reads need not line up with sub-blocks
+            take = min(SUB_BLOCK - filled, len(view))
+            crc = zlib.crc32(view[:take], crc)
+            filled += take
+            view = view[take:]
+            if filled == SUB_BLOCK:
+                crcs.append(crc)
+                crc, filled = 0, 0
+        size += len(buf)
+    if length is not None and size != length:
+        raise IOError(f"body ended after {size} of {length} bytes")
+    if filled:
+        crcs.append(crc)
+    return size, sha.hexdigest(), crcs
+
+
+class ChunkStore:
+    name = None
+
+    def stream(self, chunk_id, buffer_size=STREAM_BUFFER, offset=0, length=None):
+        """Yields the chunk (or length bytes of it from offset) in buffer_size pieces
+        so whole chunks never sit in memory."""
+        with self.open(chunk_id) as f:
+            if offset:
+                f.seek(offset)
+            left = length
+            while left is None or left > 0:
+                buf = f.read(buffer_size if left is None else min(buffer_size, left))
+                if not buf:
+                    break
+                if left is not None:
+                    left -= len(buf)
+                yield buf
+
+    def read(self, chunk_id, offset=0, length=None):
+        with self.open(chunk_id) as f:
+            if offset:
+                f.seek(offset)
+            return f.read() if length is None else f.read(length)
+
+    def stream_verified(self, chunk_id, offset=0, length=None, crcs=None):
+        """
+        Like stream(), but reads the whole sub-blocks around the range and checks
+        each against its CRC32 before yielding its part of the range. Raises
+        SubBlockMismatch at the first bad one, ValueError without crcs.
+        """
+        crcs = self.crcs(chunk_id) if crcs is None else crcs
+        if crcs is None:
+            raise ValueError(f"{chunk_id} has no sub-block checksums")
+        with self.open(chunk_id) as f:
+            size = self.size(chunk_id)
+            stop = size if length is None else min(size, offset + length)
+            index = offset // SUB_BLOCK
+            pos = index * SUB_BLOCK
+            f.seek(pos)
+            while pos < stop:
+                block = f.read(SUB_BLOCK)
+                if index >= len(crcs) or zlib.crc32(block) != crcs[index]:
+                    raise SubBlockMismatch(chunk_id, index)
+                yield block[max(offset - pos, 0):stop - pos]
+                pos += len(block)
+                index += 1
+
+    def put(self, chunk_id, data, expected_sha=None):
+        return self.put_stream(chunk_id, io.BytesIO(data), len(data), expected_sha)
+
+    def compact(self):
+        """Reclaims space held by deleted chunks. Returns the bytes freed."""
+        return 0
+
+    def checkpoint(self):
+        """Makes the store's own metadata durable."""
+
+    def close(self):
+        self.checkpoint()
+
+
+# --------------------------- file per chunk ---------------------------
+SIDECARS = (".sha256", ".crc32", ".part")
+
+
+class FileStore(ChunkStore):
+    name = "files"
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _path(self, chunk_id):
+        return os.path.join(self.data_dir, chunk_id)
+
+    def exists(self, chunk_id):
+        return os.path.exists(self._path(chunk_id))
+
+    def size(self, chunk_id):
+        return os.path.getsize(self._path(chunk_id))
+
+    def version(self, chunk_id):
+        """Changes whenever the stored bytes are replaced: (size, mtime_ns)."""
+        st = os.stat(self._path(chunk_id))
+        return st.st_size, st.st_mtime_ns
+
+    def stored_sha(self, chunk_id):
+        """The SHA-256 recorded when the chunk was stored, or None if there is no sidecar."""
+        try:
+            with open(self._path(chunk_id) + ".sha256") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def crcs(self, chunk_id):
+        """Per-sub-block CRC32s from the .crc32 sidecar, or None if it is missing or torn."""
+        try:
+            with open(self._path(chunk_id) + ".crc32", "rb") as f:
+                raw = f.read()
+            size = self.size(chunk_id)
+        except FileNotFoundError:
+            return None
+        return unpack_crcs(raw) if len(raw) == 4 * crc_count(size) else None
+
+    def open(self, chunk_id):
+        return open(self._path(chunk_id), "rb")
+
+    def put_stream(self, chunk_id, stream, length=None, expected_sha=None):
+        path = self._path(chunk_id)
+        tmp = path + ".part"
+        try:
+            with open(tmp, "wb") as f:
+                size, sha, crcs = _copy(stream, length, f.write)
+            if expected_sha and expected_sha != sha:
+                raise ChecksumMismatch(chunk_id, expected_sha, sha)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, path)
+        with open(path + ".sha256", "w") as f:
+            f.write(sha)
+        with open(path + ".crc32", "wb") as f:
+            f.write(pack_crcs(crcs))
+        return size, sha
+
+    def delete(self, chunk_id):
+        path = self._path(chunk_id)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        for sidecar in (".sha256", ".crc32"):
+            if os.path.exists(path + sidecar):
+                os.remove(path + sidecar)
+        return True
+
+    def chunk_ids(self):
+        return sorted(name for name in os.listdir(self.data_dir) if not name.endswith(SIDECARS))
+
+    def stats(self):
+        """(bytes used on disk, number of chunks)."""
+        used, chunks = 0, 0
+        for entry in os.scandir(self.data_dir):
+            if entry.is_file():
+                used += entry.stat().st_size
+                if not entry.name.endswith(SIDECARS):
+                    chunks += 1
+        return used, chunks
+
+
+# --------------------------- packed segments ---------------------------
+MAGIC = b"HSEG"      # records without sub-block CRCs
+MAGIC_CRC = b"HSGC"  # records whose data is preceded by its CRC32s
+HEADER = struct.Struct("<4sBHQ32s")      # magic, kind, id length, data length, sha256
+PENDING, PUT, TOMBSTONE = 0, 1, 2
+INDEX_FILE = "segments.idx"
+INDEX_MAGIC = b"HID2"  # an older index is ignored and the segments rescanned
+INDEX_HEADER = struct.Struct("<4sIQI")   # magic, replay from (segment, offset), entries
+INDEX_ENTRY = struct.Struct("<IQQ32s?")  # segment, record offset, data length, sha256, has CRC32s
+# segments.idx: header | entries | the entries' chunk ids, "\n"-separated
+SEGMENT_SIZE = 64 * 1024 * 1024
+COMPACT_THRESHOLD = 0.5  # compact a sealed segment once this fraction of it is dead
+
+
+def _crc_bytes(size, has_crcs):
+    return 4 * crc_count(size) if has_crcs else 0
+
+
+def _record_size(chunk_id, size, has_crcs):
+    return HEADER.size + len(chunk_id.encode()) + _crc_bytes(size, has_crcs) + size
+
+
+class _Slice:
+    """File-like view of one record's data; len() lets requests send it with a Content-Length."""
+
+    def __init__(self, f, size):
+        self._f = f
+        self._start = f.tell()
+        self._size = size
+        self._left = size
+
+    def __len__(self):
+        return self._size
+
+    def read(self, n=-1):
+        if n is None or n < 0 or n > self._left:
+            n = self._left
+        buf = self._f.read(n)
+        self._left -= len(buf)
+        return buf
+
+    def seek(self, pos):
+        """Moves to pos bytes into the record's data."""
+        pos = min(max(pos, 0), self._size)
+        self._f.seek(self._start + pos)
+        self._left = self._size - pos
+        return pos
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SegmentStore(ChunkStore):
+    name = "segments"
+
+    def __init__(self, data_dir, segment_size=SEGMENT_SIZE, compact_threshold=COMPACT_THRESHOLD):
+        self.data_dir = data_dir
+        self.segment_size = segment_size
+        self.compact_threshold = compact_threshold
+        os.makedirs(data_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._maint_lock = threading.Lock()  # one checkpoint/compaction at a time
+        self._index = {}       # chunk_id -> (segment, record offset, data length, sha256, has CRC32s)
+        self._sizes = {}       # segment -> bytes written or reserved
+        self._live = {}        # segment -> bytes of records the index points at
+        self._pending = {}     # (segment, offset) -> chunk_id of puts still streaming in
+        self._tombstones = {}  # chunk_id -> (segment, offset) of deletes racing a pending put
+        self._fds = {}         # segment -> write fd, for the active segment and ones with pending puts
+        self._active = 0
+        self._end = 0
+        self._load()
+
+    def _path(self, seg):
+        return os.path.join(self.data_dir, f"segment_{seg:08d}.dat")
+
+    def _segments(self):
+        segs = []
+        for name in os.listdir(self.data_dir):
+            if name.startswith("segment_") and name.endswith(".dat"):
+                try:
+                    segs.append(int(name[len("segment_"):-len(".dat")]))
+                except ValueError:
+                    continue
+        return sorted(segs)
+
+    # ---- startup ----
+    def _load(self):
+        segs = self._segments()
+        replay = (segs[0], 0) if segs else (1, 0)
+        loaded = self._read_index()
+        if loaded:
+            replay, self._index = loaded
+            self._index = {c: loc for c, loc in self._index.items() if loc[0] in segs}
+        valid_end = 0
+        for seg in segs:
+            if seg < replay[0]:
+                continue
+            records, valid_end = self._scan(seg, replay[1] if seg == replay[0] else 0)
+            for kind, chunk_id, off, size, sha, has_crcs in records:
+                if kind == PUT:
+                    self._index[chunk_id] = (seg, off, size, sha, has_crcs)
+                elif kind == TOMBSTONE:
+                    self._index.pop(chunk_id, None)
+        for seg in segs:
+            self._sizes[seg] = os.path.getsize(self._path(seg))
+            self._live[seg] = 0
+        for chunk_id, (seg, _, size, _, has_crcs) in self._index.items():
+            self._live[seg] += _record_size(chunk_id, size, has_crcs)
+        if segs and segs[-1] >= replay[0] and self._sizes[segs[-1]] > valid_end:
+            os.truncate(self._path(segs[-1]), valid_end)  # torn tail from a crash
+            self._sizes[segs[-1]] = valid_end
+        self._active = segs[-1] if segs else 1
+        self._end = self._sizes.get(self._active, 0)
+        self._sizes.setdefault(self._active, self._end)
+        self._live.setdefault(self._active, 0)
+        self._fds[self._active] = os.open(self._path(self._active), os.O_RDWR | os.O_CREAT, 0o644)
+
+    def _read_index(self):
+        """((replay segment, offset), index) from segments.idx, or None if absent or unreadable."""
+        try:
+            with open(os.path.join(self.data_dir, INDEX_FILE), "rb") as f:
+                raw = f.read()
+            magic, seg, off, count = INDEX_HEADER.unpack_from(raw, 0)
+            ids_at = INDEX_HEADER.size + count * INDEX_ENTRY.size
+            if magic != INDEX_MAGIC or ids_at > len(raw):
+                return None
+            ids = raw[ids_at:].decode().split("\n") if count else []
+            entries = INDEX_ENTRY.iter_unpack(raw[INDEX_HEADER.size:ids_at])
+            if len(ids) != count:
+                return None
+            return (seg, off), {c: (e_seg, e_off, size, sha.hex(), has_crcs)
+                                for c, (e_seg, e_off, size, sha, has_crcs) in zip(ids, entries)}
+        except (OSError, struct.error, UnicodeDecodeError):
+            return None
+
+    def _scan(self, seg, start):
+        """([(kind, chunk_id, offset, size, sha256, has CRC32s)], end of the last whole record) from start on."""
+        records = []
+        path = self._path(seg)
+        file_size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            f.seek(start)
+            pos = start
+            while pos + HEADER.size <= file_size:
+                magic, kind, id_len, size, sha = HEADER.unpack(f.read(HEADER.size))
+                has_crcs = magic == MAGIC_CRC
+                end = pos + HEADER.size + id_len + _crc_bytes(size, has_crcs) + size
+                if magic not in (MAGIC, MAGIC_CRC) or end > file_size:
+                    break
+                chunk_id = f.read(id_len).decode()
+                records.append((kind, chunk_id, pos, size, sha.hex(), has_crcs))
+                f.seek(end)
+                pos = end
+        return records, pos
+
+    # ---- lookups ----
+    def _locate(self, chunk_id):
+        with self._lock:
+            loc = self._index.get(chunk_id)
+        if loc is None:
+            raise FileNotFoundError(chunk_id)
+        return loc
+
+    def exists(self, chunk_id):
+        with self._lock:
+            return chunk_id in self._index
+
+    def size(self, chunk_id):
+        return self._locate(chunk_id)[2]
+
+    def version(self, chunk_id):
+        """Changes whenever the chunk is rewritten or moved: (segment, offset, size)."""
+        return self._locate(chunk_id)[:3]
+
+    def stored_sha(self, chunk_id):
+        with self._lock:
+            loc = self._index.get(chunk_id)
+        return loc[3] if loc else None
+
+    def _open_record(self, chunk_id):
+        """(open segment file, index entry) for the chunk's record."""
+        for attempt in range(2):
+            loc = self._locate(chunk_id)
+            try:
+                return open(self._path(loc[0]), "rb"), loc
+            except FileNotFoundError:
+                if attempt:
+                    raise
+                # compaction moved it between the lookup and the open
+
+    def open(self, chunk_id):
+        f, (_, off, size, _, has_crcs) = self._open_record(chunk_id)
+        f.seek(off + HEADER.size + len(chunk_id.encode()) + _crc_bytes(size, has_crcs))
+        return _Slice(f, size)
+
+    def crcs(self, chunk_id):
+        f, (_, off, size, _, has_crcs) = self._open_record(chunk_id)
+        with f:
+            if not has_crcs:
+                return None
+            f.seek(off + HEADER.size + len(chunk_id.encode()))
+            return unpack_crcs(f.read(_crc_bytes(size, True)))
+
+    def chunk_ids(self):
+        with self._lock:
+            return sorted(self._index)
+
+    def stats(self):
+        with self._lock:
+            return sum(self._sizes.values()), len(self._index)
+
+    # ---- writes ----
+    def _reserve(self, nbytes, chunk_id):
+        """(segment, offset, fd) for a new record of nbytes; caller holds _lock."""
+        if self._end >= self.segment_size:
+            self._release_fd(self._active, rolling=True)
+            self._active += 1
+            self._end = 0
+            self._sizes[self._active] = self._live[self._active] = 0
+            self._fds[self._active] = os.open(self._path(self._active), os.O_RDWR | os.O_CREAT, 0o644)
+        seg, off = self._active, self._end
+        self._end += nbytes
+        self._sizes[seg] = self._end
+        self._pending[(seg, off)] = chunk_id
+        return seg, off, self._fds[seg]
+
+    def _release_fd(self, seg, rolling=False):
+        """Closes a sealed segment's write fd once no put is still writing into it; caller holds _lock."""
+        if (rolling or seg != self._active) and seg in self._fds \
+                and not any(s == seg for s, _ in self._pending):
+            os.close(self._fds.pop(seg))
+
+    def _commit(self, chunk_id, loc, replaces=None):
+        """Points the index at a finished record unless a newer record for the chunk
+        exists (or, with replaces, unless the index moved on). Caller holds _lock."""
+        old = self._index.get(chunk_id)
+        if replaces is not None:
+            if old != replaces or chunk_id in self._pending.values():
+                return False
+        elif (old and old[:2] > loc[:2]) or self._tombstones.get(chunk_id, (0, -1)) > loc[:2]:
+            return False
+        if old:
+            self._live[old[0]] -= _record_size(chunk_id, old[2], old[4])
+        self._index[chunk_id] = loc
+        self._live[loc[0]] += _record_size(chunk_id, loc[2], loc[4])
+        return True
+
+    def _put(self, chunk_id, stream, length, expected_sha, replaces=None):
+        if "\n" in chunk_id:
+            raise ValueError(f"chunk id {chunk_id!r} contains a newline")
+        if length is None:
+            data = stream.read()  # no Content-Length: buffer it to learn the record size
+            stream, length = io.BytesIO(data), len(data)
+        key = chunk_id.encode()
+        with self._lock:
+            seg, off, fd = self._reserve(_record_size(chunk_id, length, True), chunk_id)
+        committed = False
+        try:
+            os.pwrite(fd, HEADER.pack(MAGIC_CRC, PENDING, len(key), length, bytes(32)) + key, off)
+            pos = off + HEADER.size + len(key) + _crc_bytes(length, True)
+
+            def write(buf):
+                nonlocal pos
+                os.pwrite(fd, buf, pos)
+                pos += len(buf)
+
+            size, sha, crcs = _copy(stream, length, write)
+            if expected_sha and expected_sha != sha:
+                raise ChecksumMismatch(chunk_id, expected_sha, sha)
+            os.pwrite(fd, pack_crcs(crcs), off + HEADER.size + len(key))
+            os.pwrite(fd, HEADER.pack(MAGIC_CRC, PUT, len(key), size, bytes.fromhex(sha)), off)
+            with self._lock:
+                del self._pending[(seg, off)]
+                committed = self._commit(chunk_id, (seg, off, size, sha, True), replaces)
+                if chunk_id not in self._pending.values():
+                    self._tombstones.pop(chunk_id, None)
+                self._release_fd(seg)
+            return size, sha, committed
+        except BaseException:
+            with self._lock:
+                if self._pending.pop((seg, off), None) is not None:
+                    if chunk_id not in self._pending.values():
+                        self._tombstones.pop(chunk_id, None)
+                    self._release_fd(seg)
+            raise  # the PENDING record stays behind as dead space
+
+    def put_stream(self, chunk_id, stream, length=None, expected_sha=None):
+        size, sha, _ = self._put(chunk_id, stream, length, expected_sha)
+        return size, sha
+
+    def delete(self, chunk_id):
+        key = chunk_id.encode()
+        with self._lock:
+            loc = self._index.pop(chunk_id, None)
+            if loc is None:
+                return False
+            self._live[loc[0]] -= _record_size(chunk_id, loc[2], loc[4])
+            seg, off, fd = self._reserve(HEADER.size + len(key), chunk_id)
+            del self._pending[(seg, off)]
+            os.pwrite(fd, HEADER.pack(MAGIC, TOMBSTONE, len(key), 0, bytes(32)) + key, off)
+            if chunk_id in self._pending.values():
+                self._tombstones[chunk_id] = (seg, off)
+            return True
+
+    # ---- maintenance ----
+    def checkpoint(self):
+        with self._maint_lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        with self._lock:
+            # everything before the oldest put still in flight is in the index
+            replay = min(self._pending) if self._pending else (self._active, self._end)
+            entries = list(self._index.items())
+        for seg in self._segments():
+            if seg >= replay[0]:
+                fd = os.open(self._path(seg), os.O_RDONLY)
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        parts = [INDEX_HEADER.pack(INDEX_MAGIC, replay[0], replay[1], len(entries))]
+        parts += [INDEX_ENTRY.pack(seg, off, size, bytes.fromhex(sha), has_crcs)
+                  for _, (seg, off, size, sha, has_crcs) in entries]
+        parts.append("\n".join(chunk_id for chunk_id, _ in entries).encode())
+        path = os.path.join(self.data_dir, INDEX_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(b"".join(parts))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def compact(self):
+        """Rewrites sealed segments that are at least compact_threshold dead. Returns bytes freed."""
+        with self._maint_lock:
+            with self._lock:
+                busy = {s for s, _ in self._pending}
+                victims = [seg for seg, size in sorted(self._sizes.items())
+                           if seg != self._active and seg not in busy
+                           and (not size or 1 - self._live[seg] / size >= self.compact_threshold)]
+            moved = [seg for seg in victims if self._rewrite(seg)]
+            if not moved:
+                return 0
+            self._checkpoint()  # the saved index no longer points into the old segments
+            freed = 0
+            for seg in moved:
+                with self._lock:
+                    freed += self._sizes.pop(seg)
+                    self._live.pop(seg)
+                os.remove(self._path(seg))
+            return freed
+
+    def _rewrite(self, seg):
+        """Copies seg's live records (and tombstones an older segment may still need)
+        to the active segment. Returns False if anything had to stay behind."""
+        records, _ = self._scan(seg, 0)
+        with self._lock:
+            older = any(s < seg for s in self._sizes)
+        for kind, chunk_id, off, size, sha, has_crcs in records:
+            with self._lock:
+                loc = self._index.get(chunk_id)
+            if kind == PUT and loc and loc[:2] == (seg, off):
+                try:
+                    with open(self._path(seg), "rb") as f:
+                        f.seek(off + HEADER.size + len(chunk_id.encode()) + _crc_bytes(size, has_crcs))
+                        if not self._put(chunk_id, f, size, sha, replaces=loc)[2]:
+                            return False
+                except ChecksumMismatch:
+                    return False  # leave the corrupt copy for the block scanner to report
+            elif kind == TOMBSTONE and older and loc is None:
+                key = chunk_id.encode()
+                with self._lock:
+                    if chunk_id in self._pending.values():
+                        return False  # a copy here would land after, and cancel, the put in flight
+                    t_seg, t_off, fd = self._reserve(HEADER.size + len(key), chunk_id)
+                    del self._pending[(t_seg, t_off)]
+                    os.pwrite(fd, HEADER.pack(MAGIC, TOMBSTONE, len(key), 0, bytes(32)) + key, t_off)
+        return True
+
+    def close(self):
+        self.checkpoint()
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+
+
+STORES = {"files": FileStore, "segments": SegmentStore}
+
+
+def open_store(name, data_dir, **kwargs):
+    if name not in STORES:
+        raise ValueError(f"unknown chunk store {name!r}, expected one of {sorted(STORES)}")
+    return STORES[name](data_dir, **kwargs)
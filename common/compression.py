@@ -0,0 +1,62 @@
+#compression.py
+"""
+Chunk codecs shared by the client and the NameNode.
+
+A file's codec is agreed when it is uploaded and recorded by the NameNode.
+The client compresses each chunk once; DataNodes store and replicate the
+compressed bytes untouched, and chunk checksums cover that stored form.
+Readers decompress after verifying. zstd is only offered where the
+zstandard package is installed.
+"""
+import lzma, zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+KNOWN_CODECS = ("none", "zlib", "lzma", "zstd")
+ZLIB_LEVEL = 6
+LZMA_PRESET = 6
+ZSTD_LEVEL = 3
+
+
+def _identity(data):
+    return data
+
+
+CODECS = {
+    "none": (_identity, _identity),
+    "zlib": (lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=LZMA_PRESET), lzma.decompress),
+}
+if zstandard is not None:
+    CODECS["zstd"] = (lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+                      lambda data: zstandard.ZstdDecompressor().decompress(data))
+
+
+def available():
+    """Codecs this process can encode and decode, in KNOWN_CODECS order."""
+    return [name for name in KNOWN_CODECS if name in CODECS]
+
+
+def _codec(name):
+    if name not in CODECS:
+        raise ValueError(f"codec {name!r} is not available here, expected one of {available()}")
+    return CODECS[name]
+
+
+def compress(codec, data):
+    return _codec(codec)[0](data)
+
+
+def decompress(codec, data):
+    return _codec(codec)[1](data)
+
+
+def negotiate(offered, allowed):
+    """The first codec in the client's preference list that is allowed, else "none"."""
+    for name in offered or ():
+        if name in allowed:
+            return name
+    return "none"
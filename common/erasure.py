@@ -0,0 +1,204 @@
+#erasure.py
+"""
+Erasure codes for striped files, shared by the client and the NameNode.
+
+A file stored under an erasure-coding policy is cut into data blocks as
+usual; every k consecutive data blocks form a stripe and m parity blocks are
+computed over it. Blocks of a stripe are zero-padded to the longest one (a
+short last stripe counts its missing blocks as empty). Any k of a stripe's
+k + m blocks are enough to rebuild the others.
+
+    scheme = parse_scheme("rs-6-3")          # or "xor-4" (single parity)
+    parity = scheme.encode(data_blocks)       # m blocks, each as long as the longest data block
+    rebuilt = scheme.reconstruct({index: block, ...}, wanted, block_len)
+
+Indexes 0..k-1 are data blocks, k..k+m-1 parity blocks. Rebuilt blocks come
+back block_len long; callers trim data blocks to their recorded size.
+
+"xor-K" stores the XOR of the data blocks and survives one lost block.
+"rs-K-M" is a systematic Reed-Solomon code over GF(256) whose parity rows
+form a Cauchy matrix, so every k x k submatrix of [I; C] is invertible. Its
+arithmetic works on whole blocks at a time through a 256 x 256 NumPy
+multiplication table, and it is only available when NumPy is installed.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GF_POLY = 0x11d  # x^8 + x^4 + x^3 + x^2 + 1
+
+
+class UnrecoverableStripe(Exception):
+    """Fewer than k blocks of a stripe survive."""
+
+
+def _gf_tables():
+    exp, log = [0] * 512, [0] * 256
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= GF_POLY
+    for i in range(255, 512):
+        exp[i] = exp[i - 255]
+    return exp, log
+
+
+GF_EXP, GF_LOG = _gf_tables()
+_MUL_TABLE = None
+
+
+def gf_mul(a, b):
+    if not a or not b:
+        return 0
+    return GF_EXP[GF_LOG[a] + GF_LOG[b]]
+
+
+def gf_inv(a):
+    if not a:
+        raise ZeroDivisionError("0 has no inverse in GF(256)")
+    return GF_EXP[255 - GF_LOG[a]]
+
+
+def gf_invert_matrix(rows):
+    """Gauss-Jordan inverse of a square matrix over GF(256)."""
+    n = len(rows)
+    a = [list(r) + [int(i == j) for j in range(n)] for i, r in enumerate(rows)]
+    for col in range(n):
+        pivot = next((r for r in range(col, n) if a[r][col]), None)
+        if pivot is None:
+            raise ValueError("matrix is singular")
+        a[col], a[pivot] = a[pivot], a[col]
+        inv = gf_inv(a[col][col])
+        a[col] = [gf_mul(inv, v) for v in a[col]]
+        for r in range(n):
+            if r != col and a[r][col]:
+                f = a[r][col]
+                a[r] = [v ^ gf_mul(f, p) for v, p in zip(a[r], a[col])]
+    return [r[n:] for r in a]
+
+
+def _mul_table():
+    """MUL[c][x] = c * x in GF(256), so MUL[c][block] multiplies a whole block at once."""
+    global _MUL_TABLE
+    if _MUL_TABLE is None:
+        exp, log = np.array(GF_EXP, dtype=np.uint16), np.array(GF_LOG, dtype=np.uint16)
+        c = np.arange(256)[:, None]
+        x = np.arange(256)[None, :]
+        table = exp[log[c] + log[x]].astype(np.uint8)
+        table[0, :] = 0
+        table[:, 0] = 0
+        _MUL_TABLE = table
+    return _MUL_TABLE
+
+
+def _padded(blocks, block_len):
+    return [bytes(b).ljust(block_len, b"\0") for b in blocks]
+
+
+class XorScheme:
+    """k data blocks + 1 parity block holding their XOR."""
+
+    def __init__(self, k):
+        if k < 1:
+            raise ValueError("xor needs k >= 1")
+        self.k, self.m = k, 1
+        self.name = f"xor-{k}"
+
+    def _xor(self, blocks, block_len):
+        acc = 0
+        for b in _padded(blocks, block_len):
+            acc ^= int.from_bytes(b, "little")
+        return acc.to_bytes(block_len, "little")
+
+    def encode(self, data_blocks):
+        block_len = max((len(b) for b in data_blocks), default=0)
+        return [self._xor(data_blocks, block_len)]
+
+    def reconstruct(self, available, wanted, block_len):
+        missing = [i for i in range(self.k + 1) if i not in available]
+        if len(missing) > 1:
+            raise UnrecoverableStripe(f"{self.name}: {len(missing)} blocks missing, can rebuild 1")
+        rebuilt = {i: bytes(available[i]).ljust(block_len, b"\0") for i in wanted if i in available}
+        if missing and missing[0] in wanted:
+            rebuilt[missing[0]] = self._xor([available[i] for i in available], block_len)
+        return rebuilt
+
+
+class ReedSolomon:
+    """Systematic RS(k + m, k) over GF(256) with a Cauchy parity matrix."""
+
+    def __init__(self, k, m):
+        if np is None:
+            raise ValueError("rs erasure coding needs NumPy")
+        if k < 1 or m < 1 or k + m > 256:
+            raise ValueError("rs needs k >= 1, m >= 1 and k + m <= 256")
+        self.k, self.m = k, m
+        self.name = f"rs-{k}-{m}"
+        # parity row i, data column j: 1 / (x_i + y_j) with x_i = i, y_j = m + j all distinct
+        self.parity_rows = [[gf_inv(i ^ (m + j)) for j in range(k)] for i in range(m)]
+
+    def _row(self, index):
+        """Generator matrix row of block index (identity for data, Cauchy for parity)."""
+        if index < self.k:
+            return [int(j == index) for j in range(self.k)]
+        return self.parity_rows[index - self.k]
+
+    def _combine(self, coefficients, blocks):
+        """XOR-sum of coefficient * block over GF(256), vectorised over the block bytes."""
+        mul = _mul_table()
+        acc = np.zeros(blocks.shape[1], dtype=np.uint8)
+        for c, block in zip(coefficients, blocks):
+            if c == 1:
+                acc ^= block
+            elif c:
+                acc ^= mul[c][block]
+        return acc
+
+    def encode(self, data_blocks):
+        block_len = max((len(b) for b in data_blocks), default=0)
+        data = np.zeros((self.k, block_len), dtype=np.uint8)
+        for j, b in enumerate(data_blocks):
+            data[j, :len(b)] = np.frombuffer(bytes(b), dtype=np.uint8)
+        return [self._combine(row, data).tobytes() for row in self.parity_rows]
+
+    def reconstruct(self, available, wanted, block_len):
+        rebuilt = {i: bytes(available[i]).ljust(block_len, b"\0") for i in wanted if i in available}
+        missing = [i for i in wanted if i not in available]
+        if not missing:
+            return rebuilt
+        if len(available) < self.k:
+            raise UnrecoverableStripe(f"{self.name}: only {len(available)} of {self.k + self.m} blocks left")
+        # data blocks first: their identity rows keep the matrix to invert small and sparse
+        use = sorted(available)[:self.k]
+        survivors = np.zeros((self.k, block_len), dtype=np.uint8)
+        for r, i in enumerate(use):
+            survivors[r] = np.frombuffer(bytes(available[i]).ljust(block_len, b"\0"), dtype=np.uint8)
+        decode = gf_invert_matrix([self._row(i) for i in use])  # survivors -> data blocks
+        data = {}
+        for i in missing:
+            if i < self.k:
+                rebuilt[i] = data.setdefault(i, self._combine(decode[i], survivors)).tobytes()
+        if any(i >= self.k for i in missing):
+            full = np.stack([data[j] if j in data else self._combine(decode[j], survivors)
+                             for j in range(self.k)])
+            for i in missing:
+                if i >= self.k:
+                    rebuilt[i] = self._combine(self._row(i), full).tobytes()
+        return rebuilt
+
+
+def parse_scheme(name):
+    """"xor-K" or "rs-K-M" -> scheme object; ValueError for anything else."""
+    parts = (name or "").split("-")
+    try:
+        if parts[0] == "xor" and len(parts) == 2:
+            return XorScheme(int(parts[1]))
+        if parts[0] == "rs" and len(parts) == 3:
+            return ReedSolomon(int(parts[1]), int(parts[2]))
+    except ValueError as e:
+        raise ValueError(f"bad erasure coding policy {name!r}: {e}")
+    raise ValueError(f"unknown erasure coding policy {name!r}, expected xor-K or rs-K-M")
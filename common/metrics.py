@@ -0,0 +1,290 @@
+#metrics.py
+"""
+Minimal Prometheus-style metrics shared by the NameNode, DataNodes and client_web.
+
+    REGISTRY = Registry()
+    REQS = REGISTRY.counter("hdfs_things_total", "Things done.", ["kind"])
+    REQS.labels("a").inc()
+    LAT = REGISTRY.histogram("hdfs_thing_seconds", "Time per thing.")
+    with LAT.time(): ...
+    REGISTRY.gauge_fn("hdfs_queue_depth", "Items queued.", lambda: len(queue))
+    instrument_flask(app, REGISTRY)   # per-route metrics + GET /metrics
+
+Recording is a dict lookup plus an add under a per-metric lock; gauge_fn
+callbacks and text rendering only run when /metrics is scraped.
+"""
+import bisect, threading, time
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in pairs) + "}"
+
+
+def _fmt_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels() if not self.labelnames else None
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, values))
+        return lines
+
+
+class _Value:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+    def render(self, name, labelnames, values):
+        return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        return _Timer(self.observe)
+
+    def render(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_fmt_labels(labelnames, values, ('le', _fmt_value(bound)))} {cumulative}")
+        lines.append(f"{name}_sum{_fmt_labels(labelnames, values)} {total!r}")
+        lines.append(f"{name}_count{_fmt_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class _Timer:
+    def __init__(self, observe):
+        self._observe = observe
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._observe(time.perf_counter() - self._start)
+
+
+class _CallbackMetric:
+    """Value computed at scrape time. fn returns a number, or {label values tuple: number}."""
+
+    def __init__(self, name, help, fn, labelnames=(), kind="gauge"):
+        self.name, self.help, self.fn, self.labelnames, self.kind = name, help, fn, tuple(labelnames), kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            result = self.fn()
+        except Exception:
+            return lines
+        items = result.items() if isinstance(result, dict) else [((), result)]
+        for values, v in sorted(items, key=lambda kv: kv[0]):
+            values = values if isinstance(values, tuple) else (values,)
+            lines.append(f"{self.name}{_fmt_labels(self.labelnames, values)} {_fmt_value(v)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._add(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge_fn(self, name, help, fn, labelnames=()):
+        return self._add(_CallbackMetric(name, help, fn, labelnames))
+
+    def counter_fn(self, name, help, fn, labelnames=()):
+        return self._add(_CallbackMetric(name, help, fn, labelnames, kind="counter"))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class TimedLock:
+    """
+    Wraps a Lock/RLock and records how long callers wait for it and how long
+    the outermost holder keeps it. Drop-in for `with LOCK:` use.
+    """
+
+    def __init__(self, lock, wait_hist, hold_hist):
+        self._lock = lock
+        self._wait = wait_hist
+        self._hold = hold_hist
+        self._local = threading.local()
+
+    def acquire(self, blocking=True, timeout=-1):
+        start = time.perf_counter()
+        ok = self._lock.acquire(blocking, timeout)
+        if ok:
+            depth = getattr(self._local, "depth", 0)
+            if depth == 0:
+                now = time.perf_counter()
+                self._wait.observe(now - start)
+                self._local.held_since = now
+            self._local.depth = depth + 1
+        return ok
+
+    def release(self):
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            self._hold.observe(time.perf_counter() - self._local.held_since)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def instrument_flask(app, registry):
+    """
+    Counts requests, latency and bytes per Flask endpoint and serves the
+    registry on GET /metrics. Latency covers the handler; a streamed body is
+    still being sent when it is recorded.
+    """
+    from flask import Response, g, request
+
+    requests_total = registry.counter("http_requests_total", "HTTP requests handled.",
+                                      ["endpoint", "method", "status"])
+    latency = registry.histogram("http_request_duration_seconds", "Time spent in the request handler.",
+                                 ["endpoint"])
+    bytes_in = registry.counter("http_request_bytes_total", "Request body bytes received.", ["endpoint"])
+    bytes_out = registry.counter("http_response_bytes_total", "Response body bytes sent (when known).",
+                                 ["endpoint"])
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        latency.labels(endpoint).observe(time.perf_counter() - start)
+        requests_total.labels(endpoint, request.method, response.status_code).inc()
+        if request.content_length:
+            bytes_in.labels(endpoint).inc(request.content_length)
+        if response.content_length:
+            bytes_out.labels(endpoint).inc(response.content_length)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -6,13 +6,27 @@ import requests
 import os
 import base64
 import hashlib
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from pathlib import Path
+import shutil
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import metrics
+from chunkstore import open_store, ChecksumMismatch, SubBlockMismatch
 
 # ----------------------------
 # Flask app
 # ----------------------------
 app = Flask(__name__)
+METRICS = metrics.Registry()
+metrics.instrument_flask(app, METRICS)
+SCAN_BYTES = METRICS.counter("hdfs_datanode_scan_bytes_total", "Bytes read by the block scanner.")
+SCAN_CHUNKS = METRICS.counter("hdfs_datanode_scan_chunks_total", "Chunks checked by the block scanner.", ["status"])
+BLOCK_REPORT_ENTRIES = METRICS.counter("hdfs_datanode_block_report_entries_total",
+                                       "Chunk adds/deletes sent in incremental block reports.")
+BLOCK_REPORT_SECONDS = METRICS.histogram("hdfs_datanode_block_report_seconds", "Incremental block report round trip.")
+HEARTBEAT_SECONDS = METRICS.histogram("hdfs_datanode_heartbeat_seconds", "Heartbeat round trip to the NameNode.")
+COMPACTED_BYTES = METRICS.counter("hdfs_datanode_compacted_bytes_total", "Bytes reclaimed by chunk store compaction.")
 
 # ----------------------------
 # Arguments
@@ -22,6 +36,16 @@ parser.add_argument("--id", required=True, help="Datanode ID, e.g. dn1")
 parser.add_argument("--port", type=int, required=True)
 parser.add_argument("--namenode", default="http://10.144.198.253:5000")
 parser.add_argument("--data_dir", default=None)
+parser.add_argument("--verify_max_age", type=float, default=300.0,
+                    help="seconds a verified chunk is served without rehashing (0 = always rehash)")
+parser.add_argument("--scan_rate_mb", type=float, default=4.0,
+                    help="block scanner read budget in MB/s")
+parser.add_argument("--scan_period", type=float, default=600.0,
+                    help="seconds between the start of block scanner passes")
+parser.add_argument("--storage", choices=["files", "segments"], default="files",
+                    help="chunk layout: a file per chunk, or packed into large segment files")
+parser.add_argument("--compact_interval", type=float, default=60.0,
+                    help="seconds between segment compaction / index checkpoint runs")
 args = parser.parse_args()
 
 DN_ID = args.id
@@ -29,10 +53,33 @@ PORT = args.port
 NAMENODE = args.namenode.rstrip("/")
 DATA_DIR = args.data_dir or f"./data_{DN_ID}"
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+STORE = open_store(args.storage, DATA_DIR)
 
 HEARTBEAT_INTERVAL = 10
 RECOVERY_INTERVAL = 30
 HEARTBEAT_RETRIES = 3
+STREAM_BUFFER = 64 * 1024
+VERIFY_MAX_AGE = args.verify_max_age
+SCAN_RATE = args.scan_rate_mb * 1024 * 1024
+SCAN_PERIOD = args.scan_period
+SCAN_REPORT_BATCH = 100
+BLOCK_REPORT_INTERVAL = 0.3
+BLOCK_REPORT_BATCH = 256
+COMPACT_INTERVAL = args.compact_interval
+
+# chunk_id -> {"version", "sha256", "verified_at"}, last time the stored
+# bytes were seen to match their recorded checksum
+VERIFIED = {}
+VERIFIED_LOCK = threading.Lock()
+
+# chunk adds/deletes waiting for the next incremental block report
+PENDING_REPORTS = []
+REPORTS_COND = threading.Condition()
+
+# in-progress chunk transfers, reported with heartbeats
+TRANSFER_ENDPOINTS = {"store_chunk", "store_chunk_raw", "get_chunk", "get_chunk_raw", "replicate_chunk"}
+ACTIVE_TRANSFERS = 0
+TRANSFERS_LOCK = threading.Lock()
 
 # ----------------------------
 # Utility Functions
@@ -40,13 +87,6 @@ HEARTBEAT_RETRIES = 3
 def get_local_ip():
     return "10.144.232.80"  # replace with proper detection if needed
 
-def compute_sha256(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
-
-def write_sha_file(path, sha):
-    with open(path + ".sha256", "w") as f:
-        f.write(sha)
-
 def print_sha(message, sha):
     sha_short = sha[:12]  # first 12 characters for logging
     print(f"[{DN_ID}] {message} with checksum: {sha_short}…")
@@ -54,6 +94,122 @@ def print_sha(message, sha):
 def demo_log(message):
     print(f"[{DN_ID}] DEMO: {message}")
 
+def chunk_sha256(chunk_id, throttle=None):
+    sha = hashlib.sha256()
+    for buf in STORE.stream(chunk_id, STREAM_BUFFER):
+        sha.update(buf)
+        if throttle:
+            throttle(len(buf))
+    return sha.hexdigest()
+
+# ----------------------------
+# VERIFICATION CACHE
+# ----------------------------
+def remember_verified(chunk_id, sha):
+    with VERIFIED_LOCK:
+        VERIFIED[chunk_id] = {"version": STORE.version(chunk_id), "sha256": sha, "verified_at": time.time()}
+
+def forget_verified(chunk_id):
+    with VERIFIED_LOCK:
+        VERIFIED.pop(chunk_id, None)
+
+def verify_now(chunk_id, throttle=None):
+    """Rehash the chunk and compare with its stored checksum -> (sha, stored_sha)."""
+    actual_sha = chunk_sha256(chunk_id, throttle)
+    stored_sha = STORE.stored_sha(chunk_id) or ""
+    if stored_sha == actual_sha:
+        remember_verified(chunk_id, actual_sha)
+    else:
+        forget_verified(chunk_id)
+    return actual_sha, stored_sha
+
+def verified_sha(chunk_id):
+    """Same as verify_now, but trusts a recent verification of an unchanged chunk."""
+    version = STORE.version(chunk_id)
+    with VERIFIED_LOCK:
+        entry = VERIFIED.get(chunk_id)
+    if (entry and entry["version"] == version
+            and time.time() - entry["verified_at"] < VERIFY_MAX_AGE):
+        return entry["sha256"], entry["sha256"]
+    return verify_now(chunk_id)
+
+def requested_range(size):
+    """(start, stop) from ?offset=&length= or a Range header, None for the whole chunk; ValueError if it doesn't fit."""
+    if "offset" in request.args or "length" in request.args:
+        start = int(request.args.get("offset", 0))
+        length = request.args.get("length")
+        stop = size if length is None else min(size, start + int(length))
+        if start < 0 or start > size or stop < start:
+            raise ValueError(f"offset {start} length {length} outside {size} bytes")
+        return start, stop
+    if request.range is None:
+        return None
+    span = request.range.range_for_length(size)
+    if span is None:
+        raise ValueError(f"unsatisfiable {request.headers.get('Range')} for {size} bytes")
+    return span
+
+def sub_block_failed(chunk_id, err):
+    # a bad sub-block CRC: rehash the whole chunk in the background and report it if it really is corrupt
+    print(f"[{DN_ID}] {err}")
+
+    def confirm():
+        try:
+            actual_sha, stored_sha = verify_now(chunk_id)
+        except OSError:
+            return
+        if stored_sha and stored_sha != actual_sha:
+            report_scan([{"chunk_id": chunk_id, "status": "corrupted", "scanned_at": time.time()}])
+
+    threading.Thread(target=confirm, daemon=True).start()
+
+def verified_range(chunk_id, start, stop, crcs):
+    """
+    Bytes start..stop, checking only the sub-blocks they fall in against their CRC32s.
+    The first sub-block is read up front (SubBlockMismatch before any headers go out);
+    a later bad one cuts the stream short.
+    """
+    pieces = STORE.stream_verified(chunk_id, start, stop - start, crcs)
+    try:
+        first = next(pieces, b"")
+    except SubBlockMismatch as e:
+        sub_block_failed(chunk_id, e)
+        raise
+
+    def rest():
+        yield first
+        try:
+            yield from pieces
+        except SubBlockMismatch as e:
+            sub_block_failed(chunk_id, e)
+            raise
+
+    return rest()
+
+def forward_to_pipeline(chunk_id, filename, sha, pipeline):
+    # stream our stored copy to the next DataNode; returns the hosts that acked downstream
+    target, rest = pipeline[0], pipeline[1:]
+    try:
+        with STORE.open(chunk_id) as f:
+            r = requests.post(target.rstrip("/") + "/store_chunk_raw", data=f, timeout=15,
+                              headers={"Content-Type": "application/octet-stream",
+                                       "X-Chunk-Id": chunk_id, "X-Filename": filename,
+                                       "X-Checksum-Sha256": sha, "X-Pipeline": ",".join(rest)})
+        if r.status_code == 200:
+            return r.json().get("acks", [target])
+        print(f"[{DN_ID}] Pipeline forward of {chunk_id} to {target} failed: {r.status_code}")
+    except Exception as e:
+        print(f"[{DN_ID}] Pipeline forward of {chunk_id} to {target} failed: {e}")
+    return []
+
+def report_chunk(op, chunk_id, filename=None):
+    # op is "added" or "deleted"; block_report_thread sends it with the next batch
+    with REPORTS_COND:
+        PENDING_REPORTS.append({"op": op, "chunk_id": chunk_id,
+                                "filename": filename or chunk_id.rsplit(".chunk.", 1)[0]})
+        if len(PENDING_REPORTS) in (1, BLOCK_REPORT_BATCH):  # wake the idle reporter / flush a full batch
+            REPORTS_COND.notify()
+
 # ----------------------------
 # STORE CHUNK
 # ----------------------------
@@ -68,26 +224,50 @@ def store_chunk():
         return jsonify({"error": "bad_request"}), 400
 
     data = base64.b64decode(b64data)
-    path = os.path.join(DATA_DIR, chunk_id)
-
-    with open(path, "wb") as f:
-        f.write(data)
-
-    sha = compute_sha256(data)
-    write_sha_file(path, sha)
+    _, sha = STORE.put(chunk_id, data)
+    remember_verified(chunk_id, sha)
     print_sha(f"Stored chunk {chunk_id}", sha)
     demo_log(f"Chunk {chunk_id} stored successfully, ready for replication.")
 
     # Notify NameNode
-    try:
-        requests.post(f"{NAMENODE}/register_chunk",
-                      json={"chunk_id": chunk_id, "dn_id": DN_ID, "filename": filename},
-                      timeout=3)
-    except Exception as e:
-        print(f"[{DN_ID}] Failed to register chunk {chunk_id}: {e}")
+    report_chunk("added", chunk_id, filename)
 
     return jsonify({"status": "stored", "sha256": sha})
 
+# ----------------------------
+# STORE CHUNK (raw stream)
+# ----------------------------
+@app.route("/store_chunk_raw", methods=["POST"])
+def store_chunk_raw():
+    chunk_id = request.headers.get("X-Chunk-Id")
+    filename = request.headers.get("X-Filename", chunk_id)
+    expected = request.headers.get("X-Checksum-Sha256")
+    pipeline = [h for h in request.headers.get("X-Pipeline", "").split(",") if h]
+
+    if not chunk_id:
+        return jsonify({"error": "bad_request"}), 400
+
+    try:
+        size, sha = STORE.put_stream(chunk_id, request.stream, request.content_length, expected)
+    except ChecksumMismatch as e:
+        print_sha(f"Rejected chunk {chunk_id}, sender said {expected[:12]}…", e.sha256)
+        return jsonify({"error": "checksum_mismatch"}), 400
+    remember_verified(chunk_id, sha)
+    print_sha(f"Stored chunk {chunk_id} ({size} bytes, streamed)", sha)
+    demo_log(f"Chunk {chunk_id} stored successfully, ready for replication.")
+
+    report_chunk("added", chunk_id, filename)
+
+    # write pipeline: pass the chunk on, acks come back up the chain
+    acks = [f"http://{get_local_ip()}:{PORT}"]
+    if pipeline:
+        acks += forward_to_pipeline(chunk_id, filename, sha, pipeline)
+        demo_log(f"Chunk {chunk_id} forwarded down the pipeline, acks: {acks}")
+
+    resp = jsonify({"status": "stored", "sha256": sha, "acks": acks})
+    resp.headers["X-Checksum-Sha256"] = sha
+    return resp
+
 # ----------------------------
 # REPLICATE CHUNK
 # ----------------------------
@@ -100,24 +280,22 @@ def replicate_chunk():
     if not chunk_id or not target_host:
         return jsonify({"error": "bad_request"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    sha_path = path + ".sha256"
-
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         return jsonify({"error": "missing_chunk"}), 404
 
-    with open(path, "rb") as f:
-        data = f.read()
-
-    b64data = base64.b64encode(data).decode()
-    filename = chunk_id
+    filename = chunk_id.rsplit(".chunk.", 1)[0]
 
     try:
-        url = target_host.rstrip("/") + "/store_chunk"
-        r = requests.post(url, json={"chunk_id": chunk_id, "data": b64data, "filename": filename}, timeout=10)
+        url = target_host.rstrip("/") + "/store_chunk_raw"
+        # sent along so the target rejects a bad copy before storing or reporting it
+        local_sha = STORE.stored_sha(chunk_id) or chunk_sha256(chunk_id)
+        with STORE.open(chunk_id) as f:
+            r = requests.post(url, data=f, timeout=10,
+                              headers={"Content-Type": "application/octet-stream",
+                                       "X-Chunk-Id": chunk_id, "X-Filename": filename,
+                                       "X-Checksum-Sha256": local_sha})
         if r.status_code == 200:
-            remote_sha = r.json().get("sha256")
-            local_sha = open(sha_path).read().strip() if os.path.exists(sha_path) else compute_sha256(data)
+            remote_sha = r.headers.get("X-Checksum-Sha256")
             if remote_sha == local_sha:
                 print_sha(f"Replicated {chunk_id} successfully to {target_host}", local_sha)
                 demo_log(f"Replication of {chunk_id} verified with checksum.")
@@ -144,24 +322,84 @@ def get_chunk():
     if not chunk_id:
         return jsonify({"error": "missing_chunk_id"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    sha_path = path + ".sha256"
-
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         return jsonify({"error": "not_found"}), 404
 
-    with open(path, "rb") as f:
-        data = f.read()
-
-    actual_sha = compute_sha256(data)
-    stored_sha = open(sha_path).read().strip() if os.path.exists(sha_path) else ""
+    try:
+        span = requested_range(STORE.size(chunk_id))
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 416
 
-    if stored_sha and stored_sha != actual_sha:
-        return jsonify({"error": "corrupted_chunk"}), 500
+    crcs = STORE.crcs(chunk_id) if span else None
+    if crcs is not None:
+        # ranged read: only the sub-blocks it touches are checked
+        try:
+            data = b"".join(verified_range(chunk_id, span[0], span[1], crcs))
+        except SubBlockMismatch:
+            return jsonify({"error": "corrupted_chunk"}), 500
+        actual_sha = STORE.stored_sha(chunk_id)
+    else:
+        actual_sha, stored_sha = verified_sha(chunk_id)
+        if stored_sha and stored_sha != actual_sha:
+            return jsonify({"error": "corrupted_chunk"}), 500
+        if span:
+            data = STORE.read(chunk_id, span[0], span[1] - span[0])
+        else:
+            data = STORE.read(chunk_id)
 
     print_sha(f"Retrieved chunk {chunk_id}", actual_sha)
     demo_log(f"Chunk {chunk_id} served to client successfully.")
-    return jsonify({"data": base64.b64encode(data).decode(), "sha256": actual_sha})
+    resp = {"data": base64.b64encode(data).decode(), "sha256": actual_sha}
+    if span:
+        resp["offset"] = span[0]
+    return jsonify(resp)
+
+# ----------------------------
+# GET CHUNK (raw stream)
+# ----------------------------
+@app.route("/get_chunk_raw", methods=["GET"])
+def get_chunk_raw():
+    chunk_id = request.args.get("chunk_id")
+    if not chunk_id:
+        return jsonify({"error": "missing_chunk_id"}), 400
+
+    if not STORE.exists(chunk_id):
+        return jsonify({"error": "not_found"}), 404
+
+    size = STORE.size(chunk_id)
+    try:
+        span = requested_range(size)
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 416, {"Content-Range": f"bytes */{size}"}
+
+    crcs = STORE.crcs(chunk_id) if span else None
+    if crcs is not None:
+        # ranged read: only the sub-blocks it touches are checked
+        try:
+            body = verified_range(chunk_id, span[0], span[1], crcs)
+        except SubBlockMismatch:
+            return jsonify({"error": "corrupted_chunk"}), 500
+        actual_sha = STORE.stored_sha(chunk_id)
+    else:
+        actual_sha, stored_sha = verified_sha(chunk_id)
+        if stored_sha and stored_sha != actual_sha:
+            return jsonify({"error": "corrupted_chunk"}), 500
+        offset, length = (span[0], span[1] - span[0]) if span else (0, None)
+        body = STORE.stream(chunk_id, STREAM_BUFFER, offset, length)
+
+    headers = {"X-Checksum-Sha256": actual_sha, "Accept-Ranges": "bytes"}
+    if span is None:
+        print_sha(f"Streaming chunk {chunk_id}", actual_sha)
+        headers["Content-Length"] = str(size)
+        return Response(body, mimetype="application/octet-stream", headers=headers)
+
+    # partial read: only these bytes come off disk; X-Checksum-Sha256 stays the whole chunk's
+    start, stop = span
+    print_sha(f"Streaming chunk {chunk_id} bytes {start}-{stop}", actual_sha)
+    headers["Content-Length"] = str(stop - start)
+    if stop > start:
+        headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    return Response(body, status=206, mimetype="application/octet-stream", headers=headers)
 
 # ----------------------------
 # DELETE CHUNK
@@ -173,11 +411,9 @@ def delete_chunk():
     if not chunk_id:
         return jsonify({"error": "missing_chunk_id"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    if os.path.exists(path):
-        os.remove(path)
-        if os.path.exists(path + ".sha256"):
-            os.remove(path + ".sha256")
+    if STORE.delete(chunk_id):
+        forget_verified(chunk_id)
+        report_chunk("deleted", chunk_id)
         print(f"[{DN_ID}] Deleted chunk {chunk_id} with checksum removed")
         demo_log(f"Chunk {chunk_id} deleted successfully.")
         return jsonify({"status": "deleted"})
@@ -192,22 +428,53 @@ def verify_chunk():
     if not chunk_id:
         return jsonify({"error": "missing_chunk_id"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         return jsonify({"status": "missing"}), 404
 
-    with open(path, "rb") as f:
-        data = f.read()
-
-    actual_sha = compute_sha256(data)
-    stored_sha_path = path + ".sha256"
-    stored_sha = open(stored_sha_path).read().strip() if os.path.exists(stored_sha_path) else ""
+    # explicit check: always rehash
+    actual_sha, stored_sha = verify_now(chunk_id)
 
     status = "valid" if stored_sha == actual_sha else "corrupted"
     print_sha(f"Verification of chunk {chunk_id}: {status}", actual_sha)
     demo_log(f"Checksum verification for {chunk_id} complete.")
     return jsonify({"status": status})
 
+# ----------------------------
+# TRANSFER ACCOUNTING
+# ----------------------------
+def end_transfer():
+    global ACTIVE_TRANSFERS
+    with TRANSFERS_LOCK:
+        ACTIVE_TRANSFERS -= 1
+
+@app.before_request
+def begin_transfer():
+    global ACTIVE_TRANSFERS
+    if request.endpoint in TRANSFER_ENDPOINTS:
+        with TRANSFERS_LOCK:
+            ACTIVE_TRANSFERS += 1
+        g.transfer_open = True
+
+@app.after_request
+def hand_off_transfer(response):
+    # a streamed chunk is still being sent at this point, so finish on close
+    if g.pop("transfer_open", False):
+        response.call_on_close(end_transfer)
+    return response
+
+@app.teardown_request
+def abort_transfer(exc):
+    if g.pop("transfer_open", False):
+        end_transfer()
+
+def node_stats():
+    disk = shutil.disk_usage(DATA_DIR)
+    used, chunks = STORE.stats()
+    with TRANSFERS_LOCK:
+        active = ACTIVE_TRANSFERS
+    return {"capacity": disk.total, "free": disk.free, "used": used,
+            "chunks": chunks, "active_transfers": active}
+
 # ----------------------------
 # HEARTBEAT THREAD
 # ----------------------------
@@ -217,13 +484,57 @@ def send_heartbeat():
         for attempt in range(1, HEARTBEAT_RETRIES + 1):
             try:
                 print(f"[{DN_ID}] DEMO: Sending heartbeat to {NAMENODE}/heartbeat)")
-                requests.post(f"{NAMENODE}/heartbeat", json={"dn_id": DN_ID, "host": host}, timeout=2)
+                with HEARTBEAT_SECONDS.time():
+                    requests.post(f"{NAMENODE}/heartbeat", json={"dn_id": DN_ID, "host": host, **node_stats()},
+                                  timeout=2)
                 break
             except Exception as e:
                 print(f"[{DN_ID}] DEMO: Heartbeat attempt failed: {e}")
                 time.sleep(1)
         time.sleep(HEARTBEAT_INTERVAL)
 
+# ----------------------------
+# BLOCK REPORT THREAD
+# ----------------------------
+def full_block_report():
+    chunks = [{"chunk_id": name, "filename": name.rsplit(".chunk.", 1)[0]} for name in STORE.chunk_ids()]
+    while True:
+        try:
+            r = requests.post(f"{NAMENODE}/block_report",
+                              json={"dn_id": DN_ID, "full": True, "chunks": chunks}, timeout=10)
+            r.raise_for_status()
+            result = r.json()
+            demo_log(f"Full block report: {len(chunks)} chunks, {len(result.get('missing', []))} missing, "
+                     f"{len(result.get('unknown', []))} unknown to NameNode")
+            return
+        except Exception as e:
+            print(f"[{DN_ID}] DEMO: Full block report failed, retrying: {e}")
+            time.sleep(HEARTBEAT_INTERVAL)
+
+def block_report_thread():
+    # full report once at startup, then incremental batches every
+    # BLOCK_REPORT_INTERVAL seconds (sooner once BLOCK_REPORT_BATCH are queued)
+    full_block_report()
+    while True:
+        with REPORTS_COND:
+            while not PENDING_REPORTS:
+                REPORTS_COND.wait()
+            if len(PENDING_REPORTS) < BLOCK_REPORT_BATCH:
+                REPORTS_COND.wait(BLOCK_REPORT_INTERVAL)
+            batch = PENDING_REPORTS[:]
+            del PENDING_REPORTS[:]
+        try:
+            with BLOCK_REPORT_SECONDS.time():
+                r = requests.post(f"{NAMENODE}/block_report", json={"dn_id": DN_ID, "reports": batch}, timeout=5)
+            r.raise_for_status()
+            BLOCK_REPORT_ENTRIES.inc(len(batch))
+            demo_log(f"Reported {len(batch)} block changes to NameNode")
+        except Exception as e:
+            print(f"[{DN_ID}] DEMO: Block report failed, will retry: {e}")
+            with REPORTS_COND:
+                PENDING_REPORTS[:0] = batch
+            time.sleep(1)
+
 # ----------------------------
 # RECOVERY THREAD
 # ----------------------------
@@ -235,17 +546,20 @@ def recovery_thread():
                 for chunk_info in r.json().get("chunks", []):
                     chunk_id = chunk_info.get("chunk_id") if isinstance(chunk_info, dict) else chunk_info
                     source_dn = chunk_info.get("source_dn") if isinstance(chunk_info, dict) else None
-                    path = os.path.join(DATA_DIR, chunk_id)
-                    if not os.path.exists(path) and source_dn:
+                    if not STORE.exists(chunk_id) and source_dn:
                         try:
                             print(f"[{DN_ID}] DEMO: Missing chunk {chunk_id}, fetching from {source_dn}")
-                            r2 = requests.get(f"{source_dn.rstrip('/')}/get_chunk", params={"chunk_id": chunk_id}, timeout=5)
+                            r2 = requests.get(f"{source_dn.rstrip('/')}/get_chunk_raw", params={"chunk_id": chunk_id},
+                                              timeout=5, stream=True)
                             if r2.status_code == 200:
-                                data = base64.b64decode(r2.json()["data"])
-                                with open(path, "wb") as f:
-                                    f.write(data)
-                                sha = compute_sha256(data)
-                                write_sha_file(path, sha)
+                                length = r2.headers.get("Content-Length")
+                                try:
+                                    _, sha = STORE.put_stream(chunk_id, r2.raw, int(length) if length else None,
+                                                              r2.headers.get("X-Checksum-Sha256"))
+                                except ChecksumMismatch as e:
+                                    print_sha(f"Recovered chunk {chunk_id} failed checksum, discarded", e.sha256)
+                                    continue
+                                remember_verified(chunk_id, sha)
                                 print_sha(f"Recovered chunk {chunk_id} from {source_dn}", sha)
                                 demo_log(f"Recovery of {chunk_id} complete.")
                         except Exception as e:
@@ -254,12 +568,100 @@ def recovery_thread():
             print(f"[{DN_ID}] DEMO: Recovery check failed: {e}")
         time.sleep(RECOVERY_INTERVAL)
 
+# ----------------------------
+# BLOCK SCANNER THREAD
+# ----------------------------
+class RateLimiter:
+    # sleeps in consume() to keep the bytes read under `rate` per second
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, nbytes):
+        self.consumed += nbytes
+        SCAN_BYTES.inc(nbytes)
+        ahead = self.consumed / self.rate - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def report_scan(results):
+    if not results:
+        return
+    try:
+        requests.post(f"{NAMENODE}/report_scan", json={"dn_id": DN_ID, "results": results}, timeout=5)
+    except Exception as e:
+        print(f"[{DN_ID}] DEMO: Could not report scan results: {e}")
+
+def block_scanner_thread():
+    # verify every stored chunk at SCAN_RATE bytes/s, once per SCAN_PERIOD;
+    # corrupt chunks are reported straight away so the NameNode can re-replicate them
+    while True:
+        started = time.time()
+        limiter = RateLimiter(SCAN_RATE)
+        scanned, corrupt, batch = 0, 0, []
+        for chunk_id in STORE.chunk_ids():
+            try:
+                if STORE.stored_sha(chunk_id) is None:
+                    continue
+                actual_sha, stored_sha = verify_now(chunk_id, limiter.consume)
+            except OSError:
+                forget_verified(chunk_id)  # deleted mid-scan
+                continue
+            status = "ok" if actual_sha == stored_sha else "corrupted"
+            result = {"chunk_id": chunk_id, "status": status, "scanned_at": time.time()}
+            scanned += 1
+            SCAN_CHUNKS.labels(status).inc()
+            if status == "corrupted":
+                corrupt += 1
+                print_sha(f"Block scanner found corrupted chunk {chunk_id}", actual_sha)
+                report_scan([result])
+            else:
+                batch.append(result)
+                if len(batch) >= SCAN_REPORT_BATCH:
+                    report_scan(batch)
+                    batch = []
+        report_scan(batch)
+        demo_log(f"Block scan done: {scanned} chunks, {corrupt} corrupt, {time.time() - started:.1f}s")
+        time.sleep(max(0, SCAN_PERIOD - (time.time() - started)))
+
+# ----------------------------
+# COMPACTION THREAD
+# ----------------------------
+def compaction_thread():
+    # reclaim space from deleted chunks and save the store's index
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            freed = STORE.compact()
+            STORE.checkpoint()
+            COMPACTED_BYTES.inc(freed)
+            if freed:
+                demo_log(f"Compaction freed {freed} bytes")
+        except Exception as e:
+            print(f"[{DN_ID}] DEMO: Compaction failed: {e}")
+
+# ----------------------------
+# METRICS (computed on scrape)
+# ----------------------------
+METRICS.gauge_fn("hdfs_datanode_active_transfers", "Chunk transfers in progress.", lambda: ACTIVE_TRANSFERS)
+METRICS.gauge_fn("hdfs_datanode_verified_chunks", "Chunks with a cached verification result.", lambda: len(VERIFIED))
+METRICS.gauge_fn("hdfs_datanode_pending_block_reports", "Chunk adds/deletes not yet reported.",
+                 lambda: len(PENDING_REPORTS))
+METRICS.gauge_fn("hdfs_datanode_disk_free_bytes", "Free bytes on the data dir's filesystem.",
+                 lambda: shutil.disk_usage(DATA_DIR).free)
+METRICS.gauge_fn("hdfs_datanode_stored_bytes", "Bytes the chunk store occupies on disk.", lambda: STORE.stats()[0])
+
 # ----------------------------
 # MAIN
 # ----------------------------
 if __name__ == "__main__":
     threading.Thread(target=send_heartbeat, daemon=True).start()
     threading.Thread(target=recovery_thread, daemon=True).start()
-    print(f"[DataNode {DN_ID}] Running on port {PORT} with data dir {DATA_DIR}")
-    app.run(host="0.0.0.0", port=PORT, threaded=True, debug=True)
+    threading.Thread(target=block_scanner_thread, daemon=True).start()
+    threading.Thread(target=block_report_thread, daemon=True).start()
+    threading.Thread(target=compaction_thread, daemon=True).start()
+    print(f"[DataNode {DN_ID}] Running on port {PORT} with data dir {DATA_DIR} ({STORE.name} store)")
+    # no reloader: a second process would open the same chunk store
+    app.run(host="0.0.0.0", port=PORT, threaded=True, debug=True, use_reloader=False)
 
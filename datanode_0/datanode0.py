@@ -1,16 +1,40 @@
 import argparse, threading, time, requests, os, base64, json
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from pathlib import Path
 import socket
 import hashlib
 import traceback
+import shutil
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import metrics
+from chunkstore import open_store, ChecksumMismatch, SubBlockMismatch
 
 app = Flask(__name__)
+METRICS = metrics.Registry()
+metrics.instrument_flask(app, METRICS)
+SCAN_BYTES = METRICS.counter("hdfs_datanode_scan_bytes_total", "Bytes read by the block scanner.")
+SCAN_CHUNKS = METRICS.counter("hdfs_datanode_scan_chunks_total", "Chunks checked by the block scanner.", ["status"])
+BLOCK_REPORT_ENTRIES = METRICS.counter("hdfs_datanode_block_report_entries_total",
+                                       "Chunk adds/deletes sent in incremental block reports.")
+BLOCK_REPORT_SECONDS = METRICS.histogram("hdfs_datanode_block_report_seconds", "Incremental block report round trip.")
+HEARTBEAT_SECONDS = METRICS.histogram("hdfs_datanode_heartbeat_seconds", "Heartbeat round trip to the NameNode.")
+COMPACTED_BYTES = METRICS.counter("hdfs_datanode_compacted_bytes_total", "Bytes reclaimed by chunk store compaction.")
 parser = argparse.ArgumentParser()
 parser.add_argument("--id", required=True, help="datanode id, e.g. dn0")
 parser.add_argument("--port", type=int, required=True)
 parser.add_argument("--namenode", default="http://10.144.198.253:5000")
 parser.add_argument("--data_dir", default=None)
+parser.add_argument("--verify_max_age", type=float, default=300.0,
+                    help="seconds a verified chunk is served without rehashing (0 = always rehash)")
+parser.add_argument("--scan_rate_mb", type=float, default=4.0,
+                    help="block scanner read budget in MB/s")
+parser.add_argument("--scan_period", type=float, default=600.0,
+                    help="seconds between the start of block scanner passes")
+parser.add_argument("--storage", choices=["files", "segments"], default="files",
+                    help="chunk layout: a file per chunk, or packed into large segment files")
+parser.add_argument("--compact_interval", type=float, default=60.0,
+                    help="seconds between segment compaction / index checkpoint runs")
 args = parser.parse_args()
 
 DN_ID = args.id
@@ -18,7 +42,30 @@ PORT = args.port
 NAMENODE = args.namenode.rstrip("/")
 DATA_DIR = args.data_dir or f"./data_{DN_ID}"
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+STORE = open_store(args.storage, DATA_DIR)
+COMPACT_INTERVAL = args.compact_interval
 HEARTBEAT_INTERVAL = 10.0
+STREAM_BUFFER = 64 * 1024
+VERIFY_MAX_AGE = args.verify_max_age
+SCAN_RATE = args.scan_rate_mb * 1024 * 1024
+SCAN_PERIOD = args.scan_period
+SCAN_REPORT_BATCH = 100
+BLOCK_REPORT_INTERVAL = 0.3  # seconds a stored/deleted chunk may wait before being reported
+BLOCK_REPORT_BATCH = 256     # ...or fewer, once this many changes are queued
+
+# chunk_id -> {"version", "sha256", "verified_at"} for chunks whose stored
+# bytes were last seen matching their recorded checksum
+VERIFIED = {}
+VERIFIED_LOCK = threading.Lock()
+
+# incremental block report queue: {"op": "added"|"deleted", "chunk_id", "filename"}
+PENDING_REPORTS = []
+REPORTS_COND = threading.Condition()
+
+# chunk transfers (stores, reads, replications) currently in progress, for heartbeats
+TRANSFER_ENDPOINTS = {"store_chunk", "store_chunk_raw", "get_chunk", "get_chunk_raw", "replicate_chunk"}
+ACTIVE_TRANSFERS = 0
+TRANSFERS_LOCK = threading.Lock()
 
 
 def log(msg, level="INFO"):
@@ -30,6 +77,263 @@ def get_local_ip():
     return "10.144.157.51"
 
 
+def chunk_sha256(chunk_id, throttle=None):
+    sha = hashlib.sha256()
+    for buf in STORE.stream(chunk_id, STREAM_BUFFER):
+        sha.update(buf)
+        if throttle:
+            throttle(len(buf))
+    return sha.hexdigest()
+
+
+def remember_verified(chunk_id, sha):
+    with VERIFIED_LOCK:
+        VERIFIED[chunk_id] = {"version": STORE.version(chunk_id), "sha256": sha, "verified_at": time.time()}
+
+
+def forget_verified(chunk_id):
+    with VERIFIED_LOCK:
+        VERIFIED.pop(chunk_id, None)
+
+
+def verify_now(chunk_id, throttle=None):
+    """
+    Full integrity check: rehash the chunk and compare with its stored checksum.
+    Returns (sha256, status) with status "ok", "corrupted" or "unknown" (no checksum).
+    """
+    current_hash = chunk_sha256(chunk_id, throttle)
+    stored_hash = STORE.stored_sha(chunk_id)
+    if stored_hash is None:
+        forget_verified(chunk_id)
+        return current_hash, "unknown"
+    if stored_hash != current_hash:
+        forget_verified(chunk_id)
+        log(f"Checksum mismatch for {chunk_id}! Stored:{stored_hash[:12]} Curr:{current_hash[:12]}", "ERROR")
+        return current_hash, "corrupted"
+    remember_verified(chunk_id, current_hash)
+    return current_hash, "ok"
+
+
+def verified_sha(chunk_id):
+    """
+    Like verify_now, but skips the rehash while the stored chunk is unchanged
+    (same STORE.version) since it was last verified and that was under
+    VERIFY_MAX_AGE ago.
+    """
+    version = STORE.version(chunk_id)
+    with VERIFIED_LOCK:
+        entry = VERIFIED.get(chunk_id)
+    if (entry and entry["version"] == version
+            and time.time() - entry["verified_at"] < VERIFY_MAX_AGE):
+        return entry["sha256"], "ok"
+    return verify_now(chunk_id)
+
+
+def requested_range(size):
+    """
+    (start, stop) of the bytes a read asked for, from ?offset=&length= or an
+    HTTP Range header (one range only); None when it wants the whole chunk.
+    Raises ValueError for a range that does not fit a chunk of this size.
+    """
+    if "offset" in request.args or "length" in request.args:
+        start = int(request.args.get("offset", 0))
+        length = request.args.get("length")
+        stop = size if length is None else min(size, start + int(length))
+        if start < 0 or start > size or stop < start:
+            raise ValueError(f"offset {start} length {length} outside {size} bytes")
+        return start, stop
+    if request.range is None:
+        return None
+    span = request.range.range_for_length(size)
+    if span is None:
+        raise ValueError(f"unsatisfiable {request.headers.get('Range')} for {size} bytes")
+    return span
+
+
+def sub_block_failed(chunk_id, err):
+    """A read hit a bad sub-block CRC: rehash the whole chunk and report it if it really is corrupt."""
+    log(f"{err}", "ERROR")
+
+    def confirm():
+        try:
+            _, status = verify_now(chunk_id)
+        except OSError:
+            return  # deleted or replaced meanwhile
+        if status == "corrupted":
+            report_scan([{"chunk_id": chunk_id, "status": status, "scanned_at": time.time()}])
+
+    threading.Thread(target=confirm, daemon=True).start()
+
+
+def verified_range(chunk_id, start, stop, crcs):
+    """
+    Bytes start..stop of a chunk, checking only the sub-blocks they fall in
+    against their CRC32s instead of rehashing the whole chunk. The first
+    sub-block is read before this returns, so a bad small read raises
+    SubBlockMismatch up front; a later bad sub-block cuts the stream short.
+    """
+    pieces = STORE.stream_verified(chunk_id, start, stop - start, crcs)
+    try:
+        first = next(pieces, b"")
+    except SubBlockMismatch as e:
+        sub_block_failed(chunk_id, e)
+        raise
+
+    def rest():
+        yield first
+        try:
+            yield from pieces
+        except SubBlockMismatch as e:
+            sub_block_failed(chunk_id, e)
+            raise
+
+    return rest()
+
+
+class RateLimiter:
+    """Sleeps in consume() so that bytes consumed stay under `rate` per second."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.start = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, nbytes):
+        self.consumed += nbytes
+        SCAN_BYTES.inc(nbytes)
+        ahead = self.consumed / self.rate - (time.monotonic() - self.start)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def report_scan(results):
+    """Sends block scanner verdicts to the NameNode; corrupt replicas get re-replicated."""
+    if not results:
+        return
+    try:
+        requests.post(f"{NAMENODE}/report_scan", json={"dn_id": DN_ID, "results": results}, timeout=5)
+    except Exception as e:
+        log(f"Could not report scan results to NameNode: {e}", "WARN")
+
+
+def block_scanner():
+    """
+    Walks the store, verifying every chunk against its checksum at no more than
+    SCAN_RATE bytes/s, then waits out the rest of SCAN_PERIOD. Corrupt chunks are
+    reported as soon as they are found, healthy ones in batches.
+    """
+    while True:
+        started = time.time()
+        limiter = RateLimiter(SCAN_RATE)
+        scanned, corrupt, batch = 0, 0, []
+        for chunk_id in STORE.chunk_ids():
+            try:
+                if STORE.stored_sha(chunk_id) is None:
+                    continue
+                _, status = verify_now(chunk_id, limiter.consume)
+            except OSError:
+                forget_verified(chunk_id)  # deleted while we were scanning
+                continue
+            result = {"chunk_id": chunk_id, "status": status, "scanned_at": time.time()}
+            scanned += 1
+            SCAN_CHUNKS.labels(status).inc()
+            if status == "corrupted":
+                corrupt += 1
+                report_scan([result])
+            else:
+                batch.append(result)
+                if len(batch) >= SCAN_REPORT_BATCH:
+                    report_scan(batch)
+                    batch = []
+        report_scan(batch)
+        log(f"Block scan done: {scanned} chunks verified, {corrupt} corrupt, {time.time() - started:.1f}s")
+        time.sleep(max(0.0, SCAN_PERIOD - (time.time() - started)))
+
+
+def forward_to_pipeline(chunk_id, filename, sha, pipeline):
+    """
+    Streams a stored chunk to the next DataNode in the write pipeline, passing
+    on the rest of the list. Returns the hosts downstream that acknowledged.
+    """
+    target, rest = pipeline[0], pipeline[1:]
+    try:
+        with STORE.open(chunk_id) as f:
+            r = requests.post(
+                f"{target.rstrip('/')}/store_chunk_raw",
+                data=f,
+                headers={"Content-Type": "application/octet-stream",
+                         "X-Chunk-Id": chunk_id,
+                         "X-Filename": filename,
+                         "X-Checksum-Sha256": sha,
+                         "X-Pipeline": ",".join(rest)},
+                timeout=15
+            )
+        if r.status_code == 200:
+            return r.json().get("acks", [target])
+        log(f"Pipeline forward of {chunk_id} to {target} failed: {r.status_code} {r.text}", "ERROR")
+    except Exception as e:
+        log(f"Pipeline forward of {chunk_id} to {target} failed: {e}", "ERROR")
+    return []
+
+
+def chunk_filename(chunk_id):
+    return chunk_id.rsplit(".chunk.", 1)[0]
+
+
+def queue_block_report(op, chunk_id, filename=None):
+    """Queues a stored ("added") or removed ("deleted") chunk for the next incremental report."""
+    with REPORTS_COND:
+        PENDING_REPORTS.append({"op": op, "chunk_id": chunk_id, "filename": filename or chunk_filename(chunk_id)})
+        if len(PENDING_REPORTS) in (1, BLOCK_REPORT_BATCH):  # wake the idle reporter / flush a full batch
+            REPORTS_COND.notify()
+
+
+def send_full_block_report():
+    """Tells the NameNode every chunk this DataNode holds."""
+    chunks = [{"chunk_id": name, "filename": chunk_filename(name)} for name in STORE.chunk_ids()]
+    while True:
+        try:
+            r = requests.post(f"{NAMENODE}/block_report",
+                              json={"dn_id": DN_ID, "full": True, "chunks": chunks}, timeout=10)
+            r.raise_for_status()
+            result = r.json()
+            log(f"Full block report sent: {len(chunks)} chunks, "
+                f"{len(result.get('missing', []))} missing, {len(result.get('unknown', []))} unknown to NameNode")
+            return
+        except Exception as e:
+            log(f"Full block report failed, retrying: {e}", "WARN")
+            time.sleep(HEARTBEAT_INTERVAL)
+
+
+def block_reporter():
+    """
+    Sends a full block report once, then batches chunk adds/deletes into
+    incremental reports, flushed every BLOCK_REPORT_INTERVAL seconds or as soon
+    as BLOCK_REPORT_BATCH changes are queued.
+    """
+    send_full_block_report()
+    while True:
+        with REPORTS_COND:
+            while not PENDING_REPORTS:
+                REPORTS_COND.wait()
+            if len(PENDING_REPORTS) < BLOCK_REPORT_BATCH:
+                REPORTS_COND.wait(BLOCK_REPORT_INTERVAL)
+            batch = PENDING_REPORTS[:]
+            del PENDING_REPORTS[:]
+        try:
+            with BLOCK_REPORT_SECONDS.time():
+                r = requests.post(f"{NAMENODE}/block_report",
+                                  json={"dn_id": DN_ID, "reports": batch}, timeout=5)
+            r.raise_for_status()
+            BLOCK_REPORT_ENTRIES.inc(len(batch))
+            log(f"Reported {len(batch)} block changes to NameNode")
+        except Exception as e:
+            log(f"Block report of {len(batch)} changes failed, will retry: {e}", "ERROR")
+            with REPORTS_COND:
+                PENDING_REPORTS[:0] = batch
+            time.sleep(1)
+
+
 @app.route("/store_chunk", methods=["POST"])
 def store_chunk():
     """
@@ -47,29 +351,15 @@ def store_chunk():
 
     try:
         data = base64.b64decode(b64)
-        path = os.path.join(DATA_DIR, chunk_id)
-
-        # Write chunk
-        with open(path, "wb") as f:
-            f.write(data)
 
-        # Compute and save checksum
-        sha = hashlib.sha256(data).hexdigest()
-        with open(path + ".sha256", "w") as hf:
-            hf.write(sha)
+        # Write chunk; the store computes and keeps its checksum
+        _, sha = STORE.put(chunk_id, data)
+        remember_verified(chunk_id, sha)
 
         log(f"Stored chunk {chunk_id} ({len(data)} bytes) with checksum {sha[:12]}")
 
         # Notify NameNode
-        try:
-            requests.post(
-                f"{NAMENODE}/register_chunk",
-                json={"filename": filename, "chunk_id": chunk_id, "dn_id": DN_ID},
-                timeout=3
-            )
-            log(f"Registered chunk {chunk_id} for {filename} with NameNode")
-        except Exception as e:
-            log(f"Failed to register chunk {chunk_id} -> NameNode: {e}", "ERROR")
+        queue_block_report("added", chunk_id, filename)
 
         return jsonify({"status": "stored", "sha256": sha})
 
@@ -78,35 +368,150 @@ def store_chunk():
         return jsonify({"error": "store_failed", "detail": str(e)}), 500
 
 
+@app.route("/store_chunk_raw", methods=["POST"])
+def store_chunk_raw():
+    """
+    Body: raw chunk bytes (application/octet-stream), streamed to disk.
+    Headers: X-Chunk-Id, X-Filename, optional X-Checksum-Sha256 (verified after write),
+    optional X-Pipeline: comma-separated DataNode hosts to forward the chunk to, in order.
+    The reply's "acks" lists this node plus every downstream node that stored the chunk.
+    """
+    chunk_id = request.headers.get("X-Chunk-Id")
+    filename = request.headers.get("X-Filename", "unknown_file")
+    expected = request.headers.get("X-Checksum-Sha256")
+    pipeline = [h for h in request.headers.get("X-Pipeline", "").split(",") if h]
+
+    if not chunk_id:
+        log("Missing X-Chunk-Id in store_chunk_raw", "ERROR")
+        return jsonify({"error": "bad_request"}), 400
+
+    try:
+        try:
+            size, sha = STORE.put_stream(chunk_id, request.stream, request.content_length, expected)
+        except ChecksumMismatch as e:
+            log(f"Checksum mismatch receiving {chunk_id}! Sent:{expected[:12]} Got:{e.sha256[:12]}", "ERROR")
+            return jsonify({"error": "checksum_mismatch"}), 400
+        remember_verified(chunk_id, sha)
+
+        log(f"Stored chunk {chunk_id} ({size} bytes, streamed) with checksum {sha[:12]}")
+        queue_block_report("added", chunk_id, filename)
+
+        acks = [f"http://{get_local_ip()}:{PORT}"]
+        if pipeline:
+            acks += forward_to_pipeline(chunk_id, filename, sha, pipeline)
+
+        resp = jsonify({"status": "stored", "sha256": sha, "acks": acks})
+        resp.headers["X-Checksum-Sha256"] = sha
+        return resp
+
+    except Exception as e:
+        log(f"Error storing chunk {chunk_id}: {e}\n{traceback.format_exc()}", "ERROR")
+        return jsonify({"error": "store_failed", "detail": str(e)}), 500
+
+
 @app.route("/get_chunk", methods=["GET"])
 def get_chunk():
+    """
+    Query: chunk_id, optional offset/length (or a Range header) to return only part of it.
+    Ranged reads check just the sub-blocks they touch (chunks stored without sub-block
+    CRCs fall back to the whole chunk's checksum).
+    """
     chunk_id = request.args.get("chunk_id")
-    path = os.path.join(DATA_DIR, chunk_id)
 
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         log(f"Chunk {chunk_id} not found for GET", "WARN")
         return jsonify({"error": "not_found"}), 404
 
     try:
-        with open(path, "rb") as f:
-            data = f.read()
-
-        current_hash = hashlib.sha256(data).hexdigest()
-
-        # Data integrity check — compare with stored hash
-        stored_hash_file = path + ".sha256"
-        if os.path.exists(stored_hash_file):
-            with open(stored_hash_file, "r") as hf:
-                stored_hash = hf.read().strip()
-            if stored_hash != current_hash:
-                log(f"Checksum mismatch for {chunk_id}! Stored:{stored_hash[:12]} Curr:{current_hash[:12]}", "ERROR")
+        span = requested_range(STORE.size(chunk_id))
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 416
+
+    try:
+        crcs = STORE.crcs(chunk_id) if span else None
+        if crcs is not None:
+            # only the sub-blocks the range touches are checked
+            try:
+                data = b"".join(verified_range(chunk_id, span[0], span[1], crcs))
+            except SubBlockMismatch:
                 return jsonify({"error": "corrupted_chunk"}), 500
+            current_hash = STORE.stored_sha(chunk_id)
         else:
-            log(f"No checksum file for {chunk_id}, skipping verification", "WARN")
+            # Data integrity check — compare with stored hash (cached while the chunk is unchanged)
+            current_hash, status = verified_sha(chunk_id)
+            if status == "corrupted":
+                return jsonify({"error": "corrupted_chunk"}), 500
+            if status == "unknown":
+                log(f"No checksum file for {chunk_id}, skipping verification", "WARN")
+            if span:
+                data = STORE.read(chunk_id, span[0], span[1] - span[0])
+            else:
+                data = STORE.read(chunk_id)
 
         b64data = base64.b64encode(data).decode("utf-8")
-        log(f"Served chunk {chunk_id} (verified OK)")
-        return jsonify({"data": b64data, "sha256": current_hash})
+        log(f"Served chunk {chunk_id}{' bytes %d-%d' % span if span else ''} (verified OK)")
+        resp = {"data": b64data, "sha256": current_hash}
+        if span:
+            resp["offset"] = span[0]
+        return jsonify(resp)
+
+    except Exception as e:
+        log(f"Failed to read/serve chunk {chunk_id}: {e}", "ERROR")
+        return jsonify({"error": "read_failed", "detail": str(e)}), 500
+
+
+@app.route("/get_chunk_raw", methods=["GET"])
+def get_chunk_raw():
+    """
+    Streams the chunk as application/octet-stream; its SHA-256 is in X-Checksum-Sha256.
+    With offset/length or a Range header only those bytes are read, checked against
+    their sub-block CRCs, and sent as a 206 with Content-Range; X-Checksum-Sha256 is
+    still the whole chunk's.
+    """
+    chunk_id = request.args.get("chunk_id")
+    if not chunk_id:
+        return jsonify({"error": "missing_chunk_id"}), 400
+
+    if not STORE.exists(chunk_id):
+        log(f"Chunk {chunk_id} not found for GET", "WARN")
+        return jsonify({"error": "not_found"}), 404
+
+    size = STORE.size(chunk_id)
+    try:
+        span = requested_range(size)
+    except ValueError as e:
+        return jsonify({"error": "bad_range", "detail": str(e)}), 416, {"Content-Range": f"bytes */{size}"}
+
+    try:
+        crcs = STORE.crcs(chunk_id) if span else None
+        if crcs is not None:
+            # only the sub-blocks the range touches are checked
+            try:
+                body = verified_range(chunk_id, span[0], span[1], crcs)
+            except SubBlockMismatch:
+                return jsonify({"error": "corrupted_chunk"}), 500
+            current_hash = STORE.stored_sha(chunk_id)
+        else:
+            current_hash, status = verified_sha(chunk_id)
+            if status == "corrupted":
+                return jsonify({"error": "corrupted_chunk"}), 500
+            if status == "unknown":
+                log(f"No checksum file for {chunk_id}, skipping verification", "WARN")
+            offset, length = (span[0], span[1] - span[0]) if span else (0, None)
+            body = STORE.stream(chunk_id, STREAM_BUFFER, offset, length)
+
+        headers = {"X-Checksum-Sha256": current_hash, "Accept-Ranges": "bytes"}
+        if span is None:
+            log(f"Streaming chunk {chunk_id} (verified OK)")
+            headers["Content-Length"] = str(size)
+            return Response(body, mimetype="application/octet-stream", headers=headers)
+
+        start, stop = span
+        log(f"Streaming chunk {chunk_id} bytes {start}-{stop} (verified OK)")
+        headers["Content-Length"] = str(stop - start)
+        if stop > start:
+            headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        return Response(body, status=206, mimetype="application/octet-stream", headers=headers)
 
     except Exception as e:
         log(f"Failed to read/serve chunk {chunk_id}: {e}", "ERROR")
@@ -127,21 +532,23 @@ def replicate_chunk():
         log("Bad replication request — missing params", "ERROR")
         return jsonify({"error": "bad_request"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         log(f"Replication failed — missing chunk {chunk_id}", "ERROR")
         return jsonify({"error": "missing"}), 404
 
     try:
-        with open(path, "rb") as f:
-            data = f.read()
-        b64 = base64.b64encode(data).decode("utf-8")
-
-        r = requests.post(
-            f"{target.rstrip('/')}/store_chunk",
-            json={"chunk_id": chunk_id, "data": b64},
-            timeout=10
-        )
+        # the target rehashes what it wrote against this and rejects the copy on a mismatch
+        sha = STORE.stored_sha(chunk_id) or chunk_sha256(chunk_id)
+        with STORE.open(chunk_id) as f:
+            r = requests.post(
+                f"{target.rstrip('/')}/store_chunk_raw",
+                data=f,
+                headers={"Content-Type": "application/octet-stream",
+                         "X-Chunk-Id": chunk_id,
+                         "X-Filename": chunk_id.rsplit(".chunk.", 1)[0],
+                         "X-Checksum-Sha256": sha},
+                timeout=10
+            )
         if r.status_code == 200:
             log(f"Replicated chunk {chunk_id} -> {target}")
             return jsonify({"status": "replicated"})
@@ -154,16 +561,70 @@ def replicate_chunk():
         return jsonify({"error": str(e)}), 500
 
 
+def end_transfer():
+    global ACTIVE_TRANSFERS
+    with TRANSFERS_LOCK:
+        ACTIVE_TRANSFERS -= 1
+
+
+@app.before_request
+def begin_transfer():
+    global ACTIVE_TRANSFERS
+    if request.endpoint in TRANSFER_ENDPOINTS:
+        with TRANSFERS_LOCK:
+            ACTIVE_TRANSFERS += 1
+        g.transfer_open = True
+
+
+@app.after_request
+def hand_off_transfer(response):
+    # streamed bodies are still being sent here; count the transfer until the response closes
+    if g.pop("transfer_open", False):
+        response.call_on_close(end_transfer)
+    return response
+
+
+@app.teardown_request
+def abort_transfer(exc):
+    if g.pop("transfer_open", False):  # the handler raised before after_request ran
+        end_transfer()
+
+
+def node_stats():
+    """Disk and load figures sent with each heartbeat for replica placement."""
+    disk = shutil.disk_usage(DATA_DIR)
+    used, chunks = STORE.stats()
+    with TRANSFERS_LOCK:
+        active = ACTIVE_TRANSFERS
+    return {"capacity": disk.total, "free": disk.free, "used": used,
+            "chunks": chunks, "active_transfers": active}
+
+
+def compactor():
+    """Periodically reclaims deleted chunks' space and saves the store's index."""
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            freed = STORE.compact()
+            STORE.checkpoint()
+            COMPACTED_BYTES.inc(freed)
+            if freed:
+                log(f"Compaction freed {freed} bytes")
+        except Exception as e:
+            log(f"Compaction failed: {e}\n{traceback.format_exc()}", "ERROR")
+
+
 def send_heartbeat():
     while True:
         try:
             ip = get_local_ip()
             host = f"http://{ip}:{PORT}"
-            requests.post(
-                f"{NAMENODE}/heartbeat",
-                json={"dn_id": DN_ID, "host": host},
-                timeout=2
-            )
+            with HEARTBEAT_SECONDS.time():
+                requests.post(
+                    f"{NAMENODE}/heartbeat",
+                    json={"dn_id": DN_ID, "host": host, **node_stats()},
+                    timeout=2
+                )
             log(f"Heartbeat sent to NameNode ({host})")
         except Exception as e:
             log(f"Heartbeat failed: {e}", "WARN")
@@ -178,12 +639,10 @@ def delete_chunk():
         log("Missing chunk_id in delete request", "ERROR")
         return jsonify({"error": "missing_chunk_id"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
     try:
-        if os.path.exists(path):
-            os.remove(path)
-            if os.path.exists(path + ".sha256"):
-                os.remove(path + ".sha256")
+        if STORE.delete(chunk_id):
+            forget_verified(chunk_id)
+            queue_block_report("deleted", chunk_id)
             log(f"Deleted chunk {chunk_id}")
             return jsonify({"status": "deleted"})
         else:
@@ -201,25 +660,18 @@ def verify_chunk():
         log("Missing chunk_id in verify request", "ERROR")
         return jsonify({"error": "missing_chunk_id"}), 400
 
-    path = os.path.join(DATA_DIR, chunk_id)
-    if not os.path.exists(path):
+    if not STORE.exists(chunk_id):
         log(f"Chunk {chunk_id} missing during verification", "WARN")
         return jsonify({"status": "missing"}), 404
 
     try:
-        with open(path, "rb") as f:
-            data = f.read()
-        current_hash = hashlib.sha256(data).hexdigest()
-        stored_hash_file = path + ".sha256"
-        if os.path.exists(stored_hash_file):
-            with open(stored_hash_file, "r") as hf:
-                stored_hash = hf.read().strip()
-            if stored_hash == current_hash:
-                log(f"Chunk {chunk_id} verified OK (checksum match)")
-                return jsonify({"status": "ok", "sha256": current_hash})
-            else:
-                log(f"Chunk {chunk_id} checksum mismatch!", "ERROR")
-                return jsonify({"status": "corrupted"}), 500
+        # explicit verification always rehashes, and refreshes the cache
+        current_hash, status = verify_now(chunk_id)
+        if status == "ok":
+            log(f"Chunk {chunk_id} verified OK (checksum match)")
+            return jsonify({"status": "ok", "sha256": current_hash})
+        elif status == "corrupted":
+            return jsonify({"status": "corrupted"}), 500
         else:
             log(f"No checksum file for {chunk_id}", "WARN")
             return jsonify({"status": "unknown"}), 200
@@ -228,8 +680,21 @@ def verify_chunk():
         return jsonify({"error": "verify_failed"}), 500
 
 
+METRICS.gauge_fn("hdfs_datanode_active_transfers", "Chunk transfers in progress.", lambda: ACTIVE_TRANSFERS)
+METRICS.gauge_fn("hdfs_datanode_verified_chunks", "Chunks with a cached verification result.", lambda: len(VERIFIED))
+METRICS.gauge_fn("hdfs_datanode_pending_block_reports", "Chunk adds/deletes not yet reported.",
+                 lambda: len(PENDING_REPORTS))
+METRICS.gauge_fn("hdfs_datanode_disk_free_bytes", "Free bytes on the data dir's filesystem.",
+                 lambda: shutil.disk_usage(DATA_DIR).free)
+METRICS.gauge_fn("hdfs_datanode_stored_bytes", "Bytes the chunk store occupies on disk.", lambda: STORE.stats()[0])
+
+
 if __name__ == "__main__":
     t = threading.Thread(target=send_heartbeat, daemon=True)
     t.start()
-    log(f"Starting DataNode on 0.0.0.0:{PORT}, data dir {DATA_DIR}, NameNode at {NAMENODE}")
-    app.run(host="0.0.0.0", port=PORT, threaded=True, debug=True)
+    threading.Thread(target=block_scanner, daemon=True).start()
+    threading.Thread(target=block_reporter, daemon=True).start()
+    threading.Thread(target=compactor, daemon=True).start()
+    log(f"Starting DataNode on 0.0.0.0:{PORT}, data dir {DATA_DIR} ({STORE.name} store), NameNode at {NAMENODE}")
+    # no reloader: a second process would open the same chunk store
+    app.run(host="0.0.0.0", port=PORT, threaded=True, debug=True, use_reloader=False)